@@ -0,0 +1,67 @@
+"""Usage: bench_background.py [--changes N] [--cost SECS] [--interval SECS]
+
+Compares how long a line plot takes to show the last value of a dragged
+slider when its functions run on the kernel's main thread and on a worker
+thread (the "background" option of the plotting functions).
+
+The slider sends a change every --interval seconds and the plot's y function
+takes --cost seconds, like a simulation that's slower than the slider moves.
+
+Options:
+  --changes N         Number of slider changes. [default: 20]
+  --cost SECS         Seconds the y function takes. [default: 0.1]
+  --interval SECS     Seconds between slider changes. [default: 0.02]
+"""
+import time
+
+import numpy as np
+from docopt import docopt
+
+import nbinteract as nbi
+
+
+def main():
+    arguments = docopt(__doc__)
+    n_changes = int(arguments['--changes'])
+    cost = float(arguments['--cost'])
+    interval = float(arguments['--interval'])
+
+    def y_fn(xs, shift):
+        time.sleep(cost)
+        return xs + shift
+
+    for background in [False, True]:
+        box = nbi.line(
+            np.arange(10),
+            y_fn,
+            options={'background': background},
+            shift=(0, n_changes),
+        )
+        controls = box.children[0]
+        [mark] = box.children[1].marks
+        slider = controls.kwargs_widgets[0]
+        controls.update()
+
+        start = time.perf_counter()
+        for shift in range(1, n_changes + 1):
+            slider.value = shift
+            time.sleep(interval)
+        if background:
+            controls.runner.join()
+        seconds = time.perf_counter() - start
+        assert mark.y[0] == n_changes
+
+        computed = (
+            controls.runner.stats['computed'] - 1 if background else n_changes
+        )
+        print(
+            '{:>10}: {:6.2f}s until the last value is shown, {} of {} '
+            'changes computed'.format(
+                'background' if background else 'main', seconds, computed,
+                n_changes
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Usage: bench_binding.py [--calls N]
+
+Compares the cost of calling a plot's user functions for one widget change
+with util.maybe_call(), which inspects the functions on every call, and with
+util.bind_args(), which inspects them once when the plot is made.
+
+The functions are as cheap as possible so the time is all overhead, like a
+bar chart whose functions return small arrays while a reader drags a slider.
+
+Options:
+  --calls N  Number of widget changes to time. [default: 100000]
+"""
+import timeit
+
+from docopt import docopt
+
+from nbinteract import util
+
+
+def x_fn(n):
+    return n
+
+
+def y_fn(xs, n, offset=0):
+    return xs
+
+
+KWARGS = {'x__n': 5, 'y__n': 3, 'offset': 1}
+
+
+def maybe_call():
+    x_data = util.maybe_call(x_fn, KWARGS, prefix='x')
+    y_bound = util.maybe_curry(y_fn, x_data)
+    return util.maybe_call(y_bound, KWARGS, prefix='y')
+
+
+x_call = util.bind_args(x_fn, KWARGS, prefix='x')
+y_call = util.bind_args(y_fn, KWARGS, prefix='y', skip_first=True)
+
+
+def bind_args():
+    return y_call(KWARGS, x_call(KWARGS))
+
+
+def main():
+    arguments = docopt(__doc__)
+    n_calls = int(arguments['--calls'])
+
+    for name, fn in [('maybe_call', maybe_call), ('bind_args', bind_args)]:
+        seconds = min(timeit.repeat(fn, number=n_calls, repeat=3))
+        print(
+            '{:>10}: {:6.2f} us per widget change'
+            .format(name, seconds / n_calls * 1e6)
+        )
+
+
+if __name__ == '__main__':
+    main()
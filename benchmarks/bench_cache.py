@@ -0,0 +1,62 @@
+"""Usage: bench_cache.py [--points N] [--values N] [--sweeps N]
+
+Compares how long a histogram takes to update while a reader sweeps a slider
+back and forth without a cache, with an in-memory DataCache, and with a
+DataCache on disk that a restarted kernel loads from (the "cache" option of
+the plotting functions).
+
+Options:
+  --points N  Points in each sample. [default: 2000000]
+  --values N  Number of slider values in each sweep. [default: 10]
+  --sweeps N  Number of times to sweep the slider. [default: 4]
+"""
+import tempfile
+import time
+
+import numpy as np
+from docopt import docopt
+
+import nbinteract as nbi
+
+
+def main():
+    arguments = docopt(__doc__)
+    n_points = int(arguments['--points'])
+    n_values = int(arguments['--values'])
+    n_sweeps = int(arguments['--sweeps'])
+
+    def sample(shift):
+        return np.random.RandomState(shift).normal(loc=shift, size=n_points)
+
+    def sweep(cache):
+        box = nbi.hist(
+            sample,
+            options={'binning': 'kernel', 'cache': cache},
+            shift=(0, n_values),
+        )
+        slider = box.children[0].kwargs_widgets[0]
+        values = list(range(n_values)) + list(range(n_values, 0, -1))
+
+        start = time.perf_counter()
+        for _ in range(n_sweeps):
+            for value in values:
+                slider.value = value
+        return (time.perf_counter() - start) / (n_sweeps * len(values))
+
+    with tempfile.TemporaryDirectory() as path:
+        memory = nbi.DataCache()
+        timings = [
+            ('no cache', sweep(None)),
+            ('memory', sweep(memory)),
+            ('disk', sweep(nbi.DataCache(path=path))),
+            # A new cache on the same folder is like a restarted kernel
+            ('restarted', sweep(nbi.DataCache(path=path))),
+        ]
+
+    for name, seconds in timings:
+        print('{:>10}: {:7.2f} ms per update'.format(name, seconds * 1e3))
+    print('memory cache stats: {}'.format(memory.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Usage: bench_conversion.py [options]
+
+Times converting synthetic notebooks with each template and checks the
+results against a baseline.
+
+Three levels of the pipeline are timed for each template:
+
+  from_notebook_node  InteractExporter.from_notebook_node() on a notebook that
+                      is already in memory
+  convert             cli.convert(), which also reads the notebook and writes
+                      the HTML file
+  run_converter       cli.run_converter() on a folder of notebooks, like
+                      running `nbinteract` from the command line
+
+Everything runs offline. The notebooks are generated by corpus.py, and no
+notebook is executed.
+
+Options:
+  -h --help            Show this screen
+  --cells N            Cells per notebook. [default: 100]
+  --code-ratio R       Fraction of cells that are code cells. [default: 0.5]
+  --images N           Inline PNG outputs per notebook. [default: 10]
+  --image-kb KB        Size of each image. [default: 50]
+  --widgets N          Widget outputs per notebook. [default: 10]
+  --text-outputs N     Large text outputs per notebook. [default: 10]
+  --text-kb KB         Size of each large text output. [default: 20]
+  --notebooks N        Notebooks converted by run_converter. [default: 5]
+  --templates LIST     Comma-separated templates to benchmark.
+                       [default: full,partial,plain,local]
+  --repeat N           Times to run each benchmark. [default: 5]
+  --output FILE        Writes the results to FILE as JSON.
+  --baseline FILE      Compares the results to the JSON results in FILE and
+                       exits with status 1 if any benchmark regressed.
+  --threshold PERCENT  How much slower than the baseline a benchmark's median
+                       time can be before it counts as a regression.
+                       [default: 10]
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import nbconvert
+import nbformat
+from docopt import docopt
+
+import nbinteract.cli as cli
+
+from corpus import make_notebook, write_corpus
+
+SPEC = 'a/bench/spec'
+
+
+def time_runs(fn, repeat):
+    """
+    Calls fn `repeat` times and returns the seconds each call took.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def quietly(fn, *args):
+    # Hides the CLI's log messages
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def summarize(runs):
+    return {
+        'min': min(runs),
+        'median': statistics.median(runs),
+        'runs': runs,
+    }
+
+
+def bench_template(template, notebook_kwargs, n_notebooks, repeat, tmp):
+    """
+    Returns the timings of each benchmark for template.
+    """
+    exporter = cli.init_exporter(
+        extract_images=None,
+        execute=False,
+        spec=SPEC,
+        template_file=template,
+        button_at_top=True,
+    )
+    notebook = make_notebook(**notebook_kwargs)
+
+    folder = os.path.join(tmp, template)
+    os.makedirs(folder)
+    [notebook_path] = write_corpus(folder, 1, **notebook_kwargs)
+
+    corpus_folder = os.path.join(tmp, template + '_corpus')
+    os.makedirs(corpus_folder)
+    write_corpus(corpus_folder, n_notebooks, **notebook_kwargs)
+    arguments = docopt(
+        cli.__doc__,
+        argv=[
+            '--spec', SPEC, '--template', template, '--force', '--jobs', '1',
+            corpus_folder
+        ],
+    )
+
+    return {
+        'from_notebook_node': summarize(time_runs(
+            lambda: exporter.from_notebook_node(notebook), repeat
+        )),
+        'convert': summarize(time_runs(
+            lambda: cli.convert(notebook_path, exporter), repeat
+        )),
+        'run_converter': summarize(time_runs(
+            lambda: quietly(cli.run_converter, dict(arguments)), repeat
+        )),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints how each benchmark's median changed from the baseline. Returns the
+    list of benchmarks that got more than `threshold` percent slower.
+    """
+    regressions = []
+    for template, benchmarks in results['results'].items():
+        for name, timing in benchmarks.items():
+            try:
+                before = baseline['results'][template][name]['median']
+            except KeyError:
+                continue
+            change = (timing['median'] - before) / before * 100
+            regressed = change > threshold
+            print(
+                '{:>8} {:>18}: {:8.4f}s -> {:8.4f}s ({:+6.1f}%){}'.format(
+                    template, name, before, timing['median'], change,
+                    '  REGRESSION' if regressed else ''
+                )
+            )
+            if regressed:
+                regressions.append('{}/{}'.format(template, name))
+    return regressions
+
+
+def main():
+    arguments = docopt(__doc__)
+    notebook_kwargs = {
+        'cells': int(arguments['--cells']),
+        'code_ratio': float(arguments['--code-ratio']),
+        'images': int(arguments['--images']),
+        'image_kb': int(arguments['--image-kb']),
+        'widgets': int(arguments['--widgets']),
+        'text_outputs': int(arguments['--text-outputs']),
+        'text_kb': int(arguments['--text-kb']),
+    }
+    n_notebooks = int(arguments['--notebooks'])
+    repeat = int(arguments['--repeat'])
+    templates = arguments['--templates'].split(',')
+
+    results = {
+        'meta': {
+            'notebook': notebook_kwargs,
+            'notebooks': n_notebooks,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'nbconvert': nbconvert.__version__,
+            'nbformat': nbformat.__version__,
+        },
+        'results': {},
+    }
+
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # run_converter() writes its build manifest to the current folder
+        os.chdir(tmp)
+        try:
+            for template in templates:
+                results['results'][template] = bench_template(
+                    template, notebook_kwargs, n_notebooks, repeat, tmp
+                )
+        finally:
+            os.chdir(original_cwd)
+
+    for template, benchmarks in results['results'].items():
+        for name, timing in benchmarks.items():
+            print(
+                '{:>8} {:>18}: median {:8.4f}s, min {:8.4f}s'.format(
+                    template, name, timing['median'], timing['min']
+                )
+            )
+
+    if arguments['--output']:
+        with open(arguments['--output'], 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if arguments['--baseline']:
+        with open(arguments['--baseline'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('notebook') != notebook_kwargs:
+            print('Warning: the baseline used different notebook options.')
+        regressions = compare(
+            results, baseline, float(arguments['--threshold'])
+        )
+        if regressions:
+            print('Regressed: {}'.format(', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Usage: bench_hist.py [--points N] [--bins N] [--updates N]
+
+Compares the payload that each update of an nbinteract histogram sends to the
+page, and how long the kernel takes to compute it, when the sample is binned
+in the browser and in the kernel (the "binning" option of nbi.hist()).
+
+The payload is the size of the mark's state as the widget comm sends it:
+the JSON of the changed traits plus any binary buffers.
+
+Options:
+  --points N   Points in each sample. [default: 10000000]
+  --bins N     Number of bins. [default: 50]
+  --updates N  Updates to time in each mode. [default: 5]
+"""
+import json
+import time
+
+import numpy as np
+from docopt import docopt
+from ipywidgets.widgets.widget import _remove_buffers
+
+import nbinteract as nbi
+
+MODES = ['browser', 'kernel']
+
+
+def payload_bytes(mark, traits):
+    """
+    Returns the number of bytes the widget comm sends to update traits of
+    mark.
+    """
+    state, _, buffers = _remove_buffers(mark.get_state(key=traits))
+    return len(json.dumps(state).encode('utf-8')) + sum(
+        memoryview(buffer).nbytes for buffer in buffers
+    )
+
+
+def main():
+    arguments = docopt(__doc__)
+    n_points = int(arguments['--points'])
+    n_updates = int(arguments['--updates'])
+    rng = np.random.RandomState(0)
+
+    def sample(shift):
+        return rng.normal(loc=shift, size=n_points)
+
+    for mode in MODES:
+        box = nbi.hist(
+            sample,
+            options={'binning': mode, 'bins': int(arguments['--bins'])},
+            shift=(0, 10),
+        )
+        controls = box.children[0]
+        [mark] = box.children[1].marks
+        traits = ['sample'] if mode == 'browser' else ['x', 'y']
+
+        start = time.perf_counter()
+        for shift in range(n_updates):
+            controls.kwargs_widgets[0].value = shift
+            # Serializing the state is part of every update
+            size = payload_bytes(mark, traits)
+        seconds = (time.perf_counter() - start) / n_updates
+
+        print(
+            '{:>8}: {:12,d} bytes per update, {:7.3f}s per update'
+            .format(mode, size, seconds)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Usage: bench_read.py [--widget-mb MB] [--output-mb MB]
+
+Compares how long reading a large notebook takes and how much memory it uses
+with nbformat.read() and with nbinteract's fast read mode (`--fast-read`).
+
+The notebook holds saved widget state, like a notebook whose widgets plotted
+large arrays, and large image and text outputs. Each read runs in a fresh
+subprocess so its peak resident set size can be measured on its own. The
+"read" column is how much the peak RSS grew while reading the notebook.
+
+Options:
+  --widget-mb MB  Size of the widget state saved in the notebook's metadata.
+                  [default: 60]
+  --output-mb MB  Total size of the image and text outputs. [default: 40]
+"""
+import base64
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import nbformat
+from docopt import docopt
+
+CHILD_SCRIPT = '''
+import resource, sys, time
+import nbformat
+from nbinteract import reader
+
+mode, notebook_path = sys.argv[1:]
+if mode == 'fast-stdlib-json':
+    reader.orjson = None
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if mode == 'nbformat':
+    nb = nbformat.read(notebook_path, as_version=4)
+else:
+    nb = reader.read_notebook(notebook_path, fast=True)
+seconds = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# ru_maxrss is in KB on Linux and bytes on macOS
+scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+print(seconds, before / scale, after / scale)
+'''
+
+MODES = ['nbformat', 'fast', 'fast-stdlib-json']
+
+
+def make_notebook(path, widget_mb, output_mb):
+    """
+    Writes a notebook with about widget_mb of widget state and output_mb of
+    outputs split between PNG images and stream text.
+    """
+    rng = random.Random(0)
+
+    cells = []
+    n_outputs = 20
+    output_bytes = output_mb * 1024 * 1024 // n_outputs
+    for i in range(n_outputs):
+        if i % 2:
+            output = nbformat.v4.new_output(
+                'display_data',
+                data={
+                    'image/png': base64.b64encode(
+                        os.urandom(output_bytes * 3 // 4)
+                    ).decode('ascii')
+                },
+            )
+        else:
+            line = 'row {} '.format(i) + 'x' * 70 + '\n'
+            output = nbformat.v4.new_output(
+                'stream',
+                name='stdout',
+                text=line * (output_bytes // len(line)),
+            )
+        cells.append(
+            nbformat.v4.new_code_cell('plot({})'.format(i), outputs=[output])
+        )
+
+    # Widget state is mostly JSON arrays of floats, like a bqplot figure's
+    # marks. nbformat writes each float on its own line, which takes about 12
+    # bytes.
+    state = {}
+    n_widgets = 50
+    floats_per_widget = widget_mb * 1024 * 1024 // n_widgets // 12
+    for i in range(n_widgets):
+        state['{:032x}'.format(i)] = {
+            'model_module': 'bqplot',
+            'model_module_version': '^0.4.1',
+            'model_name': 'LinesModel',
+            'state': {
+                axis: [
+                    round(rng.random(), 6)
+                    for _ in range(floats_per_widget // 2)
+                ] for axis in 'xy'
+            },
+        }
+
+    nb = nbformat.v4.new_notebook(cells=cells)
+    nb.metadata['widgets'] = {
+        'application/vnd.jupyter.widget-state+json': {
+            'state': state,
+            'version_major': 2,
+            'version_minor': 0,
+        }
+    }
+    nbformat.write(nb, path)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--make-notebook':
+        path, widget_mb, output_mb = sys.argv[2:]
+        make_notebook(path, int(widget_mb), int(output_mb))
+        return
+
+    arguments = docopt(__doc__)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        notebook_path = os.path.join(tmp, 'bench.ipynb')
+        # Made in a subprocess since children inherit this process's peak RSS
+        # when they're forked
+        subprocess.run([
+            sys.executable, __file__, '--make-notebook', notebook_path,
+            arguments['--widget-mb'], arguments['--output-mb']
+        ], check=True)
+        print(
+            'Notebook size: {:.0f} MB'
+            .format(os.path.getsize(notebook_path) / 1024 / 1024)
+        )
+
+        for mode in MODES:
+            output = subprocess.check_output(
+                [sys.executable, '-c', CHILD_SCRIPT, mode, notebook_path],
+                # Runs from the repo so the working tree is imported
+                cwd=repo,
+            )
+            seconds, before_mb, after_mb = map(float, output.split())
+            print(
+                '{:>16}: {:6.2f}s, peak RSS {:7.1f} MB (read {:7.1f} MB)'
+                .format(mode, seconds, after_mb, after_mb - before_mb)
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Usage: bench_startup.py [--repeat N] [--top N]
+
+Measures how long nbinteract's entry points take to start.
+
+Each snippet runs in a fresh interpreter with `python -X importtime`, so the
+numbers include every module the snippet imports. Run it on two commits to
+compare them. The last snippet accesses nbi.hist, which imports the plotting
+modules that the other snippets should no longer need.
+
+Options:
+  --repeat N  Times to run each snippet. The fastest run is reported.
+              [default: 5]
+  --top N     Number of slowest top-level imports to list for each snippet.
+              [default: 5]
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+from docopt import docopt
+
+SNIPPETS = [
+    ('import nbinteract', 'import nbinteract'),
+    ('import nbinteract.cli', 'import nbinteract.cli'),
+    (
+        'nbinteract --help',
+        'import sys\n'
+        'from nbinteract.cli import main\n'
+        'sys.argv = ["nbinteract", "--help"]\n'
+        'main()',
+    ),
+    (
+        'nbconvert entry point',
+        'import nbinteract\n'
+        'nbinteract.InteractExporter',
+    ),
+    (
+        'nbi.hist',
+        'import nbinteract as nbi\n'
+        'nbi.hist',
+    ),
+]
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def run_snippet(code):
+    """
+    Runs code in a new interpreter. Returns its wall time in seconds and a
+    dict mapping each top-level import to its cumulative import time in
+    seconds.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        # Runs from the repo so the working tree is imported
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode not in (0, 1):
+        raise RuntimeError(proc.stderr)
+
+    imports = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Top-level imports aren't indented
+        if match and not match.group(3):
+            imports[match.group(4)] = int(match.group(2)) / 1e6
+    return wall, imports
+
+
+def main():
+    arguments = docopt(__doc__)
+    repeat = int(arguments['--repeat'])
+    top = int(arguments['--top'])
+
+    print('{:>22}  {:>8}  {:>8}'.format('', 'wall', 'imports'))
+    for name, code in SNIPPETS:
+        runs = [run_snippet(code) for _ in range(repeat)]
+        wall, imports = min(runs, key=lambda run: run[0])
+        print(
+            '{:>22}  {:7.3f}s  {:7.3f}s'.format(
+                name, wall, sum(imports.values())
+            )
+        )
+        slowest = sorted(imports.items(), key=lambda item: item[1])[::-1]
+        for module, seconds in slowest[:top]:
+            print('{:>22}  {:>8}  {:7.3f}s  {}'.format('', '', seconds, module))
+
+
+if __name__ == '__main__':
+    main()
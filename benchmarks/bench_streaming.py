@@ -0,0 +1,122 @@
+"""Usage: bench_streaming.py [--size MB] [--images N]
+
+Compares the peak memory of converting a large notebook by rendering the HTML
+into a string (from_notebook_node) against streaming it to disk
+(stream_notebook_node).
+
+Each conversion runs in a fresh subprocess so its peak resident set size can
+be measured on its own. Peak RSS includes the notebook, its resources, and
+everything imported, so the difference between the two numbers is what
+streaming saves.
+
+Options:
+  --size MB    Total size of the inline images in the notebook. [default: 200]
+  --images N   Number of inline images to split the size across.
+               [default: 50]
+"""
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import nbformat
+from docopt import docopt
+
+CHILD_SCRIPT = '''
+import sys, nbformat
+from nbinteract.cli import init_exporter, make_exporter_resources, write_chunks
+
+mode, notebook_path, html_path = sys.argv[1:]
+exporter = init_exporter(
+    extract_images=None, execute=False, spec='a/b/c', template_file='full'
+)
+notebook = nbformat.read(notebook_path, as_version=4)
+resources = make_exporter_resources('bench', '.')
+
+if mode == 'render':
+    html, _ = exporter.from_notebook_node(notebook, resources=resources)
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+else:
+    chunks, _ = exporter.stream_notebook_node(notebook, resources=resources)
+    write_chunks(html_path, chunks)
+'''
+
+
+def make_notebook(path, size_mb, n_images):
+    """
+    Writes a notebook with n_images inline PNG outputs totalling size_mb.
+    The image bytes are random so they don't need to be valid PNGs.
+    """
+    image_bytes = size_mb * 1024 * 1024 // n_images
+    cells = []
+    for i in range(n_images):
+        data = base64.b64encode(os.urandom(image_bytes)).decode('ascii')
+        cells.append(
+            nbformat.v4.new_code_cell(
+                source='plot({})'.format(i),
+                outputs=[
+                    nbformat.v4.new_output(
+                        'display_data', data={'image/png': data}
+                    )
+                ],
+            )
+        )
+    nbformat.write(nbformat.v4.new_notebook(cells=cells), path)
+
+
+def run(mode, notebook_path, html_path):
+    """
+    Converts the notebook in a subprocess. Returns (seconds, peak RSS in MB).
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, mode, notebook_path, html_path],
+        check=True,
+    )
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is the peak RSS of the largest child waited for so far, so we
+    # run each mode from a fresh benchmark process
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return seconds, maxrss / scale
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        mode, notebook_path, html_path = sys.argv[2:]
+        print(*run(mode, notebook_path, html_path))
+        return
+
+    arguments = docopt(__doc__)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        notebook_path = os.path.join(tmp, 'bench.ipynb')
+        html_path = os.path.join(tmp, 'bench.html')
+        make_notebook(
+            notebook_path, int(arguments['--size']), int(arguments['--images'])
+        )
+        print(
+            'Notebook size: {:.0f} MB'
+            .format(os.path.getsize(notebook_path) / 1024 / 1024)
+        )
+
+        for mode in ['render', 'stream']:
+            output = subprocess.check_output([
+                sys.executable, __file__, '--child', mode, notebook_path,
+                html_path
+            ])
+            seconds, peak_mb = map(float, output.split())
+            print(
+                '{:>6}: {:6.2f}s, peak RSS {:7.1f} MB'
+                .format(mode, seconds, peak_mb)
+            )
+
+
+if __name__ == '__main__':
+    main()
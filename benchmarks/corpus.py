@@ -0,0 +1,184 @@
+"""
+Generates synthetic notebooks for the conversion benchmarks.
+
+The notebooks are deterministic for a given seed so benchmark results from
+different runs convert the same input. Image outputs are random bytes since
+the exporter never decodes them.
+"""
+import base64
+import os
+import random
+import uuid
+
+import nbformat
+from nbformat.v4 import (
+    new_code_cell, new_markdown_cell, new_notebook, new_output
+)
+
+WIDGET_VIEW_MIMETYPE = 'application/vnd.jupyter.widget-view+json'
+WIDGET_STATE_MIMETYPE = 'application/vnd.jupyter.widget-state+json'
+
+MARKDOWN_SOURCE = '''
+## Section {i}
+
+Some *markdown* with `inline code`, a [link](https://example.com) and a list:
+
+- first item with $x^2$ math
+- second item
+'''.strip()
+
+CODE_SOURCE = '''
+def f{i}(x, y=2):
+    """Computes something for cell {i}."""
+    values = [x * y + n for n in range({i})]
+    return sum(values) / max(len(values), 1)
+
+f{i}(10)
+'''.strip()
+
+
+def make_notebook(
+    cells=100,
+    code_ratio=0.5,
+    images=10,
+    image_kb=50,
+    widgets=10,
+    text_outputs=10,
+    text_kb=20,
+    seed=0,
+):
+    """
+    Returns a notebook with `cells` cells, a `code_ratio` fraction of which
+    are code cells. Images, widget outputs, and large text outputs are
+    attached to code cells spread evenly through the notebook.
+
+    Kwargs:
+        cells (int): Total number of cells.
+        code_ratio (float): Fraction of cells that are code cells.
+        images (int): Number of inline PNG outputs.
+        image_kb (int): Size of each image before base64 encoding.
+        widgets (int): Number of ipywidgets outputs. Each gets an entry in the
+            notebook's widget state.
+        text_outputs (int): Number of large stream outputs.
+        text_kb (int): Size of each large stream output.
+        seed (int): Seed for the random image bytes and widget IDs.
+    """
+    rng = random.Random(seed)
+    n_code = round(cells * code_ratio)
+
+    code_cells = [
+        new_code_cell(CODE_SOURCE.format(i=i), execution_count=i + 1)
+        for i in range(n_code)
+    ]
+    for cell in code_cells:
+        cell.outputs.append(
+            new_output('execute_result', data={'text/plain': '1.0'})
+        )
+
+    for i, cell in _spread(code_cells, images):
+        data = base64.b64encode(_random_bytes(rng, image_kb * 1024))
+        cell.outputs.append(
+            new_output(
+                'display_data', data={'image/png': data.decode('ascii')}
+            )
+        )
+
+    for i, cell in _spread(code_cells, text_outputs):
+        line = 'row {} '.format(i) + 'x' * 70 + '\n'
+        text = line * max(text_kb * 1024 // len(line), 1)
+        cell.outputs.append(new_output('stream', name='stdout', text=text))
+
+    widget_state = {}
+    for i, cell in _spread(code_cells, widgets):
+        model_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        cell.source = 'interact(f{}, x=(0, 10))'.format(i)
+        cell.outputs.append(
+            new_output(
+                'display_data',
+                data={
+                    'text/plain': 'interactive(...)',
+                    WIDGET_VIEW_MIMETYPE: {
+                        'model_id': model_id,
+                        'version_major': 2,
+                        'version_minor': 0,
+                    },
+                }
+            )
+        )
+        widget_state[model_id] = {
+            'model_module': '@jupyter-widgets/controls',
+            'model_module_version': '1.5.0',
+            'model_name': 'VBoxModel',
+            'state': {'children': []},
+        }
+
+    markdown_cells = [
+        new_markdown_cell(MARKDOWN_SOURCE.format(i=i))
+        for i in range(cells - n_code)
+    ]
+
+    nb = new_notebook(cells=_interleave(code_cells, markdown_cells))
+    nb.metadata['kernelspec'] = {
+        'name': 'python3',
+        'display_name': 'Python 3',
+        'language': 'python',
+    }
+    nb.metadata['language_info'] = {'name': 'python'}
+    if widget_state:
+        nb.metadata['widgets'] = {
+            WIDGET_STATE_MIMETYPE: {
+                'state': widget_state,
+                'version_major': 2,
+                'version_minor': 0,
+            }
+        }
+    return nb
+
+
+def write_corpus(folder, count, seed=0, **notebook_kwargs):
+    """
+    Writes `count` notebooks made by make_notebook(**notebook_kwargs) into
+    folder, each with a different seed. Returns their paths.
+    """
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, 'bench_{}.ipynb'.format(i))
+        nbformat.write(make_notebook(seed=seed + i, **notebook_kwargs), path)
+        paths.append(path)
+    return paths
+
+
+def _random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def _spread(items, count):
+    """
+    Yields (index, item) for `count` items spread evenly through items.
+    """
+    if not items:
+        return
+    count = min(count, len(items))
+    for n in range(count):
+        i = n * len(items) // count
+        yield i, items[i]
+
+
+def _interleave(code_cells, markdown_cells):
+    """
+    Returns the cells with markdown cells spread evenly between code cells.
+    """
+    cells = []
+    total = len(code_cells) + len(markdown_cells)
+    code, markdown = iter(code_cells), iter(markdown_cells)
+    placed_markdown = 0
+    for i in range(total):
+        # Place a markdown cell whenever we're behind its share of the cells
+        if placed_markdown < len(markdown_cells) and (
+            placed_markdown * total <= i * len(markdown_cells)
+        ):
+            cells.append(next(markdown))
+            placed_markdown += 1
+        else:
+            cells.append(next(code))
+    return cells
@@ -26,6 +26,7 @@ from itertools import chain
 
 import nbformat
 from nbinteract import InteractExporter
+from nbinteract.cli import write_chunks, write_if_changed
 from traitlets.config import Config
 
 # The HTML file needs to start with Jekyll front-matter and wrapped in a raw
@@ -53,9 +54,10 @@ next_page: {next_page}
 html_exporter = InteractExporter(
     config=Config(
         InteractExporter=dict(
-            # Use ExtractOutputPreprocessor to extract images to separate files
+            # Extract images to separate files named by their contents so
+            # images repeated across chapters are only stored once
             preprocessors=[
-                'nbconvert.preprocessors.ExtractOutputPreprocessor'
+                'nbinteract.preprocessors.HashExtractOutputPreprocessor'
             ],
             template_file='plain',
             button_at_top=False,
@@ -101,7 +103,7 @@ def convert_notebooks_to_html_partial(notebook_paths, url_map):
 
         notebook = nbformat.read(notebook_path, 4)
         notebook.cells.insert(0, _preamble_cell(path))
-        html, resources = html_exporter.from_notebook_node(
+        html_chunks, resources = html_exporter.stream_notebook_node(
             notebook,
             resources=extract_output_config,
         )
@@ -115,22 +117,23 @@ def convert_notebooks_to_html_partial(notebook_paths, url_map):
         prev_page = url_map.get(outfile_path, {}).get('prev', 'false')
         next_page = url_map.get(outfile_path, {}).get('next', 'false')
 
-        final_output = wrapper.format(
-            html=html,
-            prev_page=prev_page,
-            next_page=next_page,
+        # Stream the HTML between the two halves of the wrapper so the whole
+        # page is never held in memory
+        before_html, after_html = wrapper.split('{html}')
+        final_output = chain(
+            [before_html.format(prev_page=prev_page, next_page=next_page)],
+            html_chunks,
+            [after_html.format()],
         )
 
         # Write out HTML
-        with open(outfile_path, 'w', encoding='utf-8') as outfile:
-            outfile.write(final_output)
+        write_chunks(outfile_path, final_output)
 
         # Write out images
         for relative_path, image_data in resources['outputs'].items():
             image_name = os.path.basename(relative_path)
             final_image_path = os.path.join(NOTEBOOK_IMAGE_DIR, image_name)
-            with open(final_image_path, 'wb') as outimage:
-                outimage.write(image_data)
+            write_if_changed(final_image_path, image_data)
 
         print(outfile_path + " written.")
 
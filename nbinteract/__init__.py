@@ -1,5 +1,6 @@
 # Ignore warnings from bqplot. We won't use FutureWarnings ourselves so this
 # should be okay.
+import importlib
 import warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
@@ -9,7 +10,43 @@ warnings.simplefilter(action="ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", message="numpy.dtype size changed")
 warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
 
-from .exporters import *
-from .plotting import *
-from .questions import *
-from . import util
+# Public names are imported from their submodules on first access so that
+# `nbinteract --help` and the nbconvert entry point don't import numpy, bqplot
+# and ipywidgets.
+_LAZY_ATTRIBUTES = {
+    'InteractExporter': 'exporters',
+    'publish': 'exporters',
+    'hist': 'plotting',
+    'bar': 'plotting',
+    'scatter_drag': 'plotting',
+    'scatter': 'plotting',
+    'line': 'plotting',
+    'Figure': 'plotting',
+    'DataCache': 'data_cache',
+    'multiple_choice': 'questions',
+    'short_answer': 'questions',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+# Submodules that `import nbinteract` used to import
+_LAZY_SUBMODULES = {'exporters', 'plotting', 'questions', 'util'}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(
+            '.' + _LAZY_ATTRIBUTES[name], __name__
+        )
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name)
+    )
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | _LAZY_SUBMODULES)
@@ -0,0 +1,180 @@
+"""
+Computes plot data on a worker thread for plots made with the background
+option, so widget changes don't wait for slow plot functions.
+
+Sliders send a change for every value they pass through while they're
+dragged. When each change runs the plot's functions on the kernel's main
+thread, changes queue up behind slow functions and the plot falls seconds
+behind the slider. LatestRunner instead keeps only the newest widget values
+that haven't been computed yet, so a burst of changes computes at most the
+one that's running and the last one.
+
+Functions run on a thread rather than in a process since they're often
+closures over notebook data that can't be pickled. NumPy releases the GIL
+for most array operations, so the kernel keeps handling widget changes while
+they run.
+"""
+import logging
+import threading
+import time
+
+
+class LatestRunner(object):
+    """
+    Calls compute with the newest kwargs passed to submit() on a worker
+    thread and passes each result to apply.
+
+    The first call to submit() computes right away on the calling thread so
+    plots show their data as soon as they're displayed. After that, kwargs
+    that are replaced by newer ones before the worker starts on them are
+    dropped, and results that finish after the result of newer kwargs are
+    discarded.
+
+    Kwargs:
+        throttle (float): Least number of seconds between the starts of two
+            computations.
+        debounce (float): Seconds to wait after the last call to submit()
+            before computing. Raise it to only compute once a slider stops.
+
+    stats holds counters for tuning the intervals:
+
+    - submitted: Calls to submit().
+    - computed: Results passed to apply.
+    - dropped: Kwargs replaced by newer ones before being computed.
+    - discarded: Results that finished after a newer result.
+    - errors: Computations that raised an exception, which is logged.
+    - queue_depth: Kwargs waiting to be computed, or dropped once the worker
+      starts on the newest of them.
+    - max_queue_depth: Largest queue_depth so far.
+    """
+
+    def __init__(self, compute, apply, throttle=0, debounce=0):
+        self.compute = compute
+        self.apply = apply
+        self.throttle = throttle
+        self.debounce = debounce
+        self.stats = {
+            'submitted': 0,
+            'computed': 0,
+            'dropped': 0,
+            'discarded': 0,
+            'errors': 0,
+            'queue_depth': 0,
+            'max_queue_depth': 0,
+        }
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # (sequence number, kwargs) of the newest kwargs to compute
+        self._pending = None
+        self._running = False
+        self._sequence = 0
+        self._applied_sequence = 0
+        self._last_submit = 0
+        self._last_start = 0
+
+    def submit(self, **kwargs):
+        """
+        Schedules compute to be called with kwargs. Returns right away unless
+        this is the first call.
+        """
+        with self._cond:
+            self._sequence += 1
+            sequence = self._sequence
+            self.stats['submitted'] += 1
+            first = sequence == 1
+            if not first:
+                self._pending = (sequence, kwargs)
+                self._last_submit = time.monotonic()
+                self.stats['queue_depth'] += 1
+                self.stats['max_queue_depth'] = max(
+                    self.stats['max_queue_depth'], self.stats['queue_depth']
+                )
+                self._start_worker()
+                self._cond.notify_all()
+
+        if first:
+            with self._cond:
+                self._last_start = time.monotonic()
+            self._run(sequence, kwargs)
+
+    def join(self, timeout=None) -> bool:
+        """
+        Waits until every submitted computation has finished or been dropped.
+        Returns False if timeout seconds passed first.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._running, timeout
+            )
+
+    def close(self):
+        """
+        Stops the worker thread once its current computation finishes.
+        Pending kwargs are dropped.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _start_worker(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._work, name='nbinteract-background', daemon=True
+            )
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._pending is not None or self._closed
+                )
+                # Waits out the intervals, which restart if kwargs come in
+                while not self._closed:
+                    delay = max(
+                        self._last_submit + self.debounce,
+                        self._last_start + self.throttle,
+                    ) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self._closed:
+                    self._pending = None
+                    self._cond.notify_all()
+                    return
+
+                sequence, kwargs = self._pending
+                self._pending = None
+                self._running = True
+                self.stats['dropped'] += self.stats['queue_depth'] - 1
+                self.stats['queue_depth'] = 0
+                self._last_start = time.monotonic()
+
+            try:
+                self._run(sequence, kwargs)
+            finally:
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
+
+    def _run(self, sequence, kwargs):
+        try:
+            result = self.compute(**kwargs)
+        except Exception:
+            logging.exception('Computing a plot for %r failed', kwargs)
+            with self._cond:
+                self.stats['errors'] += 1
+            return
+
+        with self._cond:
+            if sequence < self._applied_sequence:
+                self.stats['discarded'] += 1
+                return
+            self._applied_sequence = sequence
+            self.stats['computed'] += 1
+            # Applied while holding the lock so results are applied in order
+            self.apply(result)
@@ -2,6 +2,8 @@
 
 Usage:
   nbinteract init
+  nbinteract serve [--socket=PATH | --stdio]
+  nbinteract watch [options] NOTEBOOKS ...
   nbinteract NOTEBOOKS ...
   nbinteract [options] NOTEBOOKS ...
   nbinteract (-h | --help)
@@ -14,6 +16,15 @@ image for the project.
 running this command outside a GitHub project initialized with `nbinteract
 init` requires you to specify the --spec SPEC option.
 
+`nbinteract watch NOTEBOOKS ...` watches notebooks for changes and converts
+each notebook into an HTML page whenever it's saved. Press Ctrl-C to stop.
+
+`nbinteract serve` starts a conversion server that keeps exporters in memory
+between conversions. While it runs, `nbinteract NOTEBOOKS ...` and
+`nbinteract.publish()` send their conversions to the server instead of setting
+up a new exporter each time. The server converts notebooks one at a time, so
+the --jobs option is ignored while it runs.
+
 Arguments:
   NOTEBOOKS  List of notebooks or folders to convert. If folders are passed in,
              all the notebooks in each folder are converted. The resulting HTML
@@ -22,6 +33,9 @@ Arguments:
 
              By default, notebooks in subfolders will not be converted; use the
              --recursive flag to recursively convert notebooks in subfolders.
+             Files and folders whose names start with a `.` are skipped. With
+             --use-ignore-files, so are notebooks matched by a .gitignore or
+             .nbinteractignore file in a searched folder.
 
 Options:
   -h --help                  Show this screen
@@ -38,6 +52,16 @@ Options:
                              [default: full]
   -B --no-top-button         If set, doesn't generate button at top of page.
   -r --recursive             Recursively convert notebooks in subdirectories.
+  --include=GLOBS            Only converts notebooks that match one of these
+                             comma-separated .gitignore-style patterns, or
+                             that are in a folder that matches one.
+  --exclude=GLOBS            Skips notebooks and folders that match one of
+                             these comma-separated .gitignore-style patterns.
+                             Patterns are matched against paths relative to
+                             the folders in NOTEBOOKS.
+  --use-ignore-files         Skips notebooks and folders that a .gitignore
+                             or .nbinteractignore file in a searched folder
+                             matches.
   -o FOLDER --output=FOLDER  Outputs HTML files into FOLDER instead of
                              outputting files adjacent to their originating
                              notebooks. All files will be direct descendants of
@@ -45,11 +69,116 @@ Options:
   -i FOLDER --images=FOLDER  Extracts images from HTML and writes into FOLDER
                              instead of encoding images in base64 in the HTML.
                              Requires -o option to be set as well.
+  --hash-images              Names extracted images by a hash of their contents
+                             so identical images in different cells and
+                             notebooks are only stored once. Requires -i.
+  --optimize-images          Recompresses PNG outputs losslessly and minifies
+                             SVG outputs. Results are cached in
+                             .nbinteract-cache/images/ so unchanged images
+                             aren't optimized again.
+  --max-image-width=PX       With --optimize-images, downscales PNGs wider
+                             than PX pixels. Needs Pillow.
+  --webp                     With --optimize-images, also writes a WebP copy
+                             of each extracted PNG when it's smaller, which
+                             browsers that support WebP load instead. Needs
+                             Pillow. Requires -i.
+  --shared-assets            Writes the CSS that every page shares into
+                             FOLDER/nbinteract-assets/ once under a
+                             content-hashed name, and links pages to it
+                             instead of inlining it. Pages load the
+                             nbinteract JS with a deferred script. For the
+                             local template, the built bundle in
+                             packages/nbinteract-core/lib/ is copied there
+                             too. Requires -o.
+  --no-truncate              Renders every output in full. By default,
+                             text outputs longer than 100,000 characters,
+                             HTML outputs longer than 500,000 characters and
+                             tables with more than 1,000 rows are cut, and
+                             cells keep at most 200 outputs. Configure
+                             TruncateOutputPreprocessor to change the limits.
+  --sidecar-outputs          Writes the full contents of cut outputs into
+                             FOLDER/nbinteract-outputs/. Pages load them when
+                             their "Show full output" link is clicked.
+                             Requires -o.
+  --widget-snapshots         Embeds the state of each widget in its page so
+                             widgets show before a kernel starts. The kernel
+                             starts once a reader interacts with a widget.
+                             Uses the widget state recorded by --execute or
+                             saved in the notebook. --fast-read drops saved
+                             widget state.
+  --minimal-cells            Only runs the code cells that the page's widgets
+                             need when a reader starts them, found by
+                             analyzing the names each cell reads and defines.
+                             Cells that can't be analyzed, like most cells
+                             with magics, always run.
+  --precompute               With --execute and --widget-snapshots, computes
+                             the plots of nbi.hist(), nbi.bar(), nbi.line()
+                             and nbi.scatter() for every combination of their
+                             widget values and embeds the results, so pages
+                             update them without a kernel. Plots with more
+                             combinations than the budget, or with widgets
+                             like text boxes, still use the kernel.
+  --precompute-budget=N      Largest number of widget value combinations to
+                             precompute for one plot.
+                             [default: 1000]
   -e --execute               Executes the notebook before converting to HTML,
                              functioning like the equivalent flag for
                              nbconvert. Configure NbiExecutePreprocessor to
                              change conversion instead of the base
                              ExecutePreprocessor.
+  --kernels=N                With --execute, keeps N kernels started in each
+                             conversion process and reuses them between
+                             notebooks. Each notebook gets a fresh namespace,
+                             but reuse isn't hermetic: changes a notebook
+                             makes to imported modules, like NumPy's random
+                             seed or matplotlib's rcParams, carry over to the
+                             next notebook. By default, a new kernel is
+                             started for every notebook.
+                             [default: 0]
+  --preimport=MODULES        Comma-separated modules that pooled kernels
+                             import before running any notebook.
+                             [default: numpy,ipywidgets,bqplot,nbinteract]
+  --kernel-reuse=K           Replaces a pooled kernel after it has executed K
+                             notebooks.
+                             [default: 10]
+  --no-exec-cache            With --execute, runs every notebook even if its
+                             code cells haven't changed. By default, outputs
+                             are cached in .nbinteract-cache/ and notebooks
+                             whose code cells are all cached aren't executed.
+                             Changes to data files that cells read aren't
+                             detected, so pass this after changing them.
+  -j N --jobs=N              Converts notebooks in N worker processes. Defaults
+                             to the number of CPUs on this machine. Pass 1 to
+                             convert in the current process. Ignored while a
+                             conversion server runs.
+  --fast-read                Reads notebooks without validating them against
+                             the notebook schema and drops the widget state
+                             saved in their metadata, which pages only use
+                             for widget snapshots. Much faster for large
+                             notebooks. Only use it for notebooks you trust
+                             to be valid.
+  --optimize                 Minifies each page's HTML, leaving the contents
+                             of <pre>, <code> and <script> elements as they
+                             are, and writes precompressed .html.gz (and
+                             .html.br if the brotli package is installed)
+                             copies next to each page for static hosts to
+                             serve. Reports each page's size before and after.
+  -f --force                 Converts every notebook even if its HTML file is
+                             up to date. By default, notebooks that haven't
+                             changed since the last build are skipped using
+                             the manifest in .nbinteract-cache/.
+  --trace=FILE               Records how long each notebook, conversion stage,
+                             and executed cell took and writes the timings to
+                             FILE in the Chrome trace event format. Open FILE
+                             in https://ui.perfetto.dev to view it.
+  --timings                  Prints the slowest notebooks and cells and the
+                             time spent in each conversion stage.
+  --socket=PATH              Unix socket of the conversion server. Defaults to
+                             $NBINTERACT_SOCKET or nbinteract-{uid}.sock in
+                             the temp folder.
+  --stdio                    Makes `nbinteract serve` read newline-delimited
+                             JSON requests from stdin and write responses to
+                             stdout instead of listening on a socket.
 '''
 from docopt import docopt, DocoptExit
 from glob import glob
@@ -59,12 +188,29 @@ import sys
 from textwrap import wrap
 import subprocess
 import json
-import fnmatch
-from collections import defaultdict
-
-import nbformat
-from traitlets.config import Config
-from .exporters import InteractExporter
+import functools
+import multiprocessing
+import multiprocessing.util
+import shutil
+import tempfile
+import time
+import traceback
+import itertools
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# nbformat, nbconvert and the modules that use them are imported in the
+# functions that need them. Importing them takes most of a second, which
+# `nbinteract --help`, argument errors and builds with nothing to convert
+# don't need to pay.
+from . import server, tracing
+from .discovery import IGNORE_FILES, find_notebooks
+from .kernels import merge_stats, summarize_stats
+from .manifest import BuildManifest, config_hash
+from .optimize import remove_precompressed, write_precompressed
+from .precompute import ENV_VAR as PRECOMPUTE_ENV_VAR, make_budget
+from .reader import read_notebook
+from .watcher import NotebookWatcher
 
 BLUE = "\033[0;34m"
 RED = "\033[91m"
@@ -83,6 +229,19 @@ DOCKER_DOCS = 'https://mybinder.readthedocs.io/en/latest/dockerfile.html'
 ERROR = 1
 SUCCESS = 0
 
+# Folder in the --output folder that --shared-assets writes into
+ASSETS_FOLDER = 'nbinteract-assets'
+
+# Folder in the --output folder that --sidecar-outputs writes into
+SIDECAR_FOLDER = 'nbinteract-outputs'
+
+# nbinteract-core bundle built by `npm run build`, which pages made with
+# --template local and --shared-assets load
+LOCAL_CORE_BUNDLE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'packages', 'nbinteract-core', 'lib', 'index.bundle.js'
+)
+
 DEFAULT_REQUIREMENTS_TXT = '''
 numpy
 ipywidgets
@@ -105,12 +264,6 @@ def binder_spec_from_github_url(github_url):
     return '{}/{}/master'.format(tokens[-2], tokens[-1])
 
 
-def flatmap(fn, iterable, *args, **kwargs):
-    return [
-        mapped for item in iterable for mapped in fn(item, *args, **kwargs)
-    ]
-
-
 def color(text, text_color):
     return text_color + text + NOCOLOR
 
@@ -170,6 +323,17 @@ def main():
         return_code = init()
         sys.exit(return_code)
 
+    if arguments['serve']:
+        if arguments['--stdio']:
+            server.serve_stdio()
+        else:
+            server.serve(arguments['--socket'])
+        return
+
+    if arguments['watch']:
+        watch(arguments)
+        return
+
     run_converter(arguments)
 
 
@@ -177,6 +341,219 @@ def run_converter(arguments):
     """
     Converts notebooks to HTML files. Returns list of output file paths
     """
+    exporter_config = load_exporter_config(arguments)
+    execution_options = load_execution_options(arguments)
+    trace = bool(arguments['--trace'] or arguments['--timings'])
+    if trace:
+        tracing.enable()
+
+    found = find_notebooks_in_arguments(arguments)
+
+    manifest = BuildManifest()
+    config_key = config_hash(
+        exporter_config, arguments['--output'],
+        fast_read=arguments['--fast-read'],
+    )
+    stale = manifest.remove_stale()
+
+    # Every notebook found and the ones that are up to date, filled in as
+    # to_convert is consumed
+    notebooks = []
+    skipped = []
+
+    def notebooks_to_convert():
+        for notebook in found:
+            notebooks.append(notebook)
+            if arguments['--force'] or not manifest.is_up_to_date(
+                notebook, config_key
+            ):
+                yield notebook
+            else:
+                skipped.append(notebook)
+
+    # Notebooks are converted while folders are still being searched
+    to_convert = notebooks_to_convert()
+
+    log('Converting notebooks to HTML...')
+
+    # Maps each notebook to its output file so output_files keeps the same
+    # order as notebooks even though up-to-date notebooks are skipped.
+    outputs = {}
+    failed = []
+    converted = 0
+    results = None
+    # The conversion server can't record spans in this process
+    if not trace and server.is_running(arguments['--socket']):
+        # Requests to the server list every notebook up front
+        to_convert = list(to_convert)
+        if to_convert:
+            if arguments['--jobs'] is not None:
+                log(
+                    'Ignoring --jobs since the conversion server converts '
+                    'notebooks one at a time.'
+                )
+            results = _convert_with_server(
+                to_convert,
+                exporter_config,
+                execution_options=execution_options,
+                socket_path=arguments['--socket'],
+                output_folder=arguments['--output'],
+                images_folder=arguments['--images'],
+                fast_read=arguments['--fast-read'],
+            )
+    if results is None:
+        results = convert_all(
+            to_convert,
+            exporter_config,
+            jobs=int(arguments['--jobs'] or os.cpu_count() or 1),
+            execution_options=execution_options,
+            trace=trace,
+            output_folder=arguments['--output'],
+            images_folder=arguments['--images'],
+            fast_read=arguments['--fast-read'],
+        )
+    extracted_images = []
+    for notebook, output_file, images, sizes, err in results:
+        if err:
+            failed.append(notebook)
+            error('Failed to convert {}:\n{}'.format(notebook, err))
+            continue
+        converted += 1
+        outputs[notebook] = output_file
+        # Shared assets and sidecar outputs are written with the images
+        if arguments['--images']:
+            extracted_images.extend(
+                image for image in images
+                if os.path.normpath(os.path.dirname(image)) ==
+                os.path.normpath(arguments['--images'])
+            )
+        manifest.record(notebook, config_key, output_file, images)
+        log('Converted {} to {}'.format(notebook, output_file))
+        if sizes:
+            log(page_size_summary(output_file, sizes))
+
+    for notebook in skipped:
+        outputs[notebook] = manifest.output_file(notebook)
+    manifest.save()
+    output_files = [outputs[nb] for nb in notebooks if nb in outputs]
+    if trace:
+        report_timings(arguments)
+
+    log(
+        'Built {} notebooks, skipped {} up to date, deleted {} stale.'
+        .format(converted, len(skipped), len(stale))
+    )
+
+    if failed:
+        error(
+            'Failed to convert {} of {} notebooks: {}'
+            .format(len(failed), len(notebooks), failed)
+        )
+        sys.exit(ERROR)
+
+    log('Done!')
+
+    if arguments['--images']:
+        log('Resulting images located in {}'.format(arguments['--images']))
+    if arguments['--hash-images'] and extracted_images:
+        log(image_savings_summary(extracted_images))
+
+    return output_files
+
+
+def watch(arguments, interval=0.25, debounce=0.5):
+    """
+    Watches notebooks for changes and reconverts each notebook after it's
+    saved. Runs until interrupted.
+
+    Keeps a single exporter in memory so each rebuild only pays for converting
+    the changed notebook.
+    """
+    exporter_config = load_exporter_config(arguments)
+    execution = init_execution(load_execution_options(arguments))
+    kernel_pool = execution.get('kernel_pool')
+    exporter = init_exporter(**execution, **exporter_config)
+
+    trace = bool(arguments['--trace'] or arguments['--timings'])
+    if trace:
+        tracing.enable()
+
+    manifest = BuildManifest()
+    config_key = config_hash(
+        exporter_config, arguments['--output'],
+        fast_read=arguments['--fast-read'],
+    )
+
+    def list_notebooks():
+        return list(find_notebooks_in_arguments(arguments))
+
+    watcher = NotebookWatcher(list_notebooks, debounce=debounce)
+    log(
+        'Watching {} for changes. Press Ctrl-C to stop.'
+        .format(', '.join(arguments['NOTEBOOKS']))
+    )
+
+    try:
+        while True:
+            time.sleep(interval)
+            for notebook in watcher.poll():
+                start = time.perf_counter()
+                try:
+                    output_file, images, sizes = convert_notebook(
+                        notebook,
+                        exporter=exporter,
+                        output_folder=arguments['--output'],
+                        images_folder=arguments['--images'],
+                        fast_read=arguments['--fast-read'],
+                    )
+                except Exception:
+                    error(
+                        'Failed to convert {}:\n{}'
+                        .format(notebook, traceback.format_exc())
+                    )
+                    continue
+
+                manifest.record(notebook, config_key, output_file, images)
+                manifest.save()
+                log(
+                    'Converted {} to {} in {:.2f}s'.format(
+                        notebook, output_file,
+                        time.perf_counter() - start
+                    )
+                )
+                if sizes:
+                    log(page_size_summary(output_file, sizes))
+    except KeyboardInterrupt:
+        log('Stopped watching.')
+    finally:
+        if kernel_pool:
+            kernel_pool.shutdown()
+            log(kernel_pool.summary())
+        if trace:
+            report_timings(arguments)
+
+
+def report_timings(arguments):
+    """
+    Writes the recorded spans to the --trace file and prints the --timings
+    table, then stops tracing.
+    """
+    trace_events = tracing.events()
+    tracing.disable()
+
+    if arguments['--trace']:
+        tracing.save(arguments['--trace'], trace_events)
+        log('Wrote trace to {}'.format(arguments['--trace']))
+    if arguments['--timings']:
+        for line in tracing.timings_table(trace_events):
+            log(line)
+
+
+def load_exporter_config(arguments):
+    """
+    Fills in defaults from the config file, validates arguments, and returns
+    the kwargs for init_exporter().
+    """
     # Get spec from config file
     if os.path.isfile(CONFIG_FILE):
         with open(CONFIG_FILE, encoding='utf-8') as f:
@@ -185,39 +562,119 @@ def run_converter(arguments):
 
     check_arguments(arguments)
 
-    notebooks = flatmap(
-        expand_folder,
-        arguments['NOTEBOOKS'],
-        recursive=arguments['--recursive']
-    )
+    return {
+        'extract_images': arguments['--images'],
+        'hash_images': arguments['--hash-images'],
+        'spec': arguments['--spec'],
+        'template_file': arguments['--template'],
+        'button_at_top': (not arguments['--no-top-button']),
+        'optimize': arguments['--optimize'],
+        'execute': arguments['--execute'],
+        'optimize_images': arguments['--optimize-images'],
+        'max_image_width': int(arguments['--max-image-width'] or 0),
+        'webp': arguments['--webp'],
+        'assets_folder': (
+            os.path.join(arguments['--output'], ASSETS_FOLDER)
+            if arguments['--shared-assets'] else None
+        ),
+        'truncate_outputs': not arguments['--no-truncate'],
+        'widget_snapshots': arguments['--widget-snapshots'],
+        'minimal_cells': arguments['--minimal-cells'],
+        'precompute_budget': (
+            make_budget(int(arguments['--precompute-budget']))
+            if arguments['--precompute'] else None
+        ),
+        'sidecar_folder': (
+            os.path.join(arguments['--output'], SIDECAR_FOLDER)
+            if arguments['--sidecar-outputs'] else None
+        ),
+    }
+
+
+def load_execution_options(arguments):
+    """
+    Returns the options for executing notebooks that init_execution() takes,
+    or None if notebooks aren't executed.
 
-    exporter = init_exporter(
-        extract_images=arguments['--images'],
-        spec=arguments['--spec'],
-        template_file=arguments['--template'],
-        button_at_top=(not arguments['--no-top-button']),
-        execute=arguments['--execute'],
-    )
+    The options are kept out of the exporter config since they don't change
+    the generated HTML.
+    """
+    if not arguments['--execute']:
+        return None
+
+    kernel_pool = None
+    if int(arguments['--kernels']) > 0:
+        kernel_pool = {
+            'size': int(arguments['--kernels']),
+            'preimport': [
+                module.strip()
+                for module in arguments['--preimport'].split(',')
+                if module.strip()
+            ],
+            'max_uses': int(arguments['--kernel-reuse']),
+        }
+    return {
+        'kernel_pool': kernel_pool,
+        'cache': not arguments['--no-exec-cache'],
+    }
+
+
+def init_execution(execution_options):
+    """
+    Returns the kernel pool and execution cache described by
+    execution_options as kwargs for init_exporter().
+    """
+    if not execution_options:
+        return {}
 
-    log('Converting notebooks to HTML...')
+    from .execution_cache import ExecutionCache
+    from .kernels import KernelPool
 
-    output_files = []
-    for notebook in notebooks:
-        output_file = convert(
-            notebook,
-            exporter=exporter,
-            output_folder=arguments['--output'],
-            images_folder=arguments['--images']
+    kernel_pool_options = execution_options.get('kernel_pool')
+    return {
+        'kernel_pool': (
+            KernelPool(**kernel_pool_options) if kernel_pool_options else None
+        ),
+        'execution_cache': (
+            ExecutionCache() if execution_options.get('cache') else None
+        ),
+    }
+
+
+def image_savings_summary(images):
+    """
+    Given the image paths extracted from each converted notebook (including
+    repeats), returns a message with the space saved by storing each unique
+    image once.
+    """
+    unique = set(images)
+    total_bytes = sum(os.path.getsize(image) for image in images)
+    unique_bytes = sum(os.path.getsize(image) for image in unique)
+    return (
+        'Extracted {} images into {} unique files, saving {:.1f} KB.'.format(
+            len(images), len(unique), (total_bytes - unique_bytes) / 1024
         )
-        output_files.append(output_file)
-        log('Converted {} to {}'.format(notebook, output_file))
+    )
 
-    log('Done!')
 
-    if arguments['--images']:
-        log('Resulting images located in {}'.format(arguments['--images']))
+def page_size_summary(output_file, sizes):
+    """
+    Given a page and the sizes returned by convert_notebook() for it, returns
+    a message with the page's size before and after --optimize.
+    """
+    after = ['{} minified'.format(_kilobytes(sizes['minified']))]
+    for encoding in ('gzip', 'brotli'):
+        if encoding in sizes:
+            after.append(
+                '{} {}'.format(_kilobytes(sizes[encoding]), encoding)
+            )
+    return '{}: {} -> {}'.format(
+        output_file, _kilobytes(sizes['original']), ', '.join(after)
+    )
 
-    return output_files
+
+def _kilobytes(size):
+    return '{:.1f} KB'.format(size / 1024)
 
 
 def init():
@@ -351,6 +808,79 @@ def check_arguments(arguments):
         )
         raise DocoptExit()
 
+    if arguments['--hash-images'] and not arguments['--images']:
+        error(
+            'If --hash-images is specified, --images must also be specified. '
+            'Exiting...'
+        )
+        raise DocoptExit()
+
+    for option in ('--max-image-width', '--webp'):
+        if arguments[option] and not arguments['--optimize-images']:
+            error(
+                'If {} is specified, --optimize-images must also be '
+                'specified. Exiting...'.format(option)
+            )
+            raise DocoptExit()
+
+    if arguments['--webp'] and not arguments['--images']:
+        error(
+            'If --webp is specified, --images must also be specified. '
+            'Exiting...'
+        )
+        raise DocoptExit()
+
+    if arguments['--max-image-width'] or arguments['--webp']:
+        from .images import has_pillow
+
+        if not has_pillow():
+            error(
+                '--max-image-width and --webp need Pillow. Install it with '
+                '`pip install nbinteract[images]`. Exiting...'
+            )
+            raise DocoptExit()
+
+    if arguments['--precompute'] and not (
+        arguments['--execute'] and arguments['--widget-snapshots']
+    ):
+        error(
+            'If --precompute is specified, --execute and --widget-snapshots '
+            'must also be specified. Exiting...'
+        )
+        raise DocoptExit()
+
+    if arguments['--shared-assets'] and not arguments['--output']:
+        error(
+            'If --shared-assets is specified, --output must also be '
+            'specified. Exiting...'
+        )
+        raise DocoptExit()
+
+    if arguments['--sidecar-outputs'] and not arguments['--output']:
+        error(
+            'If --sidecar-outputs is specified, --output must also be '
+            'specified. Exiting...'
+        )
+        raise DocoptExit()
+
+    if arguments['--sidecar-outputs'] and arguments['--no-truncate']:
+        error(
+            '--sidecar-outputs can\'t be used with --no-truncate. Exiting...'
+        )
+        raise DocoptExit()
+
+    if (
+        arguments['--shared-assets'] and arguments['--template'] == 'local'
+        and not os.path.isfile(LOCAL_CORE_BUNDLE)
+    ):
+        error(
+            '--shared-assets with --template local copies {}, which '
+            "doesn't exist. Run `npm run build` in "
+            'packages/nbinteract-core first. Exiting...'
+            .format(LOCAL_CORE_BUNDLE)
+        )
+        raise DocoptExit()
+
     if arguments['--template'] not in VALID_TEMPLATES:
         error(
             'Unsupported template: "{}". Template must be one of: \n{}'
@@ -358,6 +888,46 @@ def check_arguments(arguments):
         )
         raise DocoptExit()
 
+    check_integer(arguments, '--jobs', minimum=1)
+    check_integer(arguments, '--kernels', minimum=0)
+    check_integer(arguments, '--kernel-reuse', minimum=1)
+    check_integer(arguments, '--max-image-width', minimum=1)
+    check_integer(arguments, '--precompute-budget', minimum=1)
+
+
+def check_integer(arguments, option, minimum):
+    value = arguments[option]
+    if value is not None and not (
+        str(value).isdigit() and int(value) >= minimum
+    ):
+        error(
+            '{} must be an integer of at least {} but got {}. Exiting...'
+            .format(option, minimum, value)
+        )
+        raise DocoptExit()
+
+
+def find_notebooks_in_arguments(arguments):
+    """
+    Returns an iterator over the notebooks selected by NOTEBOOKS, --recursive,
+    --include, --exclude and --use-ignore-files. Raises a ValueError if one of
+    NOTEBOOKS doesn't exist.
+    """
+    def patterns(option):
+        return [
+            pattern.strip()
+            for pattern in (arguments[option] or '').split(',')
+            if pattern.strip()
+        ]
+
+    return find_notebooks(
+        arguments['NOTEBOOKS'],
+        recursive=arguments['--recursive'],
+        include=patterns('--include'),
+        exclude=patterns('--exclude'),
+        ignore_files=IGNORE_FILES if arguments['--use-ignore-files'] else (),
+    )
+
 
 def expand_folder(notebook_or_folder, recursive=False):
     """
@@ -366,62 +936,369 @@ def expand_folder(notebook_or_folder, recursive=False):
 
     If recursive is True, recurses into subdirectories.
     """
-    is_file = os.path.isfile(notebook_or_folder)
-    is_dir = os.path.isdir(notebook_or_folder)
-    if not (is_file or is_dir):
-        raise ValueError(
-            '{} is neither an existing file nor a folder.'
-            .format(notebook_or_folder)
-        )
+    return list(iter_folder(notebook_or_folder, recursive=recursive))
 
-    if is_file:
-        return [notebook_or_folder]
 
-    # Now we know the input is a directory
-    if not recursive:
-        return glob('{}/*.ipynb'.format(notebook_or_folder))
-
-    # Recursive case
-    return [
-        os.path.join(folder, filename)
-        for folder, _, filenames in os.walk(notebook_or_folder)
-        # Skip folders that start with .
-        if not os.path.basename(folder).startswith('.')
-        for filename in fnmatch.filter(filenames, '*.ipynb')
-    ]
-
-
-def init_exporter(extract_images, execute, **exporter_config):
+def iter_folder(notebook_or_folder, recursive=False):
     """
-    Returns an initialized exporter.
+    Like expand_folder(), but returns an iterator that yields notebooks while
+    the folder is still being searched.
     """
+    return find_notebooks([notebook_or_folder], recursive=recursive)
+
+
+def init_exporter(
+    extract_images,
+    execute,
+    hash_images=False,
+    optimize_images=False,
+    max_image_width=0,
+    webp=False,
+    assets_folder=None,
+    truncate_outputs=True,
+    sidecar_folder=None,
+    widget_snapshots=False,
+    minimal_cells=False,
+    precompute_budget=None,
+    kernel_pool=None,
+    execution_cache=None,
+    **exporter_config
+):
+    """
+    Returns an initialized exporter. If optimize_images is True, images are
+    recompressed, downscaled to max_image_width if it's set, and given WebP
+    copies if webp is True. If assets_folder is set, the CSS and JS
+    that pages share are written into it instead of into every page. If
+    truncate_outputs is True, outputs that are too large are cut, and their
+    full contents are written into sidecar_folder if it's set. If
+    widget_snapshots is True, pages embed the state of their widgets. If
+    minimal_cells is True, pages only run the cells their widgets need. If
+    precompute_budget is set, executed notebooks precompute their plots
+    within that budget (see nbinteract.precompute). If
+    kernel_pool is set, executed notebooks run in kernels borrowed from it.
+    If execution_cache is set, notebooks whose code cells are cached replay
+    their outputs instead of running.
+    """
+    from traitlets.config import Config
+    from .exporters import InteractExporter
+    from .preprocessors import (
+        NbiExecutePreprocessor, TruncateOutputPreprocessor
+    )
+
     config = Config(InteractExporter=exporter_config)
 
     preprocessors = []
-    if extract_images:
+    if extract_images and hash_images:
+        # Name extracted images by their contents so duplicates share a file
+        preprocessors.append(
+            'nbinteract.preprocessors.HashExtractOutputPreprocessor'
+        )
+    elif extract_images:
         # Use ExtractOutputPreprocessor to extract the images to separate files
         preprocessors.append(
             'nbconvert.preprocessors.ExtractOutputPreprocessor'
         )
-    if execute:
-        # Use the NbiExecutePreprocessor to correctly generate widget output
-        # for interact() calls.
-        preprocessors.append('nbinteract.preprocessors.NbiExecutePreprocessor')
 
-    config.InteractExporter.preprocessors = preprocessors
+    if optimize_images:
+        # Runs after extraction so it optimizes the extracted files
+        preprocessors.append(
+            'nbinteract.preprocessors.ImageOptimizePreprocessor'
+        )
+        config.ImageOptimizePreprocessor.max_width = max_image_width
+        config.ImageOptimizePreprocessor.webp = webp
+
+    if assets_folder:
+        preprocessors.append(
+            'nbinteract.preprocessors.SharedAssetsPreprocessor'
+        )
+        config.SharedAssetsPreprocessor.assets_folder = assets_folder
+        config.SharedAssetsPreprocessor.minify = bool(
+            exporter_config.get('optimize')
+        )
+        if exporter_config.get('template_file') == 'local':
+            config.SharedAssetsPreprocessor.core_js = LOCAL_CORE_BUNDLE
+
+    if widget_snapshots:
+        preprocessors.append(
+            'nbinteract.preprocessors.WidgetSnapshotPreprocessor'
+        )
+
+    if minimal_cells:
+        preprocessors.append(
+            'nbinteract.preprocessors.MinimalCellsPreprocessor'
+        )
 
     exporter = InteractExporter(config=config)
+    if execute:
+        # Use the NbiExecutePreprocessor to correctly generate widget output
+        # for interact() calls. It's registered as an instance since traitlets
+        # config copies its values, and the kernel pool can't be copied.
+        exporter.register_preprocessor(
+            NbiExecutePreprocessor(
+                parent=exporter,
+                kernel_pool=kernel_pool,
+                execution_cache=execution_cache,
+                kernel_env=(
+                    {PRECOMPUTE_ENV_VAR: precompute_budget}
+                    if precompute_budget else {}
+                ),
+            ),
+            enabled=True,
+        )
+    if truncate_outputs:
+        # Registered after execution so executed outputs are cut too
+        truncate = TruncateOutputPreprocessor(parent=exporter)
+        if sidecar_folder:
+            truncate.sidecar_folder = sidecar_folder
+        exporter.register_preprocessor(truncate, enabled=True)
+
+    # Registered after execution instead of set in the config, which nbconvert
+    # runs first, so images made by executing notebooks are extracted too
+    for preprocessor in preprocessors:
+        exporter.register_preprocessor(preprocessor, enabled=True)
     return exporter
 
 
-def make_exporter_resources(nb_name, out_folder, images_folder=None):
+# Exporter and kernel pool used by each worker process in convert_all(). Set
+# once per process by _init_worker() so that workers don't rebuild the
+# exporter or restart kernels per notebook.
+_worker_exporter = None
+_worker_kernel_pool = None
+
+
+def _init_worker(
+    exporter_config,
+    execution_options=None,
+    stats_queue=None,
+    trace_folder=None,
+):
     """
-    Creates resources dict for the exporter
+    Sets up this process's exporter. If stats_queue is set, the kernel pool's
+    stats are put on the queue when the worker process exits. If trace_folder
+    is set, spans are recorded and written to a file in trace_folder when the
+    worker process exits.
+    """
+    global _worker_exporter, _worker_kernel_pool
+    if trace_folder:
+        tracing.enable()
+        multiprocessing.util.Finalize(
+            None,
+            _save_worker_trace,
+            args=(trace_folder, ),
+            exitpriority=10,
+        )
+
+    execution = init_execution(execution_options)
+    _worker_kernel_pool = execution.get('kernel_pool')
+    _worker_exporter = init_exporter(**execution, **exporter_config)
+
+    if _worker_kernel_pool and stats_queue is not None:
+        multiprocessing.util.Finalize(
+            _worker_kernel_pool,
+            _shutdown_worker_kernel_pool,
+            args=(_worker_kernel_pool, stats_queue),
+            exitpriority=10,
+        )
+
+
+def _save_worker_trace(trace_folder):
+    # Trace files can be too large to send through a pipe that isn't read
+    # until the worker exits, so each worker writes its own file
+    tracing.save(
+        os.path.join(trace_folder, '{}.json'.format(os.getpid()))
+    )
+
+
+def _shutdown_worker_kernel_pool(kernel_pool, stats_queue):
+    kernel_pool.shutdown()
+    stats_queue.put(kernel_pool.stats)
+
+
+def _convert_in_worker(notebook_path, **convert_kwargs):
+    """
+    Converts a notebook using this process's exporter. Returns a tuple of
+    (output_file, images, sizes, error) where error is None if the conversion
+    succeeded and the formatted traceback otherwise.
+    """
+    try:
+        return convert_notebook(
+            notebook_path, exporter=_worker_exporter, **convert_kwargs
+        ) + (None, )
+    except Exception:
+        return None, [], None, traceback.format_exc()
+
+
+def convert_all(
+    notebooks,
+    exporter_config,
+    jobs=1,
+    execution_options=None,
+    trace=False,
+    **convert_kwargs
+):
+    """
+    Converts each notebook in notebooks, which can be any iterable, using up
+    to `jobs` worker processes. Notebooks are handed to workers as they're
+    taken from notebooks, so a generator that's still searching folders keeps
+    the workers busy.
+    Each worker initializes its own exporter with
+    init_exporter(**exporter_config) and, if execution_options is set, its
+    own kernel pool and execution cache with init_execution(). If trace is
+    True, the spans recorded by workers are added to this process's trace.
+
+    Returns an iterator of (notebook, output_file, images, sizes, error)
+    tuples in the same order as notebooks, where images lists the extracted
+    image files and sizes is the page sizes returned by convert_notebook().
+    If a notebook fails to convert, output_file is None and error contains the
+    traceback; the remaining notebooks are still converted.
+    """
+    # Only start as many workers as there are notebooks
+    notebooks = iter(notebooks)
+    first_notebooks = list(itertools.islice(notebooks, jobs))
+    if not first_notebooks:
+        return
+    jobs = min(jobs, len(first_notebooks))
+    notebooks = itertools.chain(first_notebooks, notebooks)
+
+    convert_one = functools.partial(_convert_in_worker, **convert_kwargs)
+
+    # Skip the process pool overhead when there's nothing to parallelize
+    if jobs <= 1:
+        _init_worker(exporter_config, execution_options)
+        try:
+            for notebook in notebooks:
+                yield (notebook, ) + convert_one(notebook)
+        finally:
+            if _worker_kernel_pool:
+                _worker_kernel_pool.shutdown()
+                log(_worker_kernel_pool.summary())
+        return
+
+    stats_queue = multiprocessing.SimpleQueue()
+    trace_folder = None
+    if trace:
+        trace_folder = tempfile.mkdtemp(prefix='nbinteract-trace-')
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(
+            exporter_config, execution_options, stats_queue, trace_folder
+        ),
+    ) as pool:
+        # Yields results in the same order as notebooks. Finished results
+        # are yielded between submissions so they're reported while the rest
+        # of the notebooks are still being found.
+        pending = deque()
+        for notebook in notebooks:
+            pending.append((notebook, pool.submit(convert_one, notebook)))
+            while pending and pending[0][1].done():
+                notebook, future = pending.popleft()
+                yield (notebook, ) + future.result()
+        for notebook, future in pending:
+            yield (notebook, ) + future.result()
+
+    if trace_folder:
+        for trace_file in glob(os.path.join(trace_folder, '*.json')):
+            with open(trace_file, encoding='utf-8') as f:
+                tracing.add_events(json.load(f)['traceEvents'])
+        shutil.rmtree(trace_folder)
+
+    # Workers report their kernel pool stats as they exit
+    if execution_options and execution_options['kernel_pool']:
+        all_stats = []
+        while not stats_queue.empty():
+            all_stats.append(stats_queue.get())
+        log(summarize_stats(merge_stats(all_stats)))
+
+
+def _convert_with_server(
+    notebooks,
+    exporter_config,
+    socket_path,
+    execution_options=None,
+    **kwargs
+):
+    """
+    Converts notebooks using the conversion server if one is running. Returns
+    a list of tuples like convert_all(), or None if no server is available.
+    """
+    response = server.convert(
+        notebooks,
+        exporter_config,
+        socket_path=socket_path,
+        execution_options=execution_options,
+        **kwargs
+    )
+    if response is None:
+        return None
+
+    log(
+        'Converted with conversion server in {:.2f}s ({})'.format(
+            response['seconds'], 'warm' if response['warm'] else 'cold'
+        )
+    )
+    return [(
+        result['notebook'],
+        result['output_file'],
+        result['images'],
+        result.get('sizes'),
+        result['error'],
+    ) for result in response['results']]
+
+
+def write_chunks(path, chunks):
+    """
+    Writes each string in chunks to the file at path as the chunks are
+    generated.
+
+    Writes to a temporary file that replaces path once all chunks are written
+    so readers never see a partially written file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as outfile:
+            for chunk in chunks:
+                outfile.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_if_changed(path, data: bytes) -> bool:
+    """
+    Writes data to the file at path unless the file already contains data.
+    Returns True if the file was written.
+
+    Avoids rewriting images that haven't changed so their modification times
+    are preserved for tools that sync the output folder. Writes go through a
+    temporary file so workers writing the same image don't collide.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def make_exporter_resources(nb_name, nb_folder, images_folder=None):
+    """
+    Creates resources dict for the exporter. Executed notebooks run in
+    nb_folder.
     """
     resources = defaultdict(str)
     resources['metadata'] = defaultdict(str)
     resources['metadata']['name'] = nb_name
-    resources['metadata']['path'] = out_folder
+    resources['metadata']['path'] = nb_folder
 
     # This results in images like AB_5_1.png for a notebook called AB.ipynb
     resources['unique_key'] = nb_name
@@ -430,13 +1307,43 @@ def make_exporter_resources(nb_name, out_folder, images_folder=None):
     return resources
 
 
-def convert(notebook_path, exporter, output_folder=None, images_folder=None):
+def convert(
+    notebook_path,
+    exporter,
+    output_folder=None,
+    images_folder=None,
+    fast_read=False,
+):
     """
     Converts notebook into an HTML file, outputting notebooks into
-    output_folder if set and images into images_folder if set.
+    output_folder if set and images into images_folder if set. If fast_read
+    is True, the notebook is read with read_notebook(fast=True).
 
     Returns the path to the resulting HTML file.
     """
+    outfile_path, _, _ = convert_notebook(
+        notebook_path, exporter, output_folder, images_folder, fast_read
+    )
+    return outfile_path
+
+
+def convert_notebook(
+    notebook_path,
+    exporter,
+    output_folder=None,
+    images_folder=None,
+    fast_read=False,
+):
+    """
+    Like convert(), but returns a tuple of the path to the resulting HTML
+    file, the list of image files written, and the page's sizes.
+
+    If the exporter optimizes pages, precompressed copies of the page are
+    written next to it and sizes is a dict mapping 'original', 'minified',
+    'gzip' and, if brotli is installed, 'brotli' to the page's size in bytes.
+    Otherwise, sizes is None and precompressed copies left by earlier builds
+    are removed so they never go stale.
+    """
     if output_folder:
         os.makedirs(output_folder, exist_ok=True)
     if images_folder:
@@ -454,24 +1361,64 @@ def convert(notebook_path, exporter, output_folder=None, images_folder=None):
     out_folder = path if not output_folder else output_folder
     outfile_path = os.path.join(out_folder, outfile_name)
 
-    notebook = nbformat.read(notebook_path, as_version=4)
+    with tracing.span(notebook_path, 'notebook'):
+        with tracing.span('read notebook', 'stage'):
+            notebook = read_notebook(notebook_path, fast=fast_read)
 
-    html, resources = exporter.from_notebook_node(
-        notebook,
-        resources=make_exporter_resources(basename, out_folder, images_folder),
-    )
+        html_chunks, resources = exporter.stream_notebook_node(
+            notebook,
+            resources=make_exporter_resources(basename, path, images_folder),
+        )
 
-    # Write out HTML
-    with open(outfile_path, 'w', encoding='utf-8') as outfile:
-        outfile.write(html)
+        # Write out HTML. The template is rendered as the chunks are written,
+        # so the span records how much of its time went to rendering.
+        with tracing.span('render and write HTML', 'stage') as args:
+            write_chunks(outfile_path, _timed_chunks(html_chunks, args))
+
+        # Write out images and shared assets. If neither images_folder nor
+        # the exporter's assets folder was specified, resources['outputs'] is
+        # None so this loop won't run
+        with tracing.span('write images', 'stage'):
+            for image_path, image_data in resources.get('outputs',
+                                                        {}).items():
+                folder = os.path.dirname(image_path)
+                if folder and folder != images_folder:
+                    os.makedirs(folder, exist_ok=True)
+                write_if_changed(image_path, image_data)
+
+        sizes = None
+        if getattr(exporter, 'optimize', False):
+            with tracing.span('precompress HTML', 'stage'):
+                stats = resources['optimize']
+                sizes = {
+                    'original': stats['original_bytes'],
+                    'minified': stats['minified_bytes'],
+                }
+                sizes.update(write_precompressed(outfile_path))
+        else:
+            remove_precompressed(outfile_path)
 
-    # Write out images. If images_folder wasn't specified, resources['outputs']
-    # is None so this loop won't run
-    for image_path, image_data in resources.get('outputs', {}).items():
-        with open(image_path, 'wb') as outimage:
-            outimage.write(image_data)
+    return outfile_path, list(resources.get('outputs', {})), sizes
 
-    return outfile_path
+
+def _timed_chunks(chunks, args):
+    """
+    Yields each chunk, adding the seconds spent generating chunks to
+    args['render_seconds'] when tracing is enabled.
+    """
+    if not tracing.is_enabled():
+        yield from chunks
+        return
+
+    args['render_seconds'] = 0.0
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        args['render_seconds'] += time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
 
 
 if __name__ == '__main__':
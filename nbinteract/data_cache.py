@@ -0,0 +1,355 @@
+"""
+Memoizes the data that plots compute for each set of widget values, for
+plots made with the cache option.
+
+Readers drag sliders back and forth, so plots often recompute data for
+widget values they computed seconds ago. A DataCache keeps recent results in
+memory, bounded by the total bytes of their arrays, and can also store them
+as .npy files that are memory-mapped back in, so a restarted kernel doesn't
+recompute them.
+
+Results in memory are only shared by the plot that computed them. Results on
+disk are keyed by the plot's functions' code, defaults, closures and the
+globals they read, so the same plot made in a new kernel finds them. Plots
+whose functions read globals that can't be keyed, like objects of other
+classes, only keep their results in memory.
+"""
+import collections
+import hashlib
+import inspect
+import os
+import shutil
+import sys
+import threading
+import types
+
+import numpy as np
+
+from .manifest import CACHE_FOLDER
+
+CACHE_PATH = os.path.join(CACHE_FOLDER, 'plots')
+
+# Bump this when the format of cache entries changes so that old entries are
+# ignored instead of misread.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Types whose repr() is the same in every kernel
+_SIMPLE_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+
+class DataCache(object):
+    """
+    Stores the data that plots compute, keyed by the values of the plot's
+    widgets.
+
+    When the results in memory take up more than max_bytes, the least
+    recently used ones are dropped. If path is set, results whose values are
+    all NumPy-compatible arrays are also written to path as .npy files.
+    They're kept until clear() is called.
+
+    >>> cache = DataCache()
+    >>> square = cache.memoize(lambda n: {'y': np.arange(n) ** 2}, ['n'])
+    >>> square(n=3)
+    {'y': array([0, 1, 4])}
+    >>> square(n=3)
+    {'y': array([0, 1, 4])}
+    >>> cache.stats['hits'], cache.stats['misses']
+    (1, 1)
+
+    Kwargs:
+        max_bytes (int): Maximum total size of the arrays kept in memory.
+        path (str): Folder to store results in, or None to only keep them in
+            memory. CACHE_PATH is the folder the docs build uses.
+
+    stats holds counters for tuning max_bytes:
+
+    - hits: Results found in memory.
+    - disk_hits: Results loaded from path.
+    - misses: Results that were computed.
+    - evictions: Results dropped from memory to fit in max_bytes.
+    - disk_writes: Results written to path.
+    - bytes: Total size of the results in memory.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.max_bytes = max_bytes
+        self.path = os.path.abspath(path) if path is not None else None
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_writes': 0,
+            'bytes': 0,
+        }
+
+        self._lock = threading.Lock()
+        # Maps keys to (result, size), least recently used first
+        self._entries = collections.OrderedDict()
+
+    def memoize(self, compute, arg_names, sources=None) -> 'Function':
+        """
+        Returns a function that takes the kwargs in arg_names and returns
+        what compute(**kwargs) returns, a dict of trait names to values,
+        using the cache when it can.
+
+        sources is a list of the functions, data and settings that compute
+        uses. If they all have a key from source_key(), results are also
+        stored on disk. Otherwise they're only kept in memory.
+        """
+        arg_names = sorted(arg_names)
+        # Results in memory are only shared by this function
+        token = object()
+
+        disk_prefix = None
+        if self.path is not None and sources is not None:
+            keys = [source_key(source) for source in sources]
+            if all(key is not None for key in keys):
+                disk_prefix = repr([CACHE_VERSION] + keys)
+
+        def cached(**kwargs):
+            args = tuple(kwargs[name] for name in arg_names)
+            try:
+                key = (token, args)
+                hash(key)
+            except TypeError:
+                # Widget values like fixed lists can't be keys
+                return compute(**kwargs)
+
+            result = self._get(key)
+            if result is not None:
+                return result
+
+            disk_key = None
+            if disk_prefix is not None:
+                arg_key = _value_key(args)
+                if arg_key is not None:
+                    disk_key = _hash(disk_prefix + arg_key)
+                    result = self._read(disk_key)
+                    if result is not None:
+                        with self._lock:
+                            self.stats['disk_hits'] += 1
+                        self._put(key, result)
+                        return result
+
+            result = compute(**kwargs)
+            with self._lock:
+                self.stats['misses'] += 1
+            self._put(key, result)
+            if disk_key is not None:
+                self._write(disk_key, result)
+            return result
+
+        return cached
+
+    def clear(self):
+        """
+        Drops every result in memory and deletes the results on disk.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.stats['bytes'] = 0
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def _put(self, key, result):
+        size = _result_size(result)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (result, size)
+            self.stats['bytes'] += size
+            while self.stats['bytes'] > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.stats['bytes'] -= evicted_size
+                self.stats['evictions'] += 1
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key)
+
+    def _read(self, key):
+        path = self._entry_path(key)
+        try:
+            # Files are named {index}-{trait}.npy to keep the traits in order
+            names = sorted(
+                os.listdir(path), key=lambda name: int(name.split('-')[0])
+            )
+            result = {}
+            for name in names:
+                trait = name.split('-', 1)[1][:-len('.npy')]
+                result[trait] = np.asarray(
+                    np.load(os.path.join(path, name), mmap_mode='r')
+                )
+            return result or None
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, result):
+        arrays = {}
+        for trait, value in result.items():
+            array = np.asarray(value)
+            if array.dtype.hasobject:
+                return
+            arrays[trait] = array
+
+        # Written atomically since another kernel might share the folder
+        path = self._entry_path(key)
+        tmp_path = '{}.{}.{}.tmp'.format(
+            path, os.getpid(), threading.get_ident()
+        )
+        try:
+            os.makedirs(tmp_path)
+            for index, (trait, array) in enumerate(arrays.items()):
+                np.save(
+                    os.path.join(tmp_path, '{}-{}.npy'.format(index, trait)),
+                    array,
+                    allow_pickle=False,
+                )
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another kernel wrote it first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        with self._lock:
+            self.stats['disk_writes'] += 1
+
+
+def source_key(source) -> 'str | None':
+    """
+    Returns a string that identifies source, a function, data or setting of
+    a plot, in any kernel. Returns None if source can't be identified.
+
+    A function's key covers its name, code, defaults, closure and the
+    globals it reads.
+
+    >>> source_key(10)
+    '10'
+    >>> source_key(lambda n: n) == source_key(lambda n: n)
+    True
+    >>> source_key(lambda n: n) == source_key(lambda n: n + 1)
+    False
+    """
+    return _value_key(source)
+
+
+def _value_key(value, seen=frozenset()):
+    if isinstance(value, _SIMPLE_TYPES):
+        return repr(value)
+    if isinstance(value, (tuple, list)):
+        keys = [_value_key(item, seen) for item in value]
+        if any(key is None for key in keys):
+            return None
+        return '{}({})'.format(type(value).__name__, ','.join(keys))
+    if isinstance(value, types.ModuleType):
+        return 'module({})'.format(value.__name__)
+    if callable(value):
+        return _function_key(value, seen)
+
+    try:
+        array = np.asarray(value)
+    except Exception:
+        return None
+    if array.dtype.hasobject:
+        return None
+    return 'array({},{},{})'.format(
+        array.dtype.str, array.shape,
+        _hash_bytes(np.ascontiguousarray(array).tobytes())
+    )
+
+
+def _function_key(fn, seen):
+    code = getattr(fn, '__code__', None)
+    # Methods also depend on the state of their object
+    if code is None or inspect.ismethod(fn):
+        return None
+    if id(fn) in seen:
+        # A recursive function's closure holds the function
+        return 'recursive'
+    seen = seen | {id(fn)}
+
+    try:
+        closure = [cell.cell_contents for cell in fn.__closure__ or ()]
+    except ValueError:
+        # The closure has a name that isn't assigned yet
+        return None
+
+    parts = [
+        getattr(fn, '__module__', None),
+        getattr(fn, '__qualname__', None),
+        _code_key(code),
+        _value_key(fn.__defaults__, seen),
+        _value_key(sorted((fn.__kwdefaults__ or {}).items()), seen),
+        _value_key(closure, seen),
+        _value_key(_global_values(fn, code), seen),
+    ]
+    if any(part is None for part in parts[2:]):
+        return None
+    return 'function({})'.format(_hash(repr(parts)))
+
+
+def _global_values(fn, code):
+    """
+    Returns (name, value) pairs for the globals that fn's code might read.
+    """
+    names = set()
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        # co_names also holds attribute names, which usually aren't globals
+        names.update(code.co_names)
+        codes.extend(
+            const for const in code.co_consts if hasattr(const, 'co_code')
+        )
+    return [
+        (name, fn.__globals__[name])
+        for name in sorted(names) if name in fn.__globals__
+    ]
+
+
+def _code_key(code):
+    consts = []
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            consts.append(_code_key(const))
+        elif isinstance(const, frozenset):
+            # Set order changes with the hash seed
+            consts.append(repr(sorted(map(repr, const))))
+        else:
+            consts.append(repr(const))
+    return _hash(repr([
+        code.co_code.hex(), code.co_names, code.co_varnames, code.co_freevars,
+        consts
+    ]))
+
+
+def _result_size(result):
+    size = 0
+    for value in result.values():
+        if isinstance(value, _SIMPLE_TYPES):
+            size += sys.getsizeof(value)
+            continue
+        try:
+            # Lists of numbers take at least as much memory as their array
+            size += np.asarray(value).nbytes
+        except Exception:
+            size += sys.getsizeof(value)
+    return size
+
+
+def _hash(text):
+    return _hash_bytes(text.encode('utf-8'))
+
+
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,460 @@
+"""
+Finds the code cells that each widget cell needs so pages only run those
+cells when a reader starts the widgets.
+
+Each code cell is parsed with the ast module to find the names it reads and
+the names it defines. A cell defines a name by binding it, like `x = 1`,
+`import x` or `def x(): ...`, and also by changing it in place, like
+`x[0] = 1`, `x.y = 1`, `x += 1` or a statement like `x.append(1)`. A cell
+that changes a name in place also reads it, so it needs the cell that
+defined the name before it.
+
+A cell needs the last earlier cell that defines each name it reads, and
+every cell that those cells need. Functions and classes read names when
+they're called rather than when they're defined, so a cell that reads a
+function defined in the notebook also reads every name the function reads,
+and a cell that calls it also defines every one of those names since the
+call could change them.
+
+The analysis errs towards running more cells. Cells that can't be parsed,
+like cells with IPython magics other than IGNORED_MAGICS, and cells that use
+`from x import *`, exec(), eval(), globals() or get_ipython() are opaque:
+they're treated as reading and defining every name, so they need every
+earlier cell and are needed by every later cell that reads anything.
+"""
+import ast
+import re
+
+# Calls that can read or define names the analysis can't see
+OPAQUE_CALLS = {
+    '__import__',
+    'eval',
+    'exec',
+    'get_ipython',
+    'globals',
+    'locals',
+    'vars',
+}
+
+# Line magics that don't read or define names, which are removed before
+# parsing cells
+IGNORED_MAGICS = ('config', 'matplotlib')
+
+_IGNORED_MAGIC_RE = re.compile(
+    r'^[ \t]*%(?:{})\b.*$'.format('|'.join(IGNORED_MAGICS)), re.MULTILINE
+)
+
+# Statements that always bind their targets. Names bound by other
+# statements, like the target of a for loop, might keep their old value.
+_BINDING_STATEMENTS = (
+    ast.Assign,
+    ast.AnnAssign,
+    ast.Import,
+    ast.ImportFrom,
+    ast.FunctionDef,
+    ast.AsyncFunctionDef,
+    ast.ClassDef,
+)
+
+_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+
+def minimal_cells(sources, targets):
+    """
+    Returns a dict mapping each index in targets to the sorted indices of
+    the cells in sources that running it needs, including itself.
+
+    Args:
+        sources (list of str): Source of each code cell in the order they
+            run.
+        targets (iterable of int): Indices of the cells to find the needed
+            cells for.
+    """
+    needed = cell_dependencies(sources)
+    return {index: sorted(needed[index]) for index in targets}
+
+
+def cell_dependencies(sources):
+    """
+    Returns a list with the set of indices of the cells that each cell in
+    sources needs, including itself.
+    """
+    needed = []
+    # Index of the last cell that defined each name
+    definers = {}
+    # Names that each function defined so far reads or changes
+    function_names = {}
+    last_opaque = -1
+
+    for index, source in enumerate(sources):
+        statements = analyze_cell(source)
+        if statements is None:
+            needed.append(set(range(index + 1)))
+            last_opaque = index
+            continue
+
+        reads, defines = _cell_names(statements, function_names)
+        cells = {index}
+        for name in reads:
+            definer = max(definers.get(name, -1), last_opaque)
+            if definer >= 0:
+                cells |= needed[definer]
+        needed.append(cells)
+        for name in defines:
+            definers[name] = index
+    return needed
+
+
+def analyze_cell(source):
+    """
+    Returns a list with the names read and defined by each top-level
+    statement of source, or None if the cell is opaque.
+    """
+    source = _IGNORED_MAGIC_RE.sub('', source)
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    statements = []
+    for node in tree.body:
+        visitor = _StatementVisitor()
+        visitor.visit(node)
+        if visitor.opaque:
+            return None
+        visitor.binds = isinstance(node, _BINDING_STATEMENTS)
+        statements.append(visitor)
+    return statements
+
+
+def _cell_names(statements, function_names):
+    """
+    Returns a tuple of the names a cell reads before defining them and the
+    names it defines. Updates function_names with the functions the cell
+    defines.
+    """
+    reads = set()
+    defines = set()
+    bound = set()
+    for statement in statements:
+        used = set(statement.loads)
+        changed = set(statement.updates)
+        for name in statement.loads:
+            used |= _function_effects(name, function_names)
+        for name in statement.calls:
+            changed |= _function_effects(name, function_names)
+        if not statement.binds:
+            changed |= statement.stores
+
+        reads |= (used | changed) - bound
+        defines |= changed | statement.stores
+        if statement.binds:
+            bound |= statement.stores
+
+        for name in statement.stores:
+            if name in statement.functions:
+                function_names[name] = statement.functions[name]
+            elif statement.binds:
+                function_names.pop(name, None)
+    return reads, defines
+
+
+def _function_effects(name, function_names):
+    """
+    Returns the names that calling the function name reads or changes,
+    including through other functions it reads.
+    """
+    effects = set()
+    pending = [name]
+    while pending:
+        for effect in function_names.get(pending.pop(), ()):
+            if effect not in effects:
+                effects.add(effect)
+                pending.append(effect)
+    return effects
+
+
+class _StatementVisitor(ast.NodeVisitor):
+    """
+    Collects the module-level names one top-level statement reads and
+    defines.
+
+    loads is the set of names read, stores the names bound, updates the
+    names changed in place, and calls the names called as functions.
+    functions maps each function, class or lambda the statement binds to the
+    names it reads or changes.
+    """
+
+    def __init__(self):
+        self.loads = set()
+        self.stores = set()
+        self.updates = set()
+        self.calls = set()
+        self.functions = {}
+        self.opaque = False
+        self.binds = False
+
+        # Stack of (is_class, local names) for the scopes being visited
+        self._scopes = []
+        # Sets that collect the names read by the functions being visited
+        self._function_reads = []
+        self._lambda_reads = {}
+
+    def visit_Name(self, node):
+        if self._is_local(node.id):
+            return
+        if isinstance(node.ctx, ast.Load):
+            self._read(node.id)
+        elif self._scopes:
+            # Only names declared global get here
+            self._update(node.id)
+        elif isinstance(node.ctx, ast.Del):
+            self.updates.add(node.id)
+        else:
+            self.stores.add(node.id)
+
+    def visit_Attribute(self, node):
+        self._visit_target(node)
+
+    def visit_Subscript(self, node):
+        self._visit_target(node)
+
+    def visit_AugAssign(self, node):
+        target = node.target
+        if isinstance(target, ast.Name):
+            if not self._is_local(target.id):
+                self._read(target.id)
+                self._update(target.id)
+        else:
+            self.visit(target)
+        self.visit(node.value)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.target)
+            self.visit(node.value)
+        elif not isinstance(node.target, ast.Name):
+            self.visit(node.target)
+        if not self._scopes:
+            self.visit(node.annotation)
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        if isinstance(node.value, ast.Lambda) and not self._scopes:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.functions[target.id] = self._lambda_reads[
+                        id(node.value)
+                    ]
+
+    def visit_Expr(self, node):
+        # A statement like `x.append(1)` probably changes x
+        if isinstance(node.value, ast.Call):
+            name = _base_name(node.value.func)
+            if (
+                isinstance(node.value.func, ast.Attribute)
+                and name and not self._is_local(name)
+            ):
+                self._update(name)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name):
+            if node.func.id in OPAQUE_CALLS:
+                self.opaque = True
+            if not self._function_reads and not self._is_local(node.func.id):
+                self.calls.add(node.func.id)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._bind(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                self.opaque = True
+            else:
+                self._bind(alias.asname or alias.name)
+
+    def visit_Global(self, node):
+        for reads in self._function_reads:
+            reads.update(node.names)
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_arguments(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        reads = self._visit_scope(
+            node.body, _argument_names(node.args), is_class=False
+        )
+        self._bind(node.name, reads)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._visit_arguments(node.args)
+        self._lambda_reads[id(node)] = self._visit_scope(
+            [node.body], _argument_names(node.args), is_class=False
+        )
+
+    def visit_ClassDef(self, node):
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        reads = self._visit_scope(node.body, set(), is_class=True)
+        self._bind(node.name, reads)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_ListComp(self, node):
+        # The first iterable is evaluated in the enclosing scope
+        self.visit(node.generators[0].iter)
+        targets = set()
+        for generator in node.generators:
+            targets |= _bound_names([generator.target])[0]
+        self._scopes.append((False, targets))
+        for generator in node.generators:
+            self.visit(generator.target)
+            if generator is not node.generators[0]:
+                self.visit(generator.iter)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for field in ('elt', 'key', 'value'):
+            if getattr(node, field, None) is not None:
+                self.visit(getattr(node, field))
+        self._scopes.pop()
+
+    visit_SetComp = visit_GeneratorExp = visit_DictComp = visit_ListComp
+
+    def generic_visit(self, node):
+        # Names bound by match statements
+        for field in ('name', 'rest'):
+            name = getattr(node, field, None)
+            if isinstance(name, str) and type(node).__name__.startswith(
+                'Match'
+            ):
+                self._bind(name)
+        super().generic_visit(node)
+
+    def _visit_target(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            name = _base_name(node)
+            if name and not self._is_local(name):
+                self._update(name)
+        self.generic_visit(node)
+
+    def _visit_arguments(self, args):
+        for default in args.defaults + args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        for arg in _arguments(args):
+            if arg.annotation is not None:
+                self.visit(arg.annotation)
+
+    def _visit_scope(self, body, names, is_class):
+        """
+        Visits body in a new scope where names are local. Returns the names
+        that body reads or changes from outside of it.
+        """
+        local, declared = _bound_names(body)
+        reads = set(declared)
+        self._scopes.append((is_class, (names | local) - declared))
+        self._function_reads.append(reads)
+        for node in body:
+            self.visit(node)
+        self._function_reads.pop()
+        self._scopes.pop()
+        return reads
+
+    def _is_local(self, name):
+        for i, (is_class, names) in enumerate(reversed(self._scopes)):
+            # Names in class bodies aren't visible in their methods
+            if is_class and i > 0:
+                continue
+            if name in names:
+                return True
+        return False
+
+    def _read(self, name):
+        self.loads.add(name)
+        for reads in self._function_reads:
+            reads.add(name)
+
+    def _update(self, name):
+        if self._function_reads:
+            # Only happens when the function is called
+            self._read(name)
+        else:
+            self.updates.add(name)
+
+    def _bind(self, name, function_reads=None):
+        if self._scopes:
+            if not self._is_local(name):
+                self._update(name)
+            return
+        self.stores.add(name)
+        if function_reads is not None:
+            self.functions[name] = function_reads
+
+
+def _arguments(args):
+    arguments = getattr(args, 'posonlyargs', []) + args.args + args.kwonlyargs
+    return arguments + [arg for arg in (args.vararg, args.kwarg) if arg]
+
+
+def _argument_names(args):
+    return {arg.arg for arg in _arguments(args)}
+
+
+def _bound_names(nodes):
+    """
+    Returns a tuple of the names that nodes bind in their own scope and the
+    names they declare global or nonlocal. Nested scopes aren't searched.
+    """
+    names = set()
+    declared = set()
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Name):
+            if not isinstance(node.ctx, ast.Load):
+                names.add(node.id)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            declared.update(node.names)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update(
+                alias.asname or alias.name.split('.')[0]
+                for alias in node.names
+            )
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                               ast.ClassDef)):
+            names.add(node.name)
+        elif not isinstance(node, (ast.Lambda, ) + _COMPREHENSIONS):
+            for field in ('name', 'rest'):
+                name = getattr(node, field, None)
+                if isinstance(name, str):
+                    names.add(name)
+            pending.extend(ast.iter_child_nodes(node))
+    return names, declared
+
+
+def _base_name(node):
+    """
+    Returns the name at the start of a chain like a.b[0].c().d, or None if
+    it doesn't start with a name whose attribute is taken.
+    """
+    while True:
+        if isinstance(node, ast.Call):
+            node = node.func
+            if not isinstance(node, ast.Attribute):
+                # The result of calling a function isn't the function
+                return None
+        elif isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        else:
+            return node.id if isinstance(node, ast.Name) else None
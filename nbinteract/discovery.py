@@ -0,0 +1,343 @@
+"""
+Finds the notebooks that the nbinteract CLI converts.
+
+find_notebooks() walks folders with os.scandir() and yields each notebook as
+soon as it's found, so conversion can start before a large folder has been
+fully searched. Each folder's entries are sorted by name so builds convert
+notebooks in the same order on every machine.
+
+Patterns passed to --include and --exclude and the lines of ignore files use
+the .gitignore syntax:
+
+    name.ipynb    Matches a file or folder with that name in any folder
+    ch*/          Trailing slash: matches folders only
+    /scratch      Leading or inner slash: matches relative to the folder the
+                  pattern applies to instead of in any folder
+    ch1/**/*.ipynb
+                  ** matches any number of folders
+    !keep.ipynb   Leading !: re-includes a path that an earlier pattern
+                  excluded
+"""
+import logging
+import os
+import re
+
+# Ignore files read from every searched folder. Their patterns apply to the
+# folder they're in and its subfolders.
+IGNORE_FILES = ('.gitignore', '.nbinteractignore')
+
+CHECKPOINTS_FOLDER = '.ipynb_checkpoints'
+
+
+class PathPattern(object):
+    """
+    One .gitignore-style pattern.
+
+    Args:
+        pattern (str): The pattern.
+
+    Kwargs:
+        base (str): Folder, relative to the searched folder, that the pattern
+            applies to. Patterns from an ignore file in a subfolder only match
+            paths in that subfolder.
+    """
+
+    def __init__(self, pattern, base=''):
+        self.pattern = pattern
+        self.base = base
+
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            # \! and \# match a literal ! or #
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+
+        # Like .gitignore, a slash anywhere but the end anchors the pattern
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        regex = _translate(pattern)
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        self._regex = re.compile(regex + r'\Z', re.DOTALL)
+
+    def __repr__(self):
+        return 'PathPattern({!r}, base={!r})'.format(self.pattern, self.base)
+
+    def matches(self, path, is_dir) -> bool:
+        """
+        Returns True if path, a /-separated path relative to the searched
+        folder, matches this pattern.
+        """
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return False
+            path = path[len(self.base) + 1:]
+        return self._regex.match(path) is not None
+
+
+def parse_patterns(lines, base=''):
+    """
+    Returns a list of PathPatterns from the lines of an ignore file, skipping
+    blank lines and comments.
+    """
+    patterns = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        # Trailing spaces are ignored unless they're escaped
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+        patterns.append(PathPattern(line, base))
+    return patterns
+
+
+def is_excluded(patterns, path, is_dir) -> bool:
+    """
+    Returns True if the last of patterns that matches path excludes it.
+    """
+    excluded = False
+    for pattern in patterns:
+        if pattern.matches(path, is_dir):
+            excluded = not pattern.negate
+    return excluded
+
+
+def find_notebooks(
+    paths,
+    recursive=False,
+    include=None,
+    exclude=None,
+    ignore_files=(),
+):
+    """
+    Returns an iterator over the notebooks in paths. Notebooks are yielded
+    while folders are still being searched.
+
+    Each of paths is a notebook or a folder. Notebooks are yielded as given.
+    For folders, the notebooks directly in the folder are yielded in sorted
+    order, followed by the notebooks in each subfolder if recursive is True.
+    Files and folders whose names start with a `.` are skipped, and so are
+    notebooks in `.ipynb_checkpoints` folders even when they're passed in
+    directly. Each notebook is yielded once even if it's in several of paths,
+    and symlinks that loop back to a folder that was already searched are
+    skipped.
+
+    Raises a ValueError before searching anything if one of paths doesn't
+    exist.
+
+    Kwargs:
+        recursive (bool): If True, searches subfolders.
+        include (list str): If set, only notebooks that match one of these
+            patterns, or that are in a folder that matches one, are yielded.
+        exclude (list str): Notebooks and folders that match one of these
+            patterns are skipped.
+        ignore_files (list str): Names of ignore files, like IGNORE_FILES,
+            to read from each searched folder. Notebooks and folders they
+            match are skipped.
+
+    Patterns are matched against paths relative to the folder being searched,
+    or to the current folder for notebooks passed in directly.
+    """
+    for path in paths:
+        if not (os.path.isfile(path) or os.path.isdir(path)):
+            raise ValueError(
+                '{} is neither an existing file nor a folder.'.format(path)
+            )
+
+    return _find_notebooks(
+        paths,
+        recursive,
+        [PathPattern(pattern) for pattern in include or []],
+        [PathPattern(pattern) for pattern in exclude or []],
+        ignore_files or (),
+    )
+
+
+def _find_notebooks(paths, recursive, include, exclude, ignore_files):
+    seen_notebooks = set()
+    # (device, inode) of every folder searched so far. Checking folders
+    # against it catches symlink loops and folders that are reachable twice.
+    seen_folders = set()
+
+    for path in paths:
+        if os.path.isdir(path):
+            found = _search_folder(
+                path, recursive, include, exclude, ignore_files, seen_folders
+            )
+        elif _is_selected(_relative_path(path), include, exclude):
+            found = [path]
+        else:
+            found = []
+
+        for notebook in found:
+            key = os.path.normcase(os.path.abspath(notebook))
+            if key not in seen_notebooks:
+                seen_notebooks.add(key)
+                yield notebook
+
+
+def _search_folder(root, recursive, include, exclude, ignore_files, seen):
+    """
+    Yields the notebooks in root. Uses a stack instead of recursion so deeply
+    nested folders can't hit the recursion limit.
+    """
+    stat = os.stat(root)
+    seen.add((stat.st_dev, stat.st_ino))
+    # Most folders have no patterns to check, so skip matching entirely
+    filter_notebooks = bool(include or exclude)
+
+    # Folders left to search, as (path, path relative to root, ignore rules
+    # that apply to the folder)
+    stack = [(root, '', [])]
+    while stack:
+        folder, rel_folder, rules = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=_entry_name)
+        except OSError as err:
+            logging.warning('Skipping {}: {}'.format(folder, err))
+            continue
+
+        # Only opens the ignore files that exist
+        found_ignore_files = [
+            entry.name for entry in entries if entry.name in ignore_files
+        ]
+        if found_ignore_files:
+            rules = rules + _read_ignore_files(
+                folder, rel_folder, found_ignore_files
+            )
+
+        subfolders = []
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.'):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_dir:
+                if not recursive:
+                    continue
+                rel_path = _join(rel_folder, name)
+                if not (
+                    is_excluded(exclude, rel_path, True)
+                    or is_excluded(rules, rel_path, True)
+                ):
+                    subfolders.append((entry, rel_path))
+            elif name.endswith('.ipynb'):
+                if rules or filter_notebooks:
+                    rel_path = _join(rel_folder, name)
+                    if is_excluded(rules, rel_path, False) or not (
+                        _is_selected(rel_path, include, exclude)
+                    ):
+                        continue
+                yield entry.path
+
+        # Pushed in reverse so subfolders are searched in sorted order
+        for entry, rel_path in reversed(subfolders):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            folder_id = (stat.st_dev, stat.st_ino)
+            if folder_id in seen:
+                if entry.is_symlink():
+                    logging.warning(
+                        'Skipping {}, which links to a folder that was '
+                        'already searched.'.format(entry.path)
+                    )
+                continue
+            seen.add(folder_id)
+            stack.append((entry.path, rel_path, rules))
+
+
+def _entry_name(entry):
+    return entry.name
+
+
+def _is_selected(rel_path, include, exclude):
+    parts = rel_path.split('/')
+    if CHECKPOINTS_FOLDER in parts[:-1]:
+        return False
+
+    # The notebook's path followed by the path of each of its folders
+    paths = [
+        ('/'.join(parts[:i]), i < len(parts))
+        for i in range(len(parts), 0, -1)
+    ]
+    if any(is_excluded(exclude, path, is_dir) for path, is_dir in paths):
+        return False
+    # A notebook is included if it or one of its folders matches
+    return not include or any(
+        pattern.matches(path, is_dir)
+        for path, is_dir in paths for pattern in include
+    )
+
+
+def _read_ignore_files(folder, rel_folder, ignore_files):
+    patterns = []
+    for name in ignore_files:
+        try:
+            with open(
+                os.path.join(folder, name), encoding='utf-8', errors='replace'
+            ) as f:
+                patterns.extend(parse_patterns(f, base=rel_folder))
+        except OSError:
+            pass
+    return patterns
+
+
+def _relative_path(path):
+    path = os.path.normpath(path).replace(os.sep, '/')
+    return path[2:] if path.startswith('./') else path
+
+
+def _join(folder, name):
+    return folder + '/' + name if folder else name
+
+
+def _translate(pattern):
+    """
+    Returns a regex for a .gitignore pattern without its leading !, leading
+    slash or trailing slash.
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            # Zero or more folders
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex += '[' + chars.replace('\\', '\\\\') + ']'
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
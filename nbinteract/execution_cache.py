@@ -0,0 +1,200 @@
+"""
+On-disk cache of code cell outputs used by `nbinteract --execute`.
+
+Each code cell's outputs are stored under a key that hashes the sources of
+every code cell up to and including it, the kernel name, the notebook's
+folder (the kernel's working directory), and the contents of
+requirements.txt. Editing a markdown cell leaves every key unchanged, so
+rebuilding the notebook replays its outputs without starting a kernel.
+
+Changes to files that cells read, like data files, aren't detected. Pass
+--no-exec-cache or delete the cache folder after changing them.
+"""
+import hashlib
+import json
+import os
+
+import nbformat
+
+from .manifest import CACHE_FOLDER, hash_file
+
+CACHE_PATH = os.path.join(CACHE_FOLDER, 'execution')
+
+# Bump this when the format of cache entries changes so that old entries are
+# ignored instead of misread.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ExecutionCache(object):
+    """
+    Stores the outputs of executed code cells in one JSON file per cell.
+
+    When the files take up more than max_bytes, the least recently used ones
+    are deleted. Replaying a cell counts as using it.
+
+    Kwargs:
+        path (str): Folder to store cache entries in.
+        max_bytes (int): Maximum total size of the cache entries.
+        requirements_path (str): Path to the requirements.txt file whose
+            contents are part of every key. Ignored if it doesn't exist.
+    """
+
+    def __init__(
+        self,
+        path=CACHE_PATH,
+        max_bytes=DEFAULT_MAX_BYTES,
+        requirements_path='requirements.txt',
+    ):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.requirements_hash = (
+            hash_file(requirements_path)
+            if os.path.isfile(requirements_path) else None
+        )
+
+    def cell_keys(self, nb, kernel_name, folder=None, options=None) -> list:
+        """
+        Returns the cache key of each code cell in nb, in order. folder is the
+        folder the notebook runs in, which defaults to the current one, so
+        notebooks with the same code that read different files in their
+        folders get different keys. options is a dict of settings that change
+        what the cells output, like the environment variables set in the
+        kernel.
+        """
+        parts = [
+            CACHE_VERSION,
+            kernel_name,
+            os.path.abspath(folder or '.'),
+            self.requirements_hash,
+        ]
+        if options:
+            # Only added when set so keys without options stay the same
+            parts.append(options)
+        sha = hashlib.sha256(
+            json.dumps(parts, sort_keys=True).encode('utf-8')
+        )
+
+        keys = []
+        for cell in nb.cells:
+            if cell.cell_type != 'code':
+                continue
+            source = cell.source.encode('utf-8')
+            # Prefix each source with its length so cell boundaries matter
+            sha.update(b'%d:' % len(source) + source)
+            keys.append(sha.hexdigest())
+        return keys
+
+    def replay(self, nb, keys) -> bool:
+        """
+        Fills in the outputs of every code cell in nb from the cache. Returns
+        False and leaves nb unchanged unless every cell was cached.
+
+        Later cells depend on the kernel state built by earlier cells, so a
+        notebook with any uncached cell has to be executed from the start.
+        """
+        if not keys:
+            return False
+
+        entries = [self._read(key) for key in keys]
+        notebook_entry = self._read(_notebook_key(keys))
+        if notebook_entry is None or any(entry is None for entry in entries):
+            return False
+
+        code_cells = [cell for cell in nb.cells if cell.cell_type == 'code']
+        for cell, entry in zip(code_cells, entries):
+            cell.outputs = nbformat.from_dict(entry['outputs'])
+            cell.execution_count = entry['execution_count']
+        nb.metadata.update(nbformat.from_dict(notebook_entry['metadata']))
+
+        for key in keys + [_notebook_key(keys)]:
+            self._touch(key)
+        return True
+
+    def store(self, nb, keys):
+        """
+        Stores the outputs of nb's code cells under keys. Notebooks with error
+        outputs aren't stored since errors are often caused by something
+        outside the notebook, like a network failure.
+        """
+        if not keys:
+            return
+
+        code_cells = [cell for cell in nb.cells if cell.cell_type == 'code']
+        if any(
+            output.output_type == 'error'
+            for cell in code_cells for output in cell.outputs
+        ):
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        for cell, key in zip(code_cells, keys):
+            self._write(key, {
+                'outputs': cell.outputs,
+                'execution_count': cell.execution_count,
+            })
+
+        # Execution also records the notebook's language and widget state
+        self._write(_notebook_key(keys), {
+            'metadata': {
+                name: nb.metadata[name]
+                for name in ('language_info', 'widgets')
+                if name in nb.metadata
+            },
+        })
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker process evicted it first
+                pass
+            total -= size
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def _read(self, key):
+        try:
+            with open(self._entry_path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, entry):
+        # Written atomically since worker processes share the cache
+        path = self._entry_path(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _touch(self, key):
+        try:
+            os.utime(self._entry_path(key))
+        except OSError:
+            pass
+
+
+def _notebook_key(keys):
+    return keys[-1] + '-notebook'
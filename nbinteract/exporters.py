@@ -21,11 +21,13 @@ import os
 import logging
 import time
 from subprocess import check_output, STDOUT, CalledProcessError
-from IPython.display import display, Javascript, Markdown
 
 from nbconvert import HTMLExporter
 from traitlets import default, Unicode, Bool, validate, TraitError
 
+from . import tracing
+from .optimize import minify, minify_chunks
+
 SPEC_DIVIDER = '/'
 
 CONVERT_SUCCESS_MD = '''
@@ -76,6 +78,13 @@ class InteractExporter(HTMLExporter):
         True, 'If False, only widget cell buttons are generated.'
     ).tag(config=True)
 
+    optimize = Bool(
+        False,
+        help='If True, collapses whitespace in the generated HTML and '
+        'minifies inline CSS. The contents of <pre>, <code>, <textarea> and '
+        '<script> elements are left unchanged.'
+    ).tag(config=True)
+
     def __init__(self, config=None, **kw):
         """
         Public constructor
@@ -115,6 +124,10 @@ class InteractExporter(HTMLExporter):
                 per widget cell. If False, only widget cell buttons are
                 generated.
 
+            optimize (bool): If True, minifies the generated HTML. The
+                original and minified sizes are stored in
+                resources['optimize']. Defaults to False.
+
             extra_loaders (list[Jinja Loader]): ordered list of Jinja loader to
                 find templates. Will be tried in order before the default
                 FileSystem ones.
@@ -138,6 +151,80 @@ class InteractExporter(HTMLExporter):
         self.environment.globals['provider'] = self.provider
         self.environment.globals['button_at_top'] = self.button_at_top
 
+    # Set by stream_notebook_node() to capture the template context instead of
+    # rendering the template.
+    _captured_context = None
+
+    @property
+    def template(self):
+        template = super(InteractExporter, self).template
+        if self._captured_context is None:
+            return template
+        return _ContextCapturingTemplate(self._captured_context)
+
+    def from_notebook_node(self, nb, resources=None, **kw):
+        output, resources = super(InteractExporter, self).from_notebook_node(
+            nb, resources, **kw
+        )
+        # stream_notebook_node() minifies the chunks it renders instead
+        if self.optimize and self._captured_context is None:
+            original_bytes = len(output.encode('utf-8'))
+            output = minify(output)
+            resources['optimize'] = {
+                'original_bytes': original_bytes,
+                'minified_bytes': len(output.encode('utf-8')),
+            }
+        return output, resources
+
+    def stream_notebook_node(self, nb, resources=None, **kw):
+        """
+        Like from_notebook_node(), but doesn't build the HTML in memory.
+
+        Returns a tuple of (chunks, resources) where chunks is an iterator of
+        strings that make up the rendered HTML. The template is rendered
+        lazily as chunks is consumed, so chunks can be written to a file
+        without ever holding the complete HTML string in memory.
+        """
+        context = self._captured_context = {}
+        try:
+            _, resources = self.from_notebook_node(nb, resources, **kw)
+        finally:
+            self._captured_context = None
+
+        if tracing.is_enabled():
+            filters = self.environment.filters
+            filters['highlight_code'] = tracing.traced(
+                filters['highlight_code'], 'highlight code', 'highlight'
+            )
+
+        # from_notebook_node() registers filters that the template needs, so
+        # we load the template afterwards.
+        chunks = _lstrip_chunks(self.template.generate(**context))
+        if self.optimize:
+            # Filled in once chunks is exhausted
+            resources['optimize'] = {}
+            chunks = minify_chunks(chunks, stats=resources['optimize'])
+        return chunks, resources
+
+    def _preprocess(self, nb, resources):
+        if not tracing.is_enabled():
+            return super(InteractExporter, self)._preprocess(nb, resources)
+
+        # Record a span for each enabled preprocessor
+        preprocessors = self._preprocessors
+        self._preprocessors = [
+            _TracedPreprocessor(preprocessor)
+            if getattr(preprocessor, 'enabled', True) else preprocessor
+            for preprocessor in preprocessors
+        ]
+        try:
+            with tracing.span('preprocess', 'stage'):
+                return super(InteractExporter, self)._preprocess(
+                    nb, resources
+                )
+        finally:
+            self._preprocessors = preprocessors
+
     @default('template_file')
     def _template_file_default(self):
         return os.path.join(
@@ -158,6 +245,50 @@ class InteractExporter(HTMLExporter):
             )
 
 
+class _ContextCapturingTemplate(object):
+    """
+    Stands in for the Jinja template during stream_notebook_node(). Records
+    the context that nbconvert renders the template with and renders nothing.
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def render(self, *args, **kwargs):
+        self.context.update(*args, **kwargs)
+        return ''
+
+
+class _TracedPreprocessor(object):
+    """
+    Wraps a preprocessor to record a span each time it runs.
+    """
+
+    def __init__(self, preprocessor):
+        self.preprocessor = preprocessor
+
+    def __call__(self, nb, resources):
+        name = getattr(
+            self.preprocessor, '__name__', type(self.preprocessor).__name__
+        )
+        with tracing.span(name, 'preprocessor'):
+            return self.preprocessor(nb, resources)
+
+
+def _lstrip_chunks(chunks):
+    """
+    Strips leading newlines from the rendered output, matching what
+    from_notebook_node() does to the complete HTML string.
+    """
+    chunks = iter(chunks)
+    for chunk in chunks:
+        chunk = chunk.lstrip('\r\n')
+        if chunk:
+            yield chunk
+            break
+    yield from chunks
+
+
 def publish(spec, nb_name, template='full', save_first=True):
     """
     Converts nb_name to an HTML file. Preserves widget functionality.
@@ -166,6 +297,8 @@ def publish(spec, nb_name, template='full', save_first=True):
     notebook environment.
 
     Equivalent to running `nbinteract ${spec} ${nb_name}` on the command line.
+    If a conversion server started with `nbinteract serve` is running, the
+    notebook is converted by the server instead.
 
     Args:
         spec (str): BinderHub spec for Jupyter image. Must be in the format:
@@ -205,27 +338,56 @@ def publish(spec, nb_name, template='full', save_first=True):
         _save_nb(nb_name)
 
     print('Converting notebook...')
-    try:
-        check_output(
-            ['nbinteract', '--template', template, '--spec', spec, nb_name],
-            stderr=STDOUT
-        )
-    except CalledProcessError as err:
+    conversion_error = _convert(spec, nb_name, template)
+    if conversion_error:
         logging.warning(
-            ERROR_MESSAGE.format(
-                filename=nb_name, error=str(err.output, 'utf-8')
-            )
+            ERROR_MESSAGE.format(filename=nb_name, error=conversion_error)
         )
         return
 
+    # IPython is imported here since nbconvert doesn't need it, and importing
+    # it slows down every `jupyter nbconvert --to interact` command
+    from IPython.display import display, Markdown
+
     html_filename = os.path.splitext(nb_name)[0] + '.html'
     display(Markdown(CONVERT_SUCCESS_MD.format(url=html_filename)))
 
 
+def _convert(spec, nb_name, template):
+    """
+    Converts nb_name using the conversion server if one is running and the
+    nbinteract CLI otherwise. Returns the error output if the conversion
+    failed and None if it succeeded.
+    """
+    # Imported here since the server imports the CLI, which imports this file
+    from . import server
+
+    response = server.convert([nb_name], {
+        'spec': spec,
+        'template_file': template,
+        'button_at_top': True,
+        'execute': False,
+        'extract_images': None,
+    })
+    if response is not None:
+        [result] = response['results']
+        return result['error']
+
+    try:
+        check_output(
+            ['nbinteract', '--template', template, '--spec', spec, nb_name],
+            stderr=STDOUT
+        )
+    except CalledProcessError as err:
+        return str(err.output, 'utf-8')
+
+
 def _save_nb(nb_name):
     """
     Attempts to save notebook. If unsuccessful, shows a warning.
     """
+    from IPython.display import display, Javascript
+
     display(Javascript('IPython.notebook.save_checkpoint();'))
     display(Javascript('IPython.notebook.save_notebook();'))
     print('Saving notebook...', end=' ')
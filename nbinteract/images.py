@@ -0,0 +1,339 @@
+"""
+Shrinks image outputs for `nbinteract --optimize-images`.
+
+PNGs are recompressed losslessly: their image data is deflated again at the
+highest compression level and text chunks like matplotlib's "Software" tag
+are dropped. If Pillow is installed (`pip install nbinteract[images]`),
+images with at most 256 colors, which includes most plots, are also tried as
+palette PNGs, and the conversion is only kept if every pixel round trips
+exactly. Pillow is also needed to downscale images wider than a maximum
+width and to convert them to WebP.
+
+SVGs are minified by removing comments, metadata and the whitespace between
+tags.
+
+Optimizing an image takes much longer than converting the rest of a
+notebook, so results are stored in an ImageCache keyed by a hash of the
+image and the options used.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import zlib
+
+from .manifest import CACHE_FOLDER
+
+# Pillow is imported in the functions that use it since importing it slows
+# down starting the CLI, which imports this module
+
+CACHE_PATH = os.path.join(CACHE_FOLDER, 'images')
+
+# Bump this when optimization changes so cached results are recomputed
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Ancillary chunks that don't change how a PNG looks
+DROPPED_PNG_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+_SVG_PRESERVED_RE = re.compile(
+    r'(<text\b.*?</text>|<style\b.*?</style>|<!\[CDATA\[.*?\]\]>)',
+    re.DOTALL,
+)
+_SVG_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+_SVG_METADATA_RE = re.compile(r'<metadata\b.*?</metadata>', re.DOTALL)
+# Whitespace between tags, including at the edges of the pieces around
+# preserved elements
+_SVG_BETWEEN_TAGS_RE = re.compile(r'>\s+(?=<)|(?<=>)\s+\Z|\A\s+(?=<)')
+# Path data and point lists treat any run of whitespace like one space
+_SVG_GEOMETRY_RE = re.compile(r'(\s(?:d|points)=")([^"]*)(")')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def has_pillow() -> bool:
+    """
+    Returns True if Pillow is installed, which downscaling and WebP
+    conversion need.
+    """
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ImageCache(object):
+    """
+    Stores optimized images in one file per result.
+
+    When the files take up more than max_bytes, the least recently used ones
+    are deleted. Reading a result counts as using it.
+
+    Kwargs:
+        path (str): Folder to store cache entries in.
+        max_bytes (int): Maximum total size of the cache entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+
+    def key(self, data, options) -> str:
+        """
+        Returns the cache key for optimizing data with options, a dict that
+        can be serialized as JSON.
+        """
+        sha = hashlib.sha256(
+            json.dumps([CACHE_VERSION, options], sort_keys=True)
+            .encode('utf-8')
+        )
+        sha.update(data)
+        return sha.hexdigest()
+
+    def get(self, key, extension):
+        """
+        Returns the bytes stored under key and extension, or None if there
+        aren't any.
+        """
+        path = self._entry_path(key, extension)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, extension, data):
+        """
+        Stores data under key and extension.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # Written atomically since worker processes share the cache
+        path = self._entry_path(key, extension)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = []
+        try:
+            scanned = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return
+        for entry in scanned:
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker process evicted it first
+                pass
+            total -= size
+
+    def _entry_path(self, key, extension):
+        return os.path.join(self.path, key + extension)
+
+
+def optimize_png(data, max_width=0, webp=False, webp_lossless=True,
+                 webp_quality=80):
+    """
+    Returns a tuple of (png, webp) for the PNG bytes data. png is the
+    optimized PNG, which is never larger than data unless the image was
+    downscaled. webp is the image converted to WebP, or None if webp is
+    False or the WebP is larger than the PNG.
+
+    max_width, webp, webp_lossless and webp_quality need Pillow.
+    """
+    image = None
+    if max_width or webp:
+        if not has_pillow():
+            raise RuntimeError(
+                'Downscaling images and converting them to WebP need Pillow. '
+                'Install it with `pip install nbinteract[images]`.'
+            )
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(data))
+        if max_width and image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.LANCZOS)
+            data = _save_png(image, image.info.get('dpi'))
+
+    png = recompress_png(data)
+
+    webp_data = None
+    if webp:
+        out = io.BytesIO()
+        image.save(
+            out,
+            'WEBP',
+            lossless=webp_lossless,
+            quality=webp_quality,
+            method=6,
+        )
+        webp_data = out.getvalue()
+        if len(webp_data) >= len(png):
+            webp_data = None
+    return png, webp_data
+
+
+def recompress_png(data) -> bytes:
+    """
+    Returns the smallest lossless encoding of the PNG bytes data that this
+    module can make, or data itself if none is smaller.
+    """
+    candidates = [data]
+    try:
+        candidates.append(_redeflate_png(data))
+    except (ValueError, zlib.error, struct.error):
+        # Not a PNG this function can parse, so it's left alone
+        return data
+
+    if has_pillow():
+        palette = _palette_png(data)
+        if palette is not None:
+            candidates.append(palette)
+    return min(candidates, key=len)
+
+
+def minify_svg(svg) -> str:
+    """
+    Removes comments, <metadata> elements and whitespace between tags from
+    svg. Whitespace inside <text> and <style> elements is kept.
+    """
+    pieces = _SVG_PRESERVED_RE.split(svg)
+    for i in range(0, len(pieces), 2):
+        piece = _SVG_COMMENT_RE.sub('', pieces[i])
+        piece = _SVG_METADATA_RE.sub('', piece)
+        piece = _SVG_BETWEEN_TAGS_RE.sub(_strip_whitespace, piece)
+        pieces[i] = _SVG_GEOMETRY_RE.sub(_collapse_geometry, piece)
+    return ''.join(pieces).strip()
+
+
+def _strip_whitespace(match):
+    return '>' if match.group().startswith('>') else ''
+
+
+def _collapse_geometry(match):
+    value = _WHITESPACE_RE.sub(' ', match.group(2)).strip()
+    return match.group(1) + value + match.group(3)
+
+
+def _read_png_chunks(data):
+    """
+    Returns the list of (type, body) chunks in the PNG bytes data.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError('Not a PNG')
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if len(body) != length:
+            raise ValueError('Truncated PNG chunk')
+        chunks.append((chunk_type, body))
+        pos += 12 + length
+        if chunk_type == b'IEND':
+            break
+    return chunks
+
+
+def _write_png_chunk(chunk_type, body):
+    return (
+        struct.pack('>I', len(body)) + chunk_type + body +
+        struct.pack('>I', zlib.crc32(chunk_type + body) & 0xffffffff)
+    )
+
+
+def _redeflate_png(data):
+    """
+    Returns data with its image data deflated again at the highest level and
+    its text chunks dropped. Pixels are unchanged.
+    """
+    chunks = _read_png_chunks(data)
+    raw = zlib.decompress(
+        b''.join(body for chunk_type, body in chunks if chunk_type == b'IDAT')
+    )
+    compressed = min(
+        (
+            _deflate(raw, strategy)
+            for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+        ),
+        key=len,
+    )
+
+    out = [PNG_SIGNATURE]
+    wrote_idat = False
+    for chunk_type, body in chunks:
+        if chunk_type in DROPPED_PNG_CHUNKS:
+            continue
+        if chunk_type == b'IDAT':
+            if not wrote_idat:
+                out.append(_write_png_chunk(b'IDAT', compressed))
+                wrote_idat = True
+            continue
+        out.append(_write_png_chunk(chunk_type, body))
+    return b''.join(out)
+
+
+def _deflate(raw, strategy):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(raw) + compressor.flush()
+
+
+def _palette_png(data):
+    """
+    Returns data as a palette PNG, or None if the image has more than 256
+    colors or the palette image doesn't have exactly the same pixels.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ('RGB', 'RGBA'):
+        return None
+    if image.getcolors(256) is None:
+        return None
+
+    palette = _save_png(
+        image.quantize(colors=256, method=Image.FASTOCTREE),
+        image.info.get('dpi'),
+    )
+    # Checks the saved file since PNGs store transparency separately
+    decoded = Image.open(io.BytesIO(palette)).convert(image.mode)
+    if decoded.tobytes() != image.tobytes():
+        return None
+    return palette
+
+
+def _save_png(image, dpi=None):
+    out = io.BytesIO()
+    if dpi:
+        image.save(out, 'PNG', optimize=True, dpi=dpi)
+    else:
+        image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
@@ -0,0 +1,273 @@
+"""
+Pool of warm kernels used to execute notebooks with `nbinteract --execute`.
+
+Starting a kernel and importing numpy, ipywidgets, bqplot, and nbinteract
+often takes longer than running the notebook itself. KernelPool starts kernels
+ahead of time in background threads, imports a list of modules in each one,
+and hands out a kernel with a clean namespace for each notebook.
+
+Reusing a kernel isn't hermetic. Modules stay imported, so changes a notebook
+makes to their state, like seeding NumPy's global random generator, setting
+matplotlib's rcParams or appending to sys.path, carry over to the next
+notebook. The CLI only uses a pool when --kernels is set for this reason.
+"""
+import collections
+import contextlib
+import logging
+import os
+import threading
+import time
+
+DEFAULT_PREIMPORT = ['numpy', 'ipywidgets', 'bqplot', 'nbinteract']
+
+# Run in each kernel as soon as it starts. A module that fails to import is
+# skipped so a missing optional package doesn't break the pool.
+PREIMPORT_CODE = '''
+import importlib
+for _nbi_module in {modules!r}:
+    try:
+        importlib.import_module(_nbi_module)
+    except Exception:
+        pass
+'''
+
+# Run before handing a kernel to a notebook. Modules stay imported, but the
+# notebook gets a fresh namespace and execution count like a new kernel would.
+RESET_CODE = '''
+import sys
+if 'matplotlib.pyplot' in sys.modules:
+    sys.modules['matplotlib.pyplot'].close('all')
+if 'ipywidgets' in sys.modules:
+    sys.modules['ipywidgets'].Widget.close_all()
+get_ipython().reset(new_session=True)
+import os
+os.chdir({cwd!r})
+del os
+'''
+
+
+class KernelPool(object):
+    """
+    Keeps `size` kernels started and warmed up so notebooks don't wait for
+    kernel startup.
+
+    Use kernel() to borrow a kernel for one notebook. A kernel is replaced
+    after it has executed `max_uses` notebooks or if it died while executing
+    one. Replacements start in the background while the next notebook runs.
+
+    Kwargs:
+        size (int): Number of kernels to keep started.
+        preimport (list str): Modules to import in each kernel before it's
+            used.
+        max_uses (int): Number of notebooks each kernel executes before it's
+            replaced.
+        kernel_name (str): Name of the kernelspec to start.
+        startup_timeout (float): Seconds to wait for a kernel to start and
+            import the preimport modules.
+    """
+
+    def __init__(
+        self,
+        size=1,
+        preimport=DEFAULT_PREIMPORT,
+        max_uses=10,
+        kernel_name='python3',
+        startup_timeout=60,
+    ):
+        self.size = size
+        self.preimport = list(preimport)
+        self.max_uses = max_uses
+        self.kernel_name = kernel_name
+        self.startup_timeout = startup_timeout
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'recycled': 0,
+            'crashed': 0,
+            'startup_seconds': 0.0,
+            'saved_seconds': 0.0,
+        }
+
+        self._idle = collections.deque(
+            _PooledKernel(self) for _ in range(size)
+        )
+
+    @contextlib.contextmanager
+    def kernel(self, cwd=None):
+        """
+        Context manager that yields a started KernelManager whose kernel has
+        a fresh namespace and its working directory set to cwd. The kernel
+        goes back in the pool afterwards unless it should be replaced.
+        """
+        pooled = self._acquire(os.path.abspath(cwd or os.getcwd()))
+        try:
+            yield pooled.km
+        finally:
+            self._release(pooled)
+
+    def shutdown(self):
+        """
+        Shuts down every idle kernel in the pool.
+        """
+        while self._idle:
+            self._idle.popleft().shutdown()
+
+    def summary(self) -> str:
+        return summarize_stats(self.stats)
+
+    def _acquire(self, cwd):
+        hit = bool(self._idle)
+        pooled = self._idle.popleft() if hit else _PooledKernel(self)
+
+        waited = pooled.wait_until_ready()
+        if not pooled.is_ready():
+            # The kernel didn't start or died while idle, so start over
+            pooled.shutdown()
+            self.stats['crashed'] += 1
+            hit = False
+            pooled = _PooledKernel(self)
+            waited = pooled.wait_until_ready()
+            if not pooled.is_ready():
+                pooled.shutdown()
+                raise RuntimeError(
+                    'Kernel failed to start:\n{}'.format(pooled.error)
+                )
+
+        self.stats['startup_seconds'] += pooled.startup_seconds
+        if hit:
+            self.stats['hits'] += 1
+            self.stats['saved_seconds'] += max(
+                pooled.startup_seconds - waited, 0
+            )
+        else:
+            self.stats['misses'] += 1
+
+        try:
+            pooled.reset(cwd)
+        except Exception:
+            pooled.shutdown()
+            raise
+        return pooled
+
+    def _release(self, pooled):
+        pooled.uses += 1
+        if not pooled.km.is_alive():
+            self.stats['crashed'] += 1
+        elif pooled.uses >= self.max_uses:
+            self.stats['recycled'] += 1
+        else:
+            self._idle.append(pooled)
+            return
+
+        pooled.shutdown()
+        if len(self._idle) < self.size:
+            self._idle.append(_PooledKernel(self))
+
+
+class _PooledKernel(object):
+    """
+    A kernel that starts and imports the pool's preimport modules in a
+    background thread as soon as it's created.
+    """
+
+    def __init__(self, pool):
+        from jupyter_client.manager import KernelManager
+
+        self.pool = pool
+        self.km = KernelManager(kernel_name=pool.kernel_name)
+        self.kc = None
+        self.uses = 0
+        self.startup_seconds = 0.0
+        self.error = None
+
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._start, daemon=True)
+        self._thread.start()
+
+    def wait_until_ready(self) -> float:
+        """
+        Blocks until the kernel has started. Returns the seconds waited.
+        """
+        start = time.perf_counter()
+        self._ready.wait(self.pool.startup_timeout)
+        return time.perf_counter() - start
+
+    def is_ready(self) -> bool:
+        return (
+            self._ready.is_set() and self.error is None
+            and self.km.is_alive()
+        )
+
+    def reset(self, cwd):
+        self._run(RESET_CODE.format(cwd=cwd))
+
+    def shutdown(self):
+        self._thread.join(self.pool.startup_timeout)
+        try:
+            if self.kc is not None:
+                self.kc.stop_channels()
+            if self.km.has_kernel:
+                self.km.shutdown_kernel(now=True)
+        except Exception:
+            logging.warning('Failed to shut down pooled kernel', exc_info=True)
+
+    def _start(self):
+        start = time.perf_counter()
+        try:
+            self.km.start_kernel(
+                # Matches the kernels started by ExecutePreprocessor
+                extra_arguments=['--HistoryManager.hist_file=:memory:']
+            )
+            self.kc = self.km.blocking_client()
+            self.kc.start_channels()
+            self.kc.wait_for_ready(timeout=self.pool.startup_timeout)
+            self._run(PREIMPORT_CODE.format(modules=self.pool.preimport))
+        except Exception as e:
+            self.error = e
+        self.startup_seconds = time.perf_counter() - start
+        self._ready.set()
+
+    def _run(self, code):
+        reply = self.kc.execute_interactive(
+            code,
+            silent=True,
+            store_history=False,
+            timeout=self.pool.startup_timeout,
+            output_hook=lambda msg: None,
+        )
+        if reply['content']['status'] != 'ok':
+            raise RuntimeError(
+                'Pooled kernel failed to run code: {}'.format(
+                    reply['content'].get('evalue')
+                )
+            )
+
+
+def merge_stats(all_stats) -> dict:
+    """
+    Adds up the stats of several kernel pools, eg. one from each worker
+    process.
+    """
+    merged = collections.Counter()
+    for stats in all_stats:
+        merged.update(stats)
+    return dict(merged)
+
+
+def summarize_stats(stats) -> str:
+    """
+    Returns a message describing the pool's hit rate and the kernel startup
+    time it saved.
+    """
+    used = stats.get('hits', 0) + stats.get('misses', 0)
+    if not used:
+        return 'Kernel pool was not used.'
+    return (
+        'Kernel pool: {} of {} notebooks used a warm kernel ({:.0%} hit '
+        'rate), saving {:.1f}s of kernel startup. Replaced {} kernels after '
+        'reuse and {} after crashes.'.format(
+            stats['hits'], used, stats['hits'] / used,
+            stats['saved_seconds'], stats['recycled'], stats['crashed']
+        )
+    )
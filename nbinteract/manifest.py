@@ -0,0 +1,224 @@
+"""
+Build manifest used by the nbinteract CLI for incremental builds.
+
+The manifest records a hash of each converted notebook along with a hash of
+the configuration used to convert it. On the next build, notebooks whose
+contents and configuration haven't changed and whose outputs still exist on
+disk are skipped.
+"""
+import glob
+import hashlib
+import json
+import os
+
+from .optimize import COMPRESSED_SUFFIXES, remove_precompressed
+
+CACHE_FOLDER = '.nbinteract-cache'
+MANIFEST_PATH = os.path.join(CACHE_FOLDER, 'manifest.json')
+
+# Bump this when the format of the manifest changes so that old manifests are
+# ignored instead of misread.
+MANIFEST_VERSION = 2
+
+TEMPLATES_FOLDER = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def hash_file(path, chunk_size=1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of the contents of the file at path.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def versions() -> dict:
+    """
+    Returns the versions of the packages and templates that affect the
+    generated HTML. A change in any of these invalidates every notebook in the
+    manifest.
+    """
+    template_hashes = {
+        os.path.basename(path): hash_file(path)
+        for pattern in ('*.tpl', '*.css')
+        for path in sorted(glob.glob(os.path.join(TEMPLATES_FOLDER, pattern)))
+    }
+    return {
+        'nbinteract': _package_version('nbinteract'),
+        'nbconvert': _package_version('nbconvert') or _nbconvert_version(),
+        'templates': template_hashes,
+    }
+
+
+def config_hash(
+    exporter_config: dict, output_folder=None, fast_read=False
+) -> str:
+    """
+    Returns a hash of the exporter configuration and installed versions used
+    to convert notebooks. fast_read is part of the hash since reading with
+    --fast-read drops widget state, which changes the pages.
+    """
+    config = dict(
+        exporter_config,
+        output_folder=output_folder,
+        versions=versions(),
+    )
+    if fast_read:
+        # Only added when set so hashes without it stay the same
+        config['fast_read'] = True
+    serialized = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class BuildManifest(object):
+    """
+    Tracks the notebooks converted in previous builds and the files each
+    conversion wrote.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = self._load()
+
+        # Notebook hashes computed during this build, keyed by notebook path.
+        # Hashes are computed before conversion so a notebook modified
+        # mid-build is rebuilt next time.
+        self._notebook_hashes = {}
+
+    def is_up_to_date(self, notebook, config_key) -> bool:
+        """
+        Returns True if notebook was converted in a previous build with the
+        same contents and configuration and its outputs haven't been modified
+        or removed since.
+        """
+        entry = self.entries.get(_key(notebook))
+        if not entry or entry['config_hash'] != config_key:
+            return False
+
+        if entry['notebook_hash'] != self._notebook_hash(notebook):
+            return False
+
+        return all(
+            _file_stat(path) == stat
+            for path, stat in entry['output_stats'].items()
+        ) and all(os.path.isfile(image) for image in entry['images'])
+
+    def output_file(self, notebook):
+        """
+        Returns the path of the HTML file last generated for notebook.
+        """
+        return self.entries[_key(notebook)]['output_file']
+
+    def record(self, notebook, config_key, output_file, images=()):
+        """
+        Records a successful conversion of notebook.
+        """
+        # The HTML file and the precompressed copies written next to it
+        output_paths = [output_file] + [
+            output_file + suffix
+            for suffix in COMPRESSED_SUFFIXES
+            if os.path.isfile(output_file + suffix)
+        ]
+        self.entries[_key(notebook)] = {
+            'notebook_hash': self._notebook_hash(notebook),
+            'config_hash': config_key,
+            'output_file': output_file,
+            'output_stats': {
+                path: _file_stat(path) for path in output_paths
+            },
+            'images': list(images),
+        }
+
+    def remove_stale(self) -> list:
+        """
+        Deletes the outputs of notebooks that no longer exist and removes them
+        from the manifest. Returns the list of removed notebooks.
+        """
+        stale = [nb for nb in self.entries if not os.path.isfile(nb)]
+        stale_entries = [self.entries.pop(notebook) for notebook in stale]
+
+        # Images named by their contents can be shared with other notebooks
+        in_use = {
+            path
+            for entry in self.entries.values()
+            for path in [entry['output_file']] + entry['images']
+        }
+        for entry in stale_entries:
+            for path in [entry['output_file']] + entry['images']:
+                if path not in in_use and os.path.isfile(path):
+                    os.remove(path)
+            if entry['output_file'] not in in_use:
+                remove_precompressed(entry['output_file'])
+        return stale
+
+    def save(self):
+        """
+        Writes the manifest to disk. The file is written atomically so an
+        interrupted build never leaves a corrupt manifest behind.
+        """
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'notebooks': self.entries,
+            }, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('notebooks', {})
+
+    def _notebook_hash(self, notebook):
+        key = _key(notebook)
+        if key not in self._notebook_hashes:
+            self._notebook_hashes[key] = hash_file(notebook)
+        return self._notebook_hashes[key]
+
+
+def _key(notebook):
+    return os.path.abspath(notebook)
+
+
+def _file_stat(path):
+    """
+    Returns [size, mtime] for path or None if path doesn't exist. Used to
+    detect outputs that were changed or deleted since the last build.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _package_version(name):
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        # Python 3.7 doesn't have importlib.metadata; the template hashes
+        # still catch changes to the templates in that case.
+        return None
+
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def _nbconvert_version():
+    # Only needed without importlib.metadata since importing nbconvert is slow
+    import nbconvert
+    return nbconvert.__version__
@@ -0,0 +1,270 @@
+"""
+Shrinks generated pages for `nbinteract --optimize`.
+
+HTMLMinifier collapses runs of whitespace between and inside text, and
+minifies inline CSS. It never changes the contents of elements where
+whitespace matters or where collapsing it could change behavior: <pre>,
+<code>, <textarea> and <script>. Tags and their attributes are copied
+unchanged. The minifier works on chunks so streamed pages are minified
+without holding the whole page in memory.
+
+write_precompressed() writes gzip and, if the brotli package is installed,
+brotli copies of a page next to it so static hosts can serve them without
+compressing each response.
+"""
+import gzip
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Elements whose contents are copied unchanged
+PRESERVED_TAGS = ('pre', 'code', 'textarea', 'script', 'style')
+
+# Suffixes of the precompressed copies written next to each page
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+
+# Matches a start tag, end tag, doctype or processing instruction. Quoted
+# attribute values can contain >.
+_TAG_RE = re.compile(
+    r'<(/?)([a-zA-Z!?][^\s/>]*)(?:[^>"\']|"[^"]*"|\'[^\']*\')*>'
+)
+_TAG_START_RE = re.compile(r'<[a-zA-Z!?/]')
+
+# HTML whitespace. \s would also match non-breaking spaces, which render
+# differently.
+_NEWLINE_RUN_RE = re.compile(r'[ \t\r\f]*\n[ \t\n\r\f]*')
+_SPACE_RUN_RE = re.compile(r'[ \t\r\f]{2,}|[\t\r\f]')
+_TRAILING_WHITESPACE_RE = re.compile(r'[ \t\n\r\f]*\Z')
+
+_CSS_TOKEN_RE = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'  # Strings are kept
+    r'|/\*.*?\*/'  # Comments are removed
+    r'|[ \t\n\r\f]*([{};,>])[ \t\n\r\f]*'  # Spaces around punctuation too
+    r'|[ \t\n\r\f]+',  # Other whitespace becomes one space
+    re.DOTALL,
+)
+
+_CHUNK_SIZE = 1 << 20
+
+
+class HTMLMinifier(object):
+    """
+    Minifies HTML that's passed in as a series of chunks. feed() returns the
+    minified HTML that's ready so far and close() returns the rest.
+
+    input_bytes and output_bytes count the UTF-8 encoded size of the HTML
+    passed in and returned.
+    """
+
+    def __init__(self):
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+        self._buffer = ''
+        # Name of the preserved element whose contents are being copied
+        self._preserved_tag = None
+        self._preserved_end_re = None
+
+    def feed(self, html) -> str:
+        self.input_bytes += _utf8_size(html)
+        self._buffer += html
+        return self._process(final=False)
+
+    def close(self) -> str:
+        return self._process(final=True)
+
+    def _process(self, final):
+        buf = self._buffer
+        pos = 0
+        out = []
+
+        while pos < len(buf):
+            if self._preserved_tag:
+                end = self._preserved_end_re.search(buf, pos)
+                if end is None:
+                    if final:
+                        out.append(self._preserved(buf[pos:]))
+                        pos = len(buf)
+                    elif self._preserved_tag != 'style':
+                        # Copies everything before the last <, which could
+                        # start the end tag. CSS is minified once it's
+                        # complete.
+                        safe = buf.rfind('<', pos)
+                        safe = len(buf) if safe == -1 else safe
+                        out.append(buf[pos:safe])
+                        pos = safe
+                    break
+                out.append(self._preserved(buf[pos:end.start()]))
+                out.append(end.group())
+                pos = end.end()
+                self._preserved_tag = self._preserved_end_re = None
+                continue
+
+            lt = buf.find('<', pos)
+            if lt == -1:
+                text = buf[pos:]
+                # Whitespace at the end might continue in the next chunk
+                keep = 0 if final else len(
+                    _TRAILING_WHITESPACE_RE.search(text).group()
+                )
+                out.append(_collapse_whitespace(text[:len(text) - keep]))
+                pos = len(buf) - keep
+                break
+
+            out.append(_collapse_whitespace(buf[pos:lt]))
+            pos = lt
+
+            if buf.startswith('<!--', pos):
+                end = buf.find('-->', pos + 4)
+                if end == -1:
+                    if final:
+                        out.append(buf[pos:])
+                        pos = len(buf)
+                    break
+                out.append(buf[pos:end + 3])
+                pos = end + 3
+                continue
+
+            tag = _TAG_RE.match(buf, pos)
+            if tag is None:
+                if not _TAG_START_RE.match(buf, pos) and (
+                    final or len(buf) - pos >= 2
+                ):
+                    # A < that doesn't start a tag
+                    out.append('<')
+                    pos += 1
+                    continue
+                if final:
+                    out.append(buf[pos:])
+                    pos = len(buf)
+                # Otherwise the tag continues in the next chunk
+                break
+
+            out.append(tag.group())
+            pos = tag.end()
+            name = tag.group(2).lower()
+            if (
+                not tag.group(1) and name in PRESERVED_TAGS
+                and not tag.group().endswith('/>')
+            ):
+                self._preserved_tag = name
+                self._preserved_end_re = re.compile(
+                    r'</{}[ \t\n\r\f]*>'.format(name), re.IGNORECASE
+                )
+
+        self._buffer = buf[pos:]
+        minified = ''.join(out)
+        self.output_bytes += _utf8_size(minified)
+        return minified
+
+    def _preserved(self, contents):
+        if self._preserved_tag == 'style':
+            return minify_css(contents)
+        return contents
+
+
+def minify(html) -> str:
+    """
+    Returns the minified html.
+    """
+    minifier = HTMLMinifier()
+    return minifier.feed(html) + minifier.close()
+
+
+def minify_chunks(chunks, stats=None):
+    """
+    Yields the minified HTML of chunks. If stats is a dict, its
+    'original_bytes' and 'minified_bytes' keys are set once chunks is
+    exhausted.
+    """
+    minifier = HTMLMinifier()
+    for chunk in chunks:
+        minified = minifier.feed(chunk)
+        if minified:
+            yield minified
+    minified = minifier.close()
+    if minified:
+        yield minified
+
+    if stats is not None:
+        stats['original_bytes'] = minifier.input_bytes
+        stats['minified_bytes'] = minifier.output_bytes
+
+
+def minify_css(css) -> str:
+    """
+    Removes comments and unneeded whitespace from css. Strings are kept as
+    they are.
+    """
+    def replace(match):
+        string, punctuation = match.groups()
+        if string:
+            return string
+        if punctuation:
+            return punctuation
+        return '' if match.group().startswith('/*') else ' '
+
+    return _CSS_TOKEN_RE.sub(replace, css).strip()
+
+
+def write_precompressed(path) -> dict:
+    """
+    Writes path + '.gz' and, if brotli is installed, path + '.br'. Removes
+    copies left by earlier builds that can't be written this time so they
+    never go stale.
+
+    Returns a dict mapping 'gzip' and 'brotli' to the size of each copy
+    written.
+    """
+    sizes = {}
+
+    gzip_path = path + '.gz'
+    tmp_path = '{}.{}.tmp'.format(gzip_path, os.getpid())
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as raw:
+        # mtime=0 keeps the output the same for the same page
+        with gzip.GzipFile(
+            filename='', mode='wb', compresslevel=9, fileobj=raw, mtime=0
+        ) as dest:
+            shutil.copyfileobj(src, dest, _CHUNK_SIZE)
+    os.replace(tmp_path, gzip_path)
+    sizes['gzip'] = os.path.getsize(gzip_path)
+
+    brotli_path = path + '.br'
+    if brotli is None:
+        remove_precompressed(path, suffixes=['.br'])
+        return sizes
+
+    compressor = brotli.Compressor(quality=11)
+    tmp_path = '{}.{}.tmp'.format(brotli_path, os.getpid())
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dest:
+        for block in iter(lambda: src.read(_CHUNK_SIZE), b''):
+            dest.write(compressor.process(block))
+        dest.write(compressor.finish())
+    os.replace(tmp_path, brotli_path)
+    sizes['brotli'] = os.path.getsize(brotli_path)
+    return sizes
+
+
+def remove_precompressed(path, suffixes=COMPRESSED_SUFFIXES):
+    """
+    Removes the precompressed copies of path.
+    """
+    for suffix in suffixes:
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def _collapse_whitespace(text):
+    # Keeps a newline where there was one so pages stay readable
+    return _SPACE_RUN_RE.sub(' ', _NEWLINE_RUN_RE.sub('\n', text))
+
+
+def _utf8_size(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
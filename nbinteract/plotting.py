@@ -15,14 +15,17 @@ reload(nbi.plotting)
 """
 import numpy as np
 import bqplot as bq
-import collections
+import collections.abc
 import ipywidgets as widgets
 import itertools
 import functools
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
 import toolz.curried as tz
 from IPython.display import display
-from . import util
+from . import background, data_cache, precompute, util
 
 __all__ = ['hist', 'bar', 'scatter_drag', 'scatter', 'line', 'Figure']
 
@@ -32,6 +35,17 @@ PLACEHOLDER_RANGE = np.arange(10)
 DARK_BLUE = '#475A77'
 GOLDENROD = '#FEC62C'
 
+# Values of the binning option of hist()
+BINNING_MODES = ('auto', 'kernel', 'browser')
+
+# With binning='auto', hist() bins samples with more points than this in the
+# kernel
+KERNEL_BINNING_THRESHOLD = 10000
+
+# Samples with more points than this are binned in chunks across threads
+THREADED_BINNING_THRESHOLD = 1 << 22
+BINNING_CHUNK_SIZE = 1 << 20
+
 ##############################################################################
 # Helpers for plot options
 ##############################################################################
@@ -47,7 +61,12 @@ default_options = {
     'animation_duration': 0,
     'bins': 10,
     'normalized': True,
+    'binning': 'auto',
     'marker': 'circle',
+    'background': False,
+    'throttle': 0,
+    'debounce': 0,
+    'cache': None,
 }
 
 options_docstring = '''options (dict): Options for the plot. Available options:
@@ -76,11 +95,36 @@ option_doc = {
         'Normalize histogram area to 1 if True. If False, plot '
         'unmodified counts. (default True)'
     ),
+    'binning': (
+        'Where the histogram is binned. "kernel" bins the sample in the '
+        'kernel and only sends the bin counts to the page, "browser" sends '
+        'the whole sample for the page to bin, and "auto" bins in the kernel '
+        'if the sample for the initial widget values has more than 10,000 '
+        'points. (default "auto")'
+    ),
     'marker': (
         'Shape of marker plots. Possible values: {"circle", "cross", '
         '"diamond", "square", "triangle-down", "triangle-up", "arrow", '
         '"rectangle", "ellipse"}'
     ),
+    'background': (
+        'If True, computes the plot data on a worker thread so the kernel '
+        'keeps up with widget changes. Widget values that change again '
+        'before they are computed are skipped; runner.stats of the '
+        'interactive controls counts them. (default False)'
+    ),
+    'throttle': (
+        'Least number of seconds between two computations of a background '
+        'plot (default 0)'
+    ),
+    'debounce': (
+        'Seconds a background plot waits for the widgets to stop changing '
+        'before computing (default 0)'
+    ),
+    'cache': (
+        'A DataCache that memoizes the plot data computed for each set of '
+        'widget values, or True for a new in-memory one. (default None)'
+    ),
 
     # Private options for internal use
     '_fig':
@@ -177,13 +221,18 @@ def use_options(allowed):
 ##############################################################################
 @use_options([
     'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'xlim',
-    'ylim', 'bins', 'normalized'
+    'ylim', 'bins', 'normalized', 'binning', 'background', 'throttle',
+    'debounce', 'cache'
 ])
 def hist(hist_function, *, options={}, **interact_params):
     """
     Generates an interactive histogram that allows users to change the
     parameters of the input hist_function.
 
+    Large samples are binned in the kernel with NumPy and drawn with a
+    bqplot Bars mark so only the bin counts are sent to the page. Other
+    samples are sent whole and binned by a bqplot Hist mark in the page.
+
     Args:
         hist_function (Array | (*args -> Array int | Array float)):
             Function that takes in parameters to interact with and returns an
@@ -204,33 +253,104 @@ def hist(hist_function, *, options={}, **interact_params):
     ...     return np.random.normal(size=n_points)
     >>> hist(gen_random, n_points=(0, 1000, 10))
     VBox(...)
+
+    >>> box = hist(np.arange(100000), options=dict(bins=4, normalized=False))
+    >>> [bars] = box.children[1].marks
+    >>> bars.y
+    array([25000., 25000., 25000., 25000.])
     """
-    params = {
-        'marks': [{
-            'sample': _array_or_placeholder(hist_function),
-            'bins': _get_option('bins'),
-            'normalized': _get_option('normalized'),
-            'scales': (
-                lambda opts: {'sample': opts['x_sc'], 'count': opts['y_sc']}
-            ),
-        }],
-    }
+    binning = _get_option('binning')(options)
+    if binning not in BINNING_MODES:
+        raise ValueError(
+            'The binning option must be one of {}, not {!r}'.format(
+                BINNING_MODES, binning
+            )
+        )
+    bins = _get_option('bins')(options)
+    normalized = _get_option('normalized')(options)
+    sample = util.bind_args(hist_function, interact_params)
+    # Holds the (widget values, sample) drawn to pick the binning mode, which
+    # the first update uses instead of calling hist_function again
+    first_sample = []
+
+    def compute_data(**interact_params):
+        first = first_sample.pop() if first_sample else None
+        if first is not None and _same_values(first[0], interact_params):
+            data = first[1]
+        else:
+            data = sample(interact_params)
+        if binning == 'browser':
+            return {'sample': data}
+        return _bin_counts(data, bins, normalized)
+
+    # compute and the hist mark are made once the initial sample is known
+    controls = _interactive(
+        lambda **interact_params: compute(**interact_params),
+        lambda traits: _set_traits(hist, traits),
+        options,
+        interact_params,
+    )
+
+    initial = None
+    if binning == 'auto':
+        if callable(hist_function):
+            initial_values = _widget_values(controls)
+            initial = sample(initial_values)
+            first_sample.append((initial_values, initial))
+        else:
+            initial = hist_function
+        binning = (
+            'kernel' if np.size(initial) > KERNEL_BINNING_THRESHOLD
+            else 'browser'
+        )
+    elif not callable(hist_function):
+        initial = hist_function
+    compute = _memoize(
+        compute_data, options, interact_params,
+        ['hist', hist_function, binning, bins, normalized]
+    )
+
+    if binning == 'browser':
+        mark = bq.Hist
+        params = {
+            'marks': [{
+                'sample': _array_or_placeholder(hist_function),
+                'bins': bins,
+                'normalized': normalized,
+                'scales': (
+                    lambda opts: {
+                        'sample': opts['x_sc'], 'count': opts['y_sc']
+                    }
+                ),
+            }],
+        }
+    else:
+        mark = bq.Bars
+        params = {
+            'marks': [
+                tz.merge(
+                    {'x': PLACEHOLDER_RANGE, 'y': PLACEHOLDER_ZEROS},
+                    _bin_counts(initial, bins, normalized)
+                    if initial is not None else {},
+                    # Bars at the bin centers that fill each bin like Hist
+                    {'padding': 0},
+                )
+            ],
+        }
     fig = options.get('_fig', False) or _create_fig(options=options)
     [hist] = _create_marks(
-        fig=fig, marks=[bq.Hist], options=options, params=params
+        fig=fig, marks=[mark], options=options, params=params
     )
     _add_marks(fig, [hist])
 
-    def wrapped(**interact_params):
-        hist.sample = util.maybe_call(hist_function, interact_params)
-
-    controls = widgets.interactive(wrapped, **interact_params)
+    precompute.attach(controls, hist, compute)
 
     return widgets.VBox([controls, fig])
 
 
 @use_options([
-    'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'ylim'
+    'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'ylim',
+    'background', 'throttle', 'debounce', 'cache'
 ])
 def bar(x_fn, y_fn, *, options={}, **interact_params):
     """
@@ -279,6 +399,11 @@ def bar(x_fn, y_fn, *, options={}, **interact_params):
     >>> bar(categories, multiply, x__n=(0, 10), y__n=(1, 10))
     VBox(...)
     """
+    compute = _memoize(
+        _xy_computer(x_fn, y_fn, interact_params), options, interact_params,
+        ['xy', x_fn, y_fn]
+    )
+
     params = {
         'marks': [{
             'x': _array_or_placeholder(x_fn, PLACEHOLDER_RANGE),
@@ -293,14 +418,10 @@ def bar(x_fn, y_fn, *, options={}, **interact_params):
     )
     _add_marks(fig, [bar])
 
-    def wrapped(**interact_params):
-        x_data = util.maybe_call(x_fn, interact_params, prefix='x')
-        bar.x = x_data
-
-        y_bound = util.maybe_curry(y_fn, x_data)
-        bar.y = util.maybe_call(y_bound, interact_params, prefix='y')
-
-    controls = widgets.interactive(wrapped, **interact_params)
+    controls = _interactive(
+        compute, functools.partial(_set_traits, bar), options, interact_params
+    )
+    precompute.attach(controls, bar, compute)
 
     return widgets.VBox([controls, fig])
 
@@ -361,14 +482,18 @@ def scatter_drag(
     # create line fit to data and display equation
     def update_line(change=None):
         x_sc = scat.scales['x']
-        lin.x = [
+        line_x = [
             x_sc.min if x_sc.min is not None else np.min(scat.x),
             x_sc.max if x_sc.max is not None else np.max(scat.x),
         ]
         poly = np.polyfit(scat.x, scat.y, deg=1)
-        lin.y = np.polyval(poly, lin.x)
-        if show_eqn:
-            equation.value = 'y = {:.2f}x + {:.2f}'.format(poly[0], poly[1])
+        with _hold_sync(lin, equation):
+            lin.x = line_x
+            lin.y = np.polyval(poly, line_x)
+            if show_eqn:
+                equation.value = 'y = {:.2f}x + {:.2f}'.format(
+                    poly[0], poly[1]
+                )
 
     update_line()
 
@@ -379,7 +504,7 @@ def scatter_drag(
 
 @use_options([
     'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'xlim',
-    'ylim', 'marker'
+    'ylim', 'marker', 'background', 'throttle', 'debounce', 'cache'
 ])
 def scatter(x_fn, y_fn, *, options={}, **interact_params):
     """
@@ -419,6 +544,11 @@ def scatter(x_fn, y_fn, *, options={}, **interact_params):
     >>> scatter(x_values, y_values, n=(0,200))
     VBox(...)
     """
+    compute = _memoize(
+        _xy_computer(x_fn, y_fn, interact_params), options, interact_params,
+        ['xy', x_fn, y_fn]
+    )
+
     params = {
         'marks': [{
             'x': _array_or_placeholder(x_fn),
@@ -432,21 +562,17 @@ def scatter(x_fn, y_fn, *, options={}, **interact_params):
     )
     _add_marks(fig, [scat])
 
-    def wrapped(**interact_params):
-        x_data = util.maybe_call(x_fn, interact_params, prefix='x')
-        scat.x = x_data
-
-        y_bound = util.maybe_curry(y_fn, x_data)
-        scat.y = util.maybe_call(y_bound, interact_params, prefix='y')
-
-    controls = widgets.interactive(wrapped, **interact_params)
+    controls = _interactive(
+        compute, functools.partial(_set_traits, scat), options, interact_params
+    )
+    precompute.attach(controls, scat, compute)
 
     return widgets.VBox([controls, fig])
 
 
 @use_options([
     'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'xlim',
-    'ylim'
+    'ylim', 'background', 'throttle', 'debounce', 'cache'
 ])
 def line(x_fn, y_fn, *, options={}, **interact_params):
     """
@@ -490,18 +616,19 @@ def line(x_fn, y_fn, *, options={}, **interact_params):
     >>> line(x_values, y_values, max=(10, 50), sd=(1, 10))
     VBox(...)
     """
+    compute = _memoize(
+        _xy_computer(x_fn, y_fn, interact_params), options, interact_params,
+        ['xy', x_fn, y_fn]
+    )
+
     fig = options.get('_fig', False) or _create_fig(options=options)
     [line] = (_create_marks(fig=fig, marks=[bq.Lines], options=options))
     _add_marks(fig, [line])
 
-    def wrapped(**interact_params):
-        x_data = util.maybe_call(x_fn, interact_params, prefix='x')
-        line.x = x_data
-
-        y_bound = util.maybe_curry(y_fn, x_data)
-        line.y = util.maybe_call(y_bound, interact_params, prefix='y')
-
-    controls = widgets.interactive(wrapped, **interact_params)
+    controls = _interactive(
+        compute, functools.partial(_set_traits, line), options, interact_params
+    )
+    precompute.attach(controls, line, compute)
 
     return widgets.VBox([controls, fig])
 
@@ -513,7 +640,7 @@ def line(x_fn, y_fn, *, options={}, **interact_params):
 
 @use_options([
     'title', 'aspect_ratio', 'animation_duration', 'xlabel', 'ylabel', 'xlim',
-    'ylim'
+    'ylim', 'cache'
 ])
 def _create_fig_with_options(*, options={}):
     """
@@ -535,6 +662,13 @@ class Figure(object):
     <nbinteract.plotting.Figure...
     >>> fig
     <nbinteract.plotting.Figure...
+
+    If options has a cache, the plots on the figure share it. It's kept as
+    the cache attribute.
+
+    >>> fig = Figure(options={'cache': True}).line([1, 2], [3, 4])
+    >>> fig.cache
+    <nbinteract.data_cache.DataCache...
     """
 
     def __init__(self, options={}):
@@ -542,16 +676,37 @@ class Figure(object):
         self.figure = _create_fig_with_options(options=options)
         self.widgets = []
 
-    @use_options(['bins', 'normalized'])
+        cache = options.get('cache')
+        self.cache = data_cache.DataCache() if cache is True else cache
+
+    def batch(self):
+        """
+        Returns a context manager that holds the trait updates of the figure
+        and its marks until it exits, so the page redraws every mark at once
+        instead of after each change. Each widget sends one message with all
+        of its changed traits.
+
+        >>> fig = Figure().line([1, 2], [3, 4]).scatter([1, 2], [5, 6])
+        >>> [line, scatter] = fig.figure.marks
+        >>> with fig.batch():
+        ...     line.y = [4, 3]
+        ...     scatter.y = [6, 5]
+        """
+        return _hold_sync(self.figure, *self.figure.marks)
+
+    @use_options([
+        'bins', 'normalized', 'binning', 'background', 'throttle', 'debounce',
+        'cache'
+    ])
     def hist(self, hist_function, *, options={}, **interact_params):
-        options = tz.assoc(options, '_fig', self.figure)
+        options = self._mark_options(options)
         box = hist(hist_function, options=options, **interact_params)
         widget = box.children[0]
         self.widgets.append(widget)
         return self
 
     def bar(self, x_fn, y_fn, *, options={}, **interact_params):
-        options = tz.assoc(options, '_fig', self.figure)
+        options = self._mark_options(options)
         box = bar(x_fn, y_fn, options=options, **interact_params)
         widget = box.children[0]
         self.widgets.append(widget)
@@ -574,19 +729,28 @@ class Figure(object):
         return self
 
     def scatter(self, x_fn, y_fn, *, options={}, **interact_params):
-        options = tz.assoc(options, '_fig', self.figure)
+        options = self._mark_options(options)
         box = scatter(x_fn, y_fn, options=options, **interact_params)
         widget = box.children[0]
         self.widgets.append(widget)
         return self
 
     def line(self, x_fn, y_fn, *, options={}, **interact_params):
-        options = tz.assoc(options, '_fig', self.figure)
+        options = self._mark_options(options)
         box = line(x_fn, y_fn, options=options, **interact_params)
         widget = box.children[0]
         self.widgets.append(widget)
         return self
 
+    def _mark_options(self, options):
+        """
+        Returns the options for a plot on the figure, which uses the figure's
+        cache unless options has its own.
+        """
+        if self.cache is not None:
+            options = tz.merge({'cache': self.cache}, options)
+        return tz.assoc(options, '_fig', self.figure)
+
     def _ipython_display_(self):
         """
         Called when a Figure is returned on the last line of a Jupyter cell to
@@ -749,11 +913,156 @@ def _array_or_placeholder(
     Used to give bqplot its required initial points to plot even if we're using
     a function to generate points.
     """
-    if isinstance(maybe_iterable, collections.Iterable):
+    if isinstance(maybe_iterable, collections.abc.Iterable):
         return np.array([i for i in maybe_iterable])
     return placeholder
 
 
+def _xy_computer(x_fn, y_fn, interact_params):
+    """
+    Returns a function that takes the values of a mark's widgets as kwargs
+    and returns the mark's x and y data. y_fn gets the x data as its first
+    argument.
+
+    The arguments of x_fn and y_fn are bound to the names in interact_params
+    here, so missing or conflicting arguments raise a ValueError when the
+    plot is made.
+    """
+    x_call = util.bind_args(x_fn, interact_params, prefix='x')
+    y_call = util.bind_args(y_fn, interact_params, prefix='y', skip_first=True)
+
+    def compute(**interact_params):
+        x_data = x_call(interact_params)
+        return {'x': x_data, 'y': y_call(interact_params, x_data)}
+
+    return compute
+
+
+def _interactive(compute, apply, options, interact_params):
+    """
+    Returns the interactive controls for a mark. When a widget changes, the
+    controls call compute with the widget values and pass the result to
+    apply.
+
+    If the background option is set, compute runs on a worker thread through
+    a background.LatestRunner, which is kept as the runner attribute of the
+    controls.
+    """
+    if not _get_option('background')(options):
+
+        def wrapped(**interact_params):
+            apply(compute(**interact_params))
+
+        return widgets.interactive(wrapped, **interact_params)
+
+    runner = background.LatestRunner(
+        compute,
+        apply,
+        throttle=_get_option('throttle')(options),
+        debounce=_get_option('debounce')(options),
+    )
+    controls = widgets.interactive(runner.submit, **interact_params)
+    controls.runner = runner
+    return controls
+
+
+def _memoize(compute, options, interact_params, sources):
+    """
+    Returns compute memoized by the DataCache in the cache option, or compute
+    if the option isn't set. sources are the functions, data and settings
+    that compute uses, which key its results on disk.
+    """
+    cache = _get_option('cache')(options)
+    if cache is None or cache is False:
+        return compute
+    if cache is True:
+        cache = data_cache.DataCache()
+    return cache.memoize(compute, interact_params.keys(), sources)
+
+
+def _widget_values(controls):
+    """
+    Returns the kwargs that controls passes to its function for the current
+    values of its widgets.
+    """
+    return {
+        widget._kwarg: widget.get_interact_value()
+        for widget in controls.kwargs_widgets
+    }
+
+
+def _same_values(values, other):
+    """
+    Returns True if the dicts of widget values hold the same objects. Values
+    are compared by identity since they can be arrays.
+    """
+    return values.keys() == other.keys() and all(
+        values[name] is other[name] for name in values
+    )
+
+
+def _bin_counts(sample, bins, normalized):
+    """
+    Returns the x and y data of a Bars mark that draws the histogram of
+    sample: the centers of its bins and their counts, or their densities if
+    normalized is True. Bins span the range of sample like in bqplot's Hist.
+    NaN and infinite values are dropped since they don't fall in a bin.
+
+    Samples with more than THREADED_BINNING_THRESHOLD points are binned in
+    chunks across threads since NumPy releases the GIL while it computes.
+
+    >>> _bin_counts([1, 2, 2, 3], bins=2, normalized=False)
+    {'x': array([1.5, 2.5]), 'y': array([1., 3.])}
+    """
+    sample = np.asarray(sample, dtype=float).ravel()
+    sample = sample[np.isfinite(sample)]
+    if len(sample) > THREADED_BINNING_THRESHOLD:
+        lo, hi = sample.min(), sample.max()
+        # Binning every chunk over the whole range gives the same counts as
+        # binning the sample at once
+        chunks = [
+            sample[start:start + BINNING_CHUNK_SIZE]
+            for start in range(0, len(sample), BINNING_CHUNK_SIZE)
+        ]
+        with ThreadPoolExecutor(min(8, os.cpu_count() or 1)) as pool:
+            results = list(pool.map(
+                lambda chunk: np.histogram(chunk, bins=bins, range=(lo, hi)),
+                chunks,
+            ))
+        edges = results[0][1]
+        counts = np.sum([chunk_counts for chunk_counts, _ in results], axis=0)
+    else:
+        counts, edges = np.histogram(sample, bins=bins)
+
+    counts = counts.astype(float)
+    if normalized and counts.sum():
+        counts /= counts.sum() * np.diff(edges)
+    return {'x': (edges[:-1] + edges[1:]) / 2, 'y': counts}
+
+
+@contextmanager
+def _hold_sync(*widgets):
+    """
+    Context manager that holds the trait updates of each of widgets until it
+    exits, then sends one message per widget with all of its changed traits.
+    """
+    with ExitStack() as stack:
+        for widget in widgets:
+            stack.enter_context(widget.hold_sync())
+        yield
+
+
+def _set_traits(mark, traits):
+    """
+    Sets the traits of mark from a dict of trait names to values, in order.
+    The page gets them in one message so it never draws a mark whose x and y
+    have different lengths.
+    """
+    with mark.hold_sync():
+        for trait, value in traits.items():
+            setattr(mark, trait, value)
+
+
 def _maybe_call(maybe_fn, opts):
     if callable(maybe_fn):
         return maybe_fn(opts)
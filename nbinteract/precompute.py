@@ -0,0 +1,312 @@
+"""
+Precomputes the outputs of nbinteract plots at build time so pages can
+answer widget changes without a kernel.
+
+When `nbinteract --precompute` executes a notebook, it sets the
+NBINTERACT_PRECOMPUTE environment variable for the kernel. Each of
+nbi.hist(), nbi.bar(), nbi.line() and nbi.scatter() then passes its controls
+and the function that computes its mark data to attach(), which evaluates the
+function for every combination of widget values and stores the results in a
+synced trait of the controls widget. The trait is recorded with the rest of
+the widget state, so --widget-snapshots embeds it in the page.
+
+The results are stored compactly:
+
+- Each distinct array is stored once and rows of the table refer to it by
+  index.
+- Arrays of integers are delta encoded as little-endian int32s, so arrays
+  like ranges turn into runs of identical bytes that compress well. Other
+  numeric arrays are stored as float64s. Both are base64 encoded. Arrays of
+  strings are stored as JSON lists.
+
+Plots whose controls can't be enumerated, like text boxes, whose grid has
+more combinations than the budget allows, or whose results are too large
+are left alone and use the kernel as before.
+
+numpy is imported inside functions since the CLI imports this module.
+"""
+import base64
+import itertools
+import json
+import logging
+import os
+
+# Set to the JSON-encoded budget to enable precomputation in a kernel
+ENV_VAR = 'NBINTERACT_PRECOMPUTE'
+
+# Name of the trait that holds precomputed results. Keep in sync with
+# precomputed.js.
+TRAIT_NAME = '_nbi_precomputed'
+
+FORMAT_VERSION = 1
+
+DEFAULT_MAX_COMBINATIONS = 1000
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+INT32_MIN = -2**31
+INT32_MAX = 2**31 - 1
+
+
+def budget_from_env(environ=os.environ):
+    """
+    Returns the budget dict from the environment, or None if precomputation
+    is disabled.
+    """
+    value = environ.get(ENV_VAR)
+    if not value:
+        return None
+    budget = {
+        'max_combinations': DEFAULT_MAX_COMBINATIONS,
+        'max_bytes': DEFAULT_MAX_BYTES,
+    }
+    try:
+        budget.update(json.loads(value))
+    except ValueError:
+        logging.warning('Ignoring invalid {}: {!r}'.format(ENV_VAR, value))
+    return budget
+
+
+def make_budget(max_combinations=DEFAULT_MAX_COMBINATIONS,
+                max_bytes=DEFAULT_MAX_BYTES) -> str:
+    """
+    Returns the value of ENV_VAR for a budget.
+    """
+    return json.dumps(
+        {'max_combinations': max_combinations, 'max_bytes': max_bytes},
+        sort_keys=True,
+    )
+
+
+def attach(controls, mark, compute, budget=None):
+    """
+    Precomputes the results of compute for every combination of the values
+    of controls' widgets and stores them on controls. Does nothing unless
+    precomputation is enabled.
+
+    Args:
+        controls (ipywidgets.interactive): The plot's controls.
+        mark (bqplot.Mark): Mark whose traits compute sets.
+        compute ((**kwargs) -> dict): Function that takes the values of the
+            controls as kwargs and returns a dict mapping traits of mark to
+            their values.
+
+    Kwargs:
+        budget (dict): Budget to use instead of the one from the environment.
+
+    Returns:
+        True if the results were stored.
+    """
+    budget = budget or budget_from_env()
+    if budget is None:
+        return False
+
+    table = precompute(controls, mark, compute, budget)
+    if table is None:
+        return False
+
+    from traitlets import Dict
+    controls.add_traits(**{TRAIT_NAME: Dict().tag(sync=True)})
+    setattr(controls, TRAIT_NAME, table)
+    return True
+
+
+def precompute(controls, mark, compute, budget):
+    """
+    Returns the table of precomputed results described in the module
+    docstring, or None if the plot doesn't fit in budget.
+    """
+    import numpy as np
+
+    grid = control_grid(controls)
+    if not grid:
+        # Either a widget can't be enumerated or nothing can change
+        return None
+
+    n_combinations = 1
+    for control in grid:
+        n_combinations *= len(control['values'])
+    if n_combinations > budget['max_combinations']:
+        logging.info(
+            'Not precomputing a plot with {} widget value combinations, '
+            'more than the budget of {}.'.format(
+                n_combinations, budget['max_combinations']
+            )
+        )
+        return None
+
+    fixed = {
+        widget._kwarg: widget.value
+        for widget in controls.kwargs_widgets if _is_fixed(widget)
+    }
+
+    traits = []
+    arrays = []
+    array_index = {}
+    rows = []
+    size = 0
+
+    # User functions often draw random numbers, so the random state is put
+    # back afterwards to keep the rest of the notebook's outputs unchanged
+    random_state = np.random.get_state()
+    try:
+        for combination in itertools.product(
+            *[control['kwarg_values'] for control in grid]
+        ):
+            kwargs = dict(fixed)
+            kwargs.update(
+                (control['kwarg'], value)
+                for control, value in zip(grid, combination)
+            )
+            try:
+                results = compute(**kwargs)
+            except Exception as err:
+                logging.info(
+                    'Not precomputing a plot since computing it for {} '
+                    'raised {!r}.'.format(kwargs, err)
+                )
+                return None
+
+            if not traits:
+                traits = list(results)
+            row = []
+            for trait in traits:
+                encoded = encode_array(results[trait])
+                if encoded is None:
+                    return None
+                encoded_key = json.dumps(encoded, sort_keys=True)
+                if encoded_key not in array_index:
+                    array_index[encoded_key] = len(arrays)
+                    arrays.append(encoded)
+                    size += len(encoded_key)
+                    if size > budget['max_bytes']:
+                        logging.info(
+                            'Not precomputing a plot whose results are '
+                            'larger than the budget of {} bytes.'
+                            .format(budget['max_bytes'])
+                        )
+                        return None
+                row.append(array_index[encoded_key])
+            rows.append(row)
+    finally:
+        np.random.set_state(random_state)
+
+    return {
+        'version': FORMAT_VERSION,
+        'controls': [
+            {
+                'model_id': control['model_id'],
+                'trait': control['trait'],
+                'values': control['values'],
+            }
+            for control in grid
+        ],
+        'mark': {'model_id': mark.model_id, 'traits': traits},
+        'arrays': arrays,
+        # One row per combination in row-major order over the controls'
+        # values. Each row has the index in arrays of each trait's value.
+        'rows': rows,
+    }
+
+
+def control_grid(controls):
+    """
+    Returns a list with a dict for each widget in controls that describes the
+    values it can take, or None if one of them can't be enumerated.
+
+    Each dict has the widget's model_id, its kwarg name, the trait that the
+    page watches, the JSON values of that trait, and the matching values that
+    are passed to the plot's function.
+    """
+    from ipywidgets import (
+        Checkbox, FloatSlider, IntSlider, ToggleButton
+    )
+    from ipywidgets.widgets.widget_selection import _Selection
+
+    grid = []
+    for widget in controls.kwargs_widgets:
+        if _is_fixed(widget):
+            continue
+
+        if isinstance(widget, IntSlider):
+            values = list(range(widget.min, widget.max + 1, widget.step))
+            control = {'trait': 'value', 'values': values}
+            kwarg_values = values
+        elif isinstance(widget, FloatSlider):
+            if widget.step <= 0:
+                return None
+            count = int((widget.max - widget.min) / widget.step + 1e-9) + 1
+            values = [widget.min + i * widget.step for i in range(count)]
+            control = {'trait': 'value', 'values': values}
+            kwarg_values = values
+        elif isinstance(widget, (Checkbox, ToggleButton)):
+            values = [False, True]
+            control = {'trait': 'value', 'values': values}
+            kwarg_values = values
+        elif isinstance(widget, _Selection):
+            kwarg_values = list(widget._options_values)
+            control = {
+                'trait': 'index',
+                'values': list(range(len(kwarg_values))),
+            }
+        else:
+            return None
+
+        if not kwarg_values:
+            return None
+        control.update(
+            model_id=widget.model_id,
+            kwarg=widget._kwarg,
+            kwarg_values=kwarg_values,
+        )
+        grid.append(control)
+    return grid
+
+
+def encode_array(value):
+    """
+    Returns value encoded as described in the module docstring, or None if it
+    can't be encoded.
+    """
+    import numpy as np
+
+    array = np.asarray(value)
+    if array.ndim != 1:
+        return None
+
+    if array.dtype.kind in 'biuf':
+        if array.dtype.kind == 'f' and not np.all(np.isfinite(array)):
+            floats = None
+        else:
+            floats = array.astype(np.float64)
+        if (
+            floats is not None and len(floats)
+            and np.all(floats == np.round(floats))
+            and floats.min() >= INT32_MIN and floats.max() <= INT32_MAX
+        ):
+            ints = floats.astype(np.int64)
+            deltas = np.diff(ints, prepend=0)
+            if deltas.min() >= INT32_MIN and deltas.max() <= INT32_MAX:
+                return {
+                    'encoding': 'delta-int32',
+                    'data': _b64(deltas.astype('<i4')),
+                }
+        if array.dtype.kind == 'f' and floats is None:
+            # NaN and infinity aren't valid JSON, but float64s keep them
+            floats = array.astype(np.float64)
+        return {
+            'encoding': 'float64',
+            'data': _b64(floats.astype('<f8')),
+        }
+
+    if array.dtype.kind in 'US':
+        return {'encoding': 'json', 'data': [str(item) for item in array]}
+    return None
+
+
+def _b64(array):
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def _is_fixed(widget):
+    from ipywidgets import fixed
+    return isinstance(widget, fixed)
@@ -1,17 +1,99 @@
 """
 Preprocessors for nbconvert.
 
-This file currently only exports a subclass of nbconvert.ExecutePreprocessor
-that corrently generates widgets for ipywidgets.interact() calls.
+This file exports a subclass of nbconvert.ExecutePreprocessor that corrently
+generates widgets for ipywidgets.interact() calls, a subclass of
+nbconvert.ExtractOutputPreprocessor that names extracted outputs by their
+contents, a preprocessor that moves the CSS and JS shared by every page
+into separate files, a preprocessor that shrinks images, a preprocessor that
+embeds snapshots of widget state, a preprocessor that finds the cells widgets
+need to run, and a preprocessor that truncates huge outputs.
 
 https://github.com/SamLau95/nbinteract/issues/60
 """
 
-__all__ = ['NbiExecutePreprocessor']
+__all__ = [
+    'NbiExecutePreprocessor',
+    'HashExtractOutputPreprocessor',
+    'SharedAssetsPreprocessor',
+    'ImageOptimizePreprocessor',
+    'WidgetSnapshotPreprocessor',
+    'MinimalCellsPreprocessor',
+    'TruncateOutputPreprocessor',
+]
 
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+from contextlib import ExitStack, asynccontextmanager
 from queue import Empty
+from nbconvert.preprocessors import ExtractOutputPreprocessor, Preprocessor
 from nbconvert.preprocessors.execute import ExecutePreprocessor
-from nbformat.v4 import output_from_msg
+from nbconvert.filters import strip_ansi
+from nbformat.v4 import new_output, output_from_msg
+from traitlets import Bool, Dict, Instance, Integer, Unicode, default
+
+from . import dependencies, images, tracing
+from .optimize import minify_css
+
+# Start tags of table rows and the tags that open or close a table
+_TABLE_TAG_RE = re.compile(
+    r'<(/?)(table|thead|tbody|tfoot|tr)(?=[\s>/])', re.IGNORECASE
+)
+
+# Loads the full output of a truncated output when its link is clicked. The
+# marker is rendered as its own output right after the truncated one. Keep
+# classes in sync with plain.tpl.
+_FULL_OUTPUT_SCRIPT = '''<script>
+if (!window.nbinteractFullOutput) {
+  window.nbinteractFullOutput = true
+  document.addEventListener('click', function(event) {
+    var link = event.target.closest &&
+      event.target.closest('.js-nbinteract-full-output')
+    var marker = link && link.closest('.output_area')
+    var output = marker && marker.previousElementSibling
+    var subarea = output && output.querySelector('.output_subarea')
+    if (!subarea || !window.fetch) {
+      return
+    }
+    event.preventDefault()
+    fetch(link.href)
+      .then(function(response) {
+        return response.text()
+      })
+      .then(function(text) {
+        if (link.getAttribute('data-format') === 'html') {
+          subarea.innerHTML = text
+        } else {
+          subarea.querySelector('pre').textContent = text
+        }
+        marker.parentNode.removeChild(marker)
+      })
+  })
+}
+</script>'''
+
+WIDGET_STATE_MIMETYPE = 'application/vnd.jupyter.widget-state+json'
+WIDGET_VIEW_MIMETYPE = 'application/vnd.jupyter.widget-view+json'
+
+# Widget models refer to other models, like their layout, with strings like
+# IPY_MODEL_<model id>
+_MODEL_REFERENCE_PREFIX = 'IPY_MODEL_'
+
+# Run in the kernel before a notebook to set NbiExecutePreprocessor.kernel_env
+KERNEL_ENV_CODE = '''
+import os
+os.environ.update({env!r})
+del os
+'''
+
+# CSS for nbinteract's cell layouts. Included by nbinteract_css.tpl.
+NBINTERACT_CSS = os.path.join(
+    os.path.dirname(__file__), 'templates', 'nbinteract.css'
+)
 
 
 class NbiExecutePreprocessor(ExecutePreprocessor):
@@ -30,8 +112,113 @@ class NbiExecutePreprocessor(ExecutePreprocessor):
     This class only overrides the run_cell() method from the
     ExecutePreprocessor to ignore 'clear_output' messages from the kernel.
     Although this in theory will break cells that clear their own output, this
-    occurs infrequently in practice.
+    occurs infrequently in practice. nbclient records the widget state carried
+    by the kernel's comm messages in the notebook's metadata
+    (store_widget_state), which WidgetSnapshotPreprocessor embeds in pages.
+
+    If kernel_pool is set to an nbinteract.kernels.KernelPool, notebooks run
+    in a warm kernel borrowed from the pool instead of a new kernel. If
+    execution_cache is set to an nbinteract.execution_cache.ExecutionCache,
+    notebooks whose code cells are all cached aren't executed at all.
+    kernel_env is set in the kernel's os.environ before the notebook runs.
     """
+    kernel_pool = Instance(
+        'nbinteract.kernels.KernelPool',
+        allow_none=True,
+        help='Pool of warm kernels to execute notebooks in',
+    )
+    execution_cache = Instance(
+        'nbinteract.execution_cache.ExecutionCache',
+        allow_none=True,
+        help='Cache of code cell outputs from previous executions',
+    )
+    kernel_env = Dict(
+        help='Environment variables to set in the kernel before executing',
+    )
+
+    def preprocess(self, nb, resources=None, km=None):
+        if self.execution_cache is None:
+            return self._execute(nb, resources, km)
+
+        # The kernel runs in the notebook's folder, so files it reads there
+        # differ between folders
+        folder = (resources or {}).get('metadata', {}).get('path') or None
+        keys = self.execution_cache.cell_keys(
+            nb, self._kernel_name(nb), folder=folder, options=self.kernel_env
+        )
+        with tracing.span('replay execution cache', 'stage') as args:
+            args['hit'] = self.execution_cache.replay(nb, keys)
+        if args['hit']:
+            self.log.info('Replayed notebook outputs from execution cache')
+            return nb, resources
+
+        nb, resources = self._execute(nb, resources, km)
+        self.execution_cache.store(nb, keys)
+        return nb, resources
+
+    def _execute(self, nb, resources, km):
+        if km is not None or not self._can_use_pool(nb):
+            return super().preprocess(nb, resources, km=km)
+
+        path = (resources or {}).get('metadata', {}).get('path') or None
+        with ExitStack() as stack:
+            with tracing.span('acquire pooled kernel', 'stage'):
+                km = stack.enter_context(self.kernel_pool.kernel(cwd=path))
+            try:
+                return super().preprocess(nb, resources, km=km)
+            finally:
+                # The kernel outlives this notebook but its client doesn't
+                if getattr(self, 'kc', None) is not None:
+                    self.kc.stop_channels()
+                    self.kc = None
+
+    def preprocess_cell(self, cell, resources, index, **kwargs):
+        if cell.cell_type != 'code' or not tracing.is_enabled():
+            return super().preprocess_cell(cell, resources, index, **kwargs)
+
+        metadata = (resources or {}).get('metadata', {})
+        notebook = os.path.join(
+            metadata.get('path', ''), metadata.get('name', '') + '.ipynb'
+        )
+        with tracing.span(
+            'cell {}'.format(index), 'cell', notebook=notebook, index=index
+        ):
+            return super().preprocess_cell(cell, resources, index, **kwargs)
+
+    def _can_use_pool(self, nb):
+        if self.kernel_pool is None:
+            return False
+        return self._kernel_name(nb) == self.kernel_pool.kernel_name
+
+    def _kernel_name(self, nb):
+        # Notebooks without a kernelspec run in the default Python kernel
+        return (
+            self.kernel_name
+            or nb.metadata.get('kernelspec', {}).get('name')
+            or 'python3'
+        )
+
+    @asynccontextmanager
+    async def async_setup_kernel(self, **kwargs):
+        # nbclient only creates a kernel client for kernels that it starts
+        # itself, so create one here for kernels from the pool. The client
+        # must be async since nbclient polls its channels concurrently.
+        if self.km is not None and self.km.has_kernel and self.kc is None:
+            self.km.client_class = (
+                'jupyter_client.asynchronous.AsyncKernelClient'
+            )
+            await self.async_start_new_kernel_client()
+        async with super().async_setup_kernel(**kwargs):
+            if self.kernel_env:
+                # Set in the kernel instead of passed when starting it so
+                # pooled kernels get it too
+                msg_id = self.kc.execute(
+                    KERNEL_ENV_CODE.format(env=dict(self.kernel_env)),
+                    silent=True,
+                    store_history=False,
+                )
+                await self.async_wait_for_reply(msg_id)
+            yield
 
     def run_cell(self, cell, cell_index=0):
         msg_id = self.kc.execute(cell.source)
@@ -110,3 +297,669 @@ class NbiExecutePreprocessor(ExecutePreprocessor):
             outs.append(out)
 
         return exec_reply, outs
+
+
+class HashExtractOutputPreprocessor(ExtractOutputPreprocessor):
+    """
+    Extracts outputs like ExtractOutputPreprocessor but names each file by a
+    hash of its contents instead of by notebook name and cell index, eg.
+    3f7a9c0e1b2d4a6f8e5c.png instead of AB_5_1.png.
+
+    Identical outputs get the same filename, so an image that appears in many
+    cells or notebooks is only stored once.
+    """
+    hash_length = Integer(
+        20, help='Number of hex digits of the SHA-256 hash to use in filenames'
+    ).tag(config=True)
+
+    def preprocess_cell(self, cell, resources, cell_index):
+        cell, resources = super().preprocess_cell(
+            cell, resources, cell_index
+        )
+
+        for out in cell.get('outputs', []):
+            filenames = out.get('metadata', {}).get('filenames', {})
+            for mime_type, filename in filenames.items():
+                if filename not in resources['outputs']:
+                    continue
+                data = resources['outputs'].pop(filename)
+
+                digest = hashlib.sha256(data).hexdigest()[:self.hash_length]
+                _, extension = os.path.splitext(filename)
+                hashed = os.path.join(
+                    os.path.dirname(filename), digest + extension
+                )
+
+                filenames[mime_type] = hashed
+                resources['outputs'][hashed] = data
+
+        return cell, resources
+
+
+class SharedAssetsPreprocessor(Preprocessor):
+    """
+    Moves the CSS that nbconvert inlines into every page, along with
+    nbinteract's own CSS, into a file in assets_folder. If core_js is set,
+    the nbinteract-core bundle is copied into assets_folder as well.
+
+    Each file is named by a hash of its contents, eg.
+    nbinteract.3f7a9c0e1b2d4a6f8e5c.css, so pages that share CSS share a
+    file and browsers can cache it indefinitely. The files are added to
+    resources['outputs'] like extracted images, and resources['assets'] holds
+    their URLs for the templates, which link to them instead of inlining
+    them.
+
+    Must run after the CSSHTMLHeaderPreprocessor, which nbconvert registers
+    before any configured preprocessors.
+    """
+    assets_folder = Unicode(
+        help='Folder to write shared assets into'
+    ).tag(config=True)
+
+    assets_url = Unicode(
+        help='URL of assets_folder relative to the pages. Defaults to the '
+        "folder's name, for pages in the folder that contains it."
+    ).tag(config=True)
+
+    core_js = Unicode(
+        '',
+        help='Path to a built nbinteract-core bundle to copy into the assets '
+        'folder. If empty, pages load nbinteract-core from unpkg.com.'
+    ).tag(config=True)
+
+    minify = Bool(
+        False, help='If True, minifies the shared CSS'
+    ).tag(config=True)
+
+    hash_length = Integer(
+        20, help='Number of hex digits of the SHA-256 hash to use in filenames'
+    ).tag(config=True)
+
+    @default('assets_url')
+    def _assets_url_default(self):
+        return os.path.basename(os.path.normpath(self.assets_folder))
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        # Assets are the same for most pages, so each is only hashed once
+        self._named = {}
+        self._core_js_data = None
+
+    def preprocess(self, nb, resources):
+        css = list(resources.get('inlining', {}).get('css', []))
+        with open(NBINTERACT_CSS, encoding='utf-8') as f:
+            css.append(f.read())
+        css = '\n'.join(css)
+        if self.minify:
+            css = minify_css(css)
+
+        assets = {'css': self._add(resources, 'nbinteract', '.css', css)}
+        if self.core_js:
+            if self._core_js_data is None:
+                with open(self.core_js, 'rb') as f:
+                    self._core_js_data = f.read()
+            assets['js'] = self._add(
+                resources, 'nbinteract-core', '.js', self._core_js_data
+            )
+        resources['assets'] = assets
+        return nb, resources
+
+    def _add(self, resources, name, extension, data):
+        """
+        Adds data to resources['outputs'] under a name made from its hash
+        and returns its URL.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        key = (name, data)
+        if key not in self._named:
+            digest = hashlib.sha256(data).hexdigest()[:self.hash_length]
+            self._named[key] = '{}.{}{}'.format(name, digest, extension)
+        filename = self._named[key]
+
+        if not resources.get('outputs'):
+            resources['outputs'] = {}
+        resources['outputs'][os.path.join(self.assets_folder, filename)] = data
+        if not self.assets_url:
+            return filename
+        return self.assets_url.rstrip('/') + '/' + filename
+
+
+class ImageOptimizePreprocessor(Preprocessor):
+    """
+    Shrinks PNG and SVG outputs with nbinteract.images. PNGs are recompressed
+    losslessly and, if max_width is set, downscaled. SVGs are minified.
+
+    Works on images extracted into resources['outputs'] by an
+    ExtractOutputPreprocessor that runs before it, and on inline images
+    otherwise. If webp is True, a WebP copy of each extracted PNG is added to
+    resources['outputs'] when it's smaller, and the templates load it with a
+    <picture> element that falls back to the PNG. Inline images don't get
+    WebP copies since pages would have to carry both.
+
+    Optimized PNGs are cached in cache_folder by a hash of the original image
+    and the options, so rebuilding a notebook doesn't optimize its images
+    again.
+    """
+    max_width = Integer(
+        0, help='Downscales PNGs wider than this many pixels. 0 disables it.'
+    ).tag(config=True)
+
+    webp = Bool(
+        False, help='If True, adds a WebP copy of each extracted PNG'
+    ).tag(config=True)
+
+    webp_lossless = Bool(
+        True, help='If True, WebP copies are lossless'
+    ).tag(config=True)
+
+    webp_quality = Integer(
+        80, help='Quality of lossy WebP copies, from 0 to 100'
+    ).tag(config=True)
+
+    cache_folder = Unicode(
+        images.CACHE_PATH,
+        help='Folder to cache optimized images in. Empty disables caching.'
+    ).tag(config=True)
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self._cache = None
+
+    def preprocess(self, nb, resources):
+        if self.cache_folder and self._cache is None:
+            self._cache = images.ImageCache(self.cache_folder)
+
+        resources['image_optimization'] = {
+            'original_bytes': 0,
+            'optimized_bytes': 0,
+            'cache_hits': 0,
+        }
+        nb, resources = super().preprocess(nb, resources)
+        if self._cache:
+            self._cache.evict()
+        return nb, resources
+
+    def preprocess_cell(self, cell, resources, index):
+        if cell.cell_type != 'code':
+            return cell, resources
+
+        outputs = resources.get('outputs') or {}
+        stats = resources['image_optimization']
+        for output in cell.outputs:
+            data = output.get('data', {})
+            filenames = output.get('metadata', {}).get('filenames', {})
+
+            if 'image/png' in data:
+                filename = filenames.get('image/png')
+                extracted = filename in outputs
+                original = (
+                    outputs[filename] if extracted
+                    else base64.b64decode(data['image/png'])
+                )
+                png, webp = self._optimize_png(original, resources, extracted)
+                stats['original_bytes'] += len(original)
+                stats['optimized_bytes'] += len(png)
+
+                if extracted:
+                    outputs[filename] = png
+                    if webp:
+                        webp_filename = os.path.splitext(filename)[0] + '.webp'
+                        outputs[webp_filename] = webp
+                        filenames['image/webp'] = webp_filename
+                else:
+                    data['image/png'] = base64.b64encode(png).decode('ascii')
+
+            if 'image/svg+xml' in data:
+                filename = filenames.get('image/svg+xml')
+                if filename in outputs:
+                    svg = outputs[filename].decode('utf-8')
+                    outputs[filename] = images.minify_svg(svg).encode('utf-8')
+                else:
+                    data['image/svg+xml'] = images.minify_svg(
+                        data['image/svg+xml']
+                    )
+        return cell, resources
+
+    def _optimize_png(self, data, resources, extracted):
+        """
+        Returns a tuple of the optimized PNG and its WebP copy, or None if
+        there's no copy.
+        """
+        webp = self.webp and extracted
+        options = {'max_width': self.max_width, 'webp': webp}
+        if webp:
+            options.update(
+                webp_lossless=self.webp_lossless,
+                webp_quality=self.webp_quality,
+            )
+
+        key = self._cache.key(data, options) if self._cache else None
+        if key:
+            png = self._cache.get(key, '.png')
+            webp_data = self._cache.get(key, '.webp') if webp else b''
+            if png is not None and webp_data is not None:
+                resources['image_optimization']['cache_hits'] += 1
+                return png, webp_data or None
+
+        png, webp_data = images.optimize_png(data, **options)
+        if key:
+            self._cache.put(key, '.png', png)
+            if webp:
+                # An empty file records that the WebP wasn't smaller
+                self._cache.put(key, '.webp', webp_data or b'')
+        return png, webp_data
+
+
+class WidgetSnapshotPreprocessor(Preprocessor):
+    """
+    Embeds a snapshot of the widget state each widget output needs so pages
+    render widgets before a kernel has started. The kernel starts once a
+    reader interacts with a widget.
+
+    The state comes from the notebook's widget metadata, which executing the
+    notebook records. Each widget output's snapshot holds the models it
+    refers to, directly or through other models, that an earlier output on
+    the page hasn't already embedded. It's stored in the output's metadata
+    under nbinteract.widget_state for plain.tpl to render. Outputs whose
+    snapshot would be larger than max_bytes keep the "Show Widgets" button
+    instead.
+    """
+    max_bytes = Integer(
+        2 * 1024 * 1024,
+        help='Largest snapshot in bytes to embed for one widget output',
+    ).tag(config=True)
+
+    def preprocess(self, nb, resources):
+        state = nb.metadata.get('widgets', {}).get(
+            WIDGET_STATE_MIMETYPE, {}
+        ).get('state', {})
+
+        stats = resources['widget_snapshots'] = {
+            'outputs': 0,
+            'models': 0,
+            'bytes': 0,
+            'skipped': 0,
+        }
+        if not state:
+            return nb, resources
+
+        embedded = set()
+        for cell in nb.cells:
+            if cell.cell_type != 'code':
+                continue
+            for output in cell.outputs:
+                view = output.get('data', {}).get(WIDGET_VIEW_MIMETYPE)
+                if not view or view.get('model_id') not in state:
+                    continue
+
+                model_ids = [
+                    model_id
+                    for model_id in _referenced_models(view['model_id'], state)
+                    if model_id not in embedded
+                ]
+                snapshot = {
+                    'version_major': 2,
+                    'version_minor': 0,
+                    'state': {
+                        model_id: state[model_id] for model_id in model_ids
+                    },
+                }
+                size = len(
+                    json.dumps(snapshot, separators=(',', ':'))
+                    .encode('utf-8')
+                )
+                if size > self.max_bytes:
+                    self.log.warning(
+                        'Not embedding a widget snapshot of %d bytes, which '
+                        'is larger than max_bytes', size
+                    )
+                    stats['skipped'] += 1
+                    continue
+
+                output.metadata.setdefault('nbinteract', {})[
+                    'widget_state'
+                ] = snapshot
+                embedded.update(model_ids)
+                stats['outputs'] += 1
+                stats['models'] += len(model_ids)
+                stats['bytes'] += size
+        return nb, resources
+
+
+class MinimalCellsPreprocessor(Preprocessor):
+    """
+    Finds the code cells that the page's widget cells need so the page only
+    runs those cells when a reader starts the widgets (see
+    nbinteract.dependencies). Cells whose input is hidden with nbi:hide_in
+    are analyzed like every other cell.
+
+    Widget cells are the cells with a widget output. The result is stored in
+    resources['minimal_cells'] for plain.tpl to render as a manifest: cells
+    lists the indices, among the page's code cells, of every cell to run,
+    and widgets maps the index of each widget cell to the cells it needs.
+    Nothing is stored for notebooks without widget outputs since the page
+    can't tell which cells display widgets, so it runs every cell.
+    """
+
+    def preprocess(self, nb, resources):
+        code_cells = [cell for cell in nb.cells if cell.cell_type == 'code']
+        widget_cells = [
+            index for index, cell in enumerate(code_cells)
+            if any(
+                WIDGET_VIEW_MIMETYPE in output.get('data', {})
+                for output in cell.outputs
+            )
+        ]
+        if not widget_cells:
+            return nb, resources
+
+        needed = dependencies.minimal_cells(
+            [cell.source for cell in code_cells], widget_cells
+        )
+        resources['minimal_cells'] = {
+            'version': 1,
+            'cells': sorted(set().union(*needed.values())),
+            'widgets': {
+                str(index): cells for index, cells in needed.items()
+            },
+        }
+        return nb, resources
+
+
+class TruncateOutputPreprocessor(Preprocessor):
+    """
+    Cuts outputs that are too large to render usefully, like a cell that
+    prints a 200,000 row DataFrame or a loop that prints forever, so page
+    size and render time stay bounded no matter what a notebook outputs.
+
+    Stream and plain text outputs are cut to max_text_length characters and
+    text/html tables to max_table_rows rows per table. HTML that's still
+    longer than max_html_length can't be cut safely, so the output falls
+    back to its plain text representation. Cells keep at most max_outputs
+    outputs. Set a limit to 0 to disable it.
+
+    Each cut output is followed by a marker saying what was cut. If
+    sidecar_folder is set, the full output is added to resources['outputs']
+    under a name made from its hash, and the marker links to it. Clicking
+    the link loads the full output into the page.
+
+    Must run after notebooks are executed.
+    """
+    max_text_length = Integer(
+        100000, help='Maximum number of characters of text outputs'
+    ).tag(config=True)
+
+    max_html_length = Integer(
+        500000, help='Maximum number of characters of text/html outputs'
+    ).tag(config=True)
+
+    max_table_rows = Integer(
+        1000, help='Maximum number of rows of each table in text/html outputs'
+    ).tag(config=True)
+
+    max_outputs = Integer(
+        200, help='Maximum number of outputs of each cell'
+    ).tag(config=True)
+
+    sidecar_folder = Unicode(
+        '', help='Folder to write the full contents of cut outputs into'
+    ).tag(config=True)
+
+    sidecar_url = Unicode(
+        help='URL of sidecar_folder relative to the pages. Defaults to the '
+        "folder's name, for pages in the folder that contains it."
+    ).tag(config=True)
+
+    hash_length = Integer(
+        20, help='Number of hex digits of the SHA-256 hash to use in filenames'
+    ).tag(config=True)
+
+    @default('sidecar_url')
+    def _sidecar_url_default(self):
+        return os.path.basename(os.path.normpath(self.sidecar_folder))
+
+    def preprocess(self, nb, resources):
+        resources['truncated_outputs'] = 0
+        return super().preprocess(nb, resources)
+
+    def preprocess_cell(self, cell, resources, index):
+        if cell.cell_type != 'code' or not cell.outputs:
+            return cell, resources
+
+        total = len(cell.outputs)
+        if self.max_outputs and total > self.max_outputs:
+            cell.outputs = cell.outputs[:self.max_outputs]
+
+        outputs = []
+        for output in cell.outputs:
+            outputs.append(output)
+            marker = self._truncate(output, resources)
+            if marker:
+                outputs.append(marker)
+
+        if len(cell.outputs) < total:
+            outputs.append(self._marker(
+                resources,
+                _cut_message(len(cell.outputs), total, 'outputs'),
+            ))
+        cell.outputs = outputs
+        return cell, resources
+
+    def _truncate(self, output, resources):
+        """
+        Cuts output in place if it's too large. Returns the marker output to
+        show after it, or None if output wasn't cut.
+        """
+        if output.output_type == 'stream':
+            text = output.text
+            if not _too_long(text, self.max_text_length):
+                return None
+            output.text = _cut_text(text, self.max_text_length)
+            return self._marker(
+                resources,
+                _cut_message(len(output.text), len(text), 'characters'),
+                self._sidecar(resources, strip_ansi(text), '.txt'),
+            )
+
+        if output.output_type not in ('display_data', 'execute_result'):
+            return None
+
+        data = output.data
+        full_html = data.get('text/html')
+        if full_html:
+            cut_html, shown, total = _cut_table_rows(
+                full_html, self.max_table_rows
+            )
+            if not _too_long(cut_html, self.max_html_length):
+                if shown == total:
+                    return None
+                data['text/html'] = cut_html
+                return self._marker(
+                    resources,
+                    _cut_message(shown, total, 'table rows'),
+                    self._sidecar(resources, full_html, '.html'),
+                )
+
+            # Cutting HTML anywhere else could leave tags unclosed
+            del data['text/html']
+            message = (
+                'The HTML output has {:,} characters, which is too many to '
+                'show.'.format(len(full_html))
+            )
+            text = data.get('text/plain')
+            if text:
+                message += ' Showing its text instead.'
+                if _too_long(text, self.max_text_length):
+                    data['text/plain'] = _cut_text(text, self.max_text_length)
+                    message += ' ' + _cut_message(
+                        len(data['text/plain']), len(text), 'characters'
+                    )
+            return self._marker(
+                resources,
+                message,
+                self._sidecar(resources, full_html, '.html'),
+            )
+
+        text = data.get('text/plain')
+        if not text or not _too_long(text, self.max_text_length):
+            return None
+        data['text/plain'] = _cut_text(text, self.max_text_length)
+        return self._marker(
+            resources,
+            _cut_message(len(data['text/plain']), len(text), 'characters'),
+            self._sidecar(resources, strip_ansi(text), '.txt'),
+        )
+
+    def _sidecar(self, resources, content, extension):
+        """
+        Adds content to resources['outputs'] and returns its URL, or returns
+        None if sidecar_folder isn't set.
+        """
+        if not self.sidecar_folder:
+            return None
+        data = content.encode('utf-8')
+        filename = (
+            hashlib.sha256(data).hexdigest()[:self.hash_length] + extension
+        )
+        if not resources.get('outputs'):
+            resources['outputs'] = {}
+        resources['outputs'][os.path.join(self.sidecar_folder, filename)] = (
+            data
+        )
+        if not self.sidecar_url:
+            return filename
+        return self.sidecar_url.rstrip('/') + '/' + filename
+
+    def _marker(self, resources, message, sidecar=None):
+        """
+        Returns an output that says message and, if sidecar is set, links to
+        the full output.
+        """
+        parts = [
+            '<div class="nbinteract-truncated">',
+            '<p><strong>Output truncated.</strong> {}'.format(
+                html.escape(message)
+            ),
+        ]
+        if sidecar:
+            parts.append(
+                ' <a class="js-nbinteract-full-output" href="{}" '
+                'data-format="{}" target="_blank">Show full output</a>'
+                .format(
+                    html.escape(sidecar),
+                    'html' if sidecar.endswith('.html') else 'text',
+                )
+            )
+            # The script is only needed once per page
+            if not resources.get('full_output_script'):
+                resources['full_output_script'] = True
+                parts.append(_FULL_OUTPUT_SCRIPT)
+        parts.append('</p></div>')
+
+        resources['truncated_outputs'] = (
+            resources.get('truncated_outputs') or 0
+        ) + 1
+        return new_output(
+            'display_data',
+            data={'text/html': '\n'.join(parts), 'text/plain': message},
+            metadata={'nbinteract': {'truncated': True}},
+        )
+
+
+def _too_long(text, limit):
+    return bool(limit) and len(text) > limit
+
+
+def _cut_text(text, limit):
+    """
+    Returns the start of text, at most limit characters long. Cuts at the
+    end of a line when there's one in the second half.
+    """
+    cut = text[:limit]
+    newline = cut.rfind('\n')
+    return cut[:newline + 1] if newline >= limit // 2 else cut
+
+
+def _cut_message(shown, total, unit):
+    return 'Showing the first {:,} of {:,} {}.'.format(shown, total, unit)
+
+
+def _cut_table_rows(html_output, max_rows):
+    """
+    Removes the rows of each table section in html_output after its first
+    max_rows. Returns a tuple of (html_output, shown, total), where shown and
+    total are the numbers of rows kept and found in the sections that were
+    cut.
+    """
+    if not max_rows or '<tr' not in html_output.lower():
+        return html_output, 0, 0
+
+    pieces = []
+    start = 0
+    shown = total = 0
+    # Number of rows so far in the current section of each open table,
+    # innermost last. Tables nested in removed rows are None.
+    tables = []
+    # Index of the first removed row of the innermost table, or None
+    cut_from = None
+    for match in _TABLE_TAG_RE.finditer(html_output):
+        closing, tag = match.group(1), match.group(2).lower()
+        if tag == 'table' and not closing:
+            tables.append(0 if cut_from is None else None)
+        if not tables or tables[-1] is None:
+            if tag == 'table' and closing and tables:
+                tables.pop()
+            continue
+
+        if tag == 'tr' and not closing:
+            tables[-1] += 1
+            if tables[-1] == max_rows + 1:
+                cut_from = match.start()
+        elif not closing and tag != 'table':
+            # Rows in <thead>, <tbody> and <tfoot> are counted separately
+            tables[-1] = 0
+        elif closing and tag != 'tr':
+            # The end of a section or of the table
+            if cut_from is not None:
+                pieces.append(html_output[start:cut_from])
+                start = match.start()
+                cut_from = None
+                shown += max_rows
+                total += tables[-1]
+            tables[-1] = 0
+            if tag == 'table':
+                tables.pop()
+
+    if not pieces:
+        return html_output, 0, 0
+    pieces.append(html_output[start:])
+    return ''.join(pieces), shown, total
+
+
+def _referenced_models(model_id, state):
+    """
+    Returns the IDs of model_id and every model in state that it refers to,
+    directly or through other models, in the order they're found.
+    """
+    found = [model_id]
+    seen = {model_id}
+    pending = [model_id]
+    while pending:
+        values = [state[pending.pop()].get('state', {})]
+        while values:
+            value = values.pop()
+            if isinstance(value, dict):
+                values.extend(value.values())
+            elif isinstance(value, list):
+                values.extend(value)
+            elif (
+                isinstance(value, str)
+                and value.startswith(_MODEL_REFERENCE_PREFIX)
+            ):
+                ref = value[len(_MODEL_REFERENCE_PREFIX):]
+                if ref in state and ref not in seen:
+                    seen.add(ref)
+                    found.append(ref)
+                    pending.append(ref)
+    return found
@@ -0,0 +1,115 @@
+"""
+Reads notebooks for conversion.
+
+nbformat.read() validates every notebook against the notebook schema and
+converts every JSON object in it into a NotebookNode. For notebooks with
+megabytes of saved widget state, both take much longer than parsing the JSON.
+
+read_notebook(path, fast=True) skips validation and drops the notebook
+metadata that nbinteract's templates never render before converting the rest
+into NotebookNodes. For notebooks saved by Jupyter, the dropped metadata is
+cut out of the file before the JSON is parsed so it never takes up memory.
+It parses JSON with orjson when it's installed (`pip install
+nbinteract[fast]`).
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Notebook metadata keys that fast reads drop. Jupyter saves the state of
+# every widget in metadata.widgets, which can be larger than the rest of the
+# notebook, but nbinteract pages start their own kernel to run widgets.
+FAST_READ_DROPPED_METADATA = ('widgets', )
+
+# nbformat writes notebooks with sorted keys and one space of indentation per
+# level, so each key of the notebook metadata starts a line with exactly two
+# spaces. Strings can't contain raw newlines, so these can't match inside
+# one. Keys of cells are indented by three spaces.
+_TOP_LEVEL_METADATA_RE = re.compile(rb'\n "metadata": \{\n')
+_METADATA_KEY_RE = re.compile(
+    rb'\n  "(' + b'|'.join(
+        re.escape(key.encode('utf-8')) for key in FAST_READ_DROPPED_METADATA
+    ) + rb')": \{\n'
+)
+
+
+def read_notebook(path, fast=False):
+    """
+    Returns the notebook at path as a v4 NotebookNode.
+
+    If fast is True, the notebook isn't validated against the notebook schema
+    and the keys in FAST_READ_DROPPED_METADATA are removed from its metadata.
+    Only use it for notebooks you trust to be valid. Notebooks in formats
+    older than v4 are always read with nbformat.read().
+    """
+    import nbformat
+
+    if not fast:
+        return nbformat.read(path, as_version=4)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    nb = None
+    trimmed = _drop_metadata(data)
+    if trimmed is not data:
+        try:
+            nb = _loads(trimmed)
+        except ValueError:
+            # The file wasn't laid out the way nbformat writes notebooks
+            pass
+        del trimmed
+    if nb is None:
+        nb = _loads(data)
+
+    if not isinstance(nb, dict) or nb.get('nbformat') != 4:
+        return nbformat.reads(data.decode('utf-8'), as_version=4)
+    del data
+
+    metadata = nb.get('metadata')
+    if isinstance(metadata, dict):
+        for key in FAST_READ_DROPPED_METADATA:
+            metadata.pop(key, None)
+
+    from nbformat.v4.rwbase import rejoin_lines, strip_transient
+
+    # Does the same cleanup as nbformat's v4 reader
+    return strip_transient(rejoin_lines(nbformat.from_dict(nb)))
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def _drop_metadata(data):
+    """
+    Returns data with the values of FAST_READ_DROPPED_METADATA cut out of the
+    notebook metadata, or data itself if the notebook wasn't written by
+    nbformat.
+    """
+    if not _TOP_LEVEL_METADATA_RE.search(data):
+        return data
+
+    pieces = []
+    start = 0
+    for match in _METADATA_KEY_RE.finditer(data):
+        if match.start() < start:
+            continue
+        # The value is an object whose closing brace is indented like its key
+        end = data.find(b'\n  }', match.end())
+        if end == -1:
+            return data
+        end += len(b'\n  }')
+        # Replaces the value instead of removing the key so commas between
+        # keys stay valid
+        pieces.append(data[start:match.end() - 2])
+        pieces.append(b'{}')
+        start = end
+    if not pieces:
+        return data
+    pieces.append(data[start:])
+    return b''.join(pieces)
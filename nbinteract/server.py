@@ -0,0 +1,388 @@
+"""
+Long-lived conversion server that keeps exporters warm between conversions.
+
+Creating an InteractExporter sets up a Jinja environment, compiles the
+templates, and loads nbconvert's CSS. The CLI and publish() pay that cost on
+every call, so `nbinteract serve` starts a process that caches one exporter
+per configuration and converts notebooks on request.
+
+The server speaks newline-delimited JSON, either over a Unix socket or over
+stdin/stdout (`nbinteract serve --stdio`). Each request is one JSON object on
+one line and gets one JSON object on one line in response.
+
+A conversion request looks like:
+
+    {"command": "convert", "notebooks": ["a.ipynb"], "cwd": "/path",
+     "exporter": {"spec": ..., "template_file": ..., "button_at_top": ...,
+                  "execute": ..., "extract_images": ...},
+     "execution": null, "output_folder": null, "images_folder": null,
+     "fast_read": false}
+
+where "execution" holds the kernel pool and cache options used with
+--execute.
+
+and its response looks like:
+
+    {"ok": true, "warm": true, "seconds": 0.12,
+     "results": [{"notebook": "a.ipynb", "output_file": "a.html",
+                  "images": [], "sizes": null, "error": null}]}
+
+where "sizes" holds the page sizes reported with --optimize.
+
+The server converts the notebooks of a request one at a time in its own
+process, so the CLI's --jobs option doesn't apply to conversions it handles.
+
+`{"command": "status"}` returns the number of cached exporters, the warm
+and cold conversion latencies, and the kernel pool stats.
+"""
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+from . import cli
+from .kernels import merge_stats, summarize_stats
+
+SOCKET_ENV_VAR = 'NBINTERACT_SOCKET'
+
+
+def default_socket_path():
+    """
+    Returns the socket path set in the NBINTERACT_SOCKET environment variable
+    or a per-user socket in the temp folder.
+    """
+    if os.environ.get(SOCKET_ENV_VAR):
+        return os.environ[SOCKET_ENV_VAR]
+    return os.path.join(
+        tempfile.gettempdir(), 'nbinteract-{}.sock'.format(os.getuid())
+    )
+
+
+class ConversionServer(object):
+    """
+    Handles conversion requests, caching one exporter for each exporter
+    config, eg. each combination of (spec, template, button_at_top, execute).
+
+    A request is cold if it had to create its exporter and warm if it reused
+    a cached one. Latencies for each are tracked separately.
+    """
+
+    def __init__(self):
+        self.exporters = {}
+        self.kernel_pools = []
+        self.latencies = {
+            'cold': {'count': 0, 'seconds': 0.0},
+            'warm': {'count': 0, 'seconds': 0.0},
+        }
+
+    def handle_line(self, line) -> str:
+        """
+        Handles one line of NDJSON and returns the JSON response without a
+        trailing newline.
+        """
+        try:
+            request = json.loads(line)
+            response = self.handle(request)
+        except Exception:
+            response = {'ok': False, 'error': traceback.format_exc()}
+        return json.dumps(response)
+
+    def handle(self, request: dict) -> dict:
+        command = request.get('command', 'convert')
+        if command == 'convert':
+            return self.convert(request)
+        if command == 'status':
+            return self.status()
+        return {'ok': False, 'error': 'Unknown command: {}'.format(command)}
+
+    def convert(self, request: dict) -> dict:
+        start = time.perf_counter()
+
+        # Relative paths in the request (including the images folder, which
+        # is used in the generated HTML) are relative to the client's cwd
+        original_cwd = os.getcwd()
+        os.chdir(request.get('cwd', original_cwd))
+        try:
+            exporter, warm = self.exporter_for(
+                request['exporter'], request.get('execution')
+            )
+            results = [
+                self._convert_one(
+                    notebook,
+                    exporter,
+                    output_folder=request.get('output_folder'),
+                    images_folder=request.get('images_folder'),
+                    fast_read=request.get('fast_read', False),
+                ) for notebook in request['notebooks']
+            ]
+        finally:
+            os.chdir(original_cwd)
+
+        seconds = time.perf_counter() - start
+        latency = self.latencies['warm' if warm else 'cold']
+        latency['count'] += 1
+        latency['seconds'] += seconds
+
+        cli.log(
+            'Converted {} notebooks in {:.2f}s ({})'.format(
+                len(results), seconds, 'warm' if warm else 'cold'
+            )
+        )
+        return {
+            'ok': True,
+            'warm': warm,
+            'seconds': seconds,
+            'results': results,
+        }
+
+    def status(self) -> dict:
+        return {
+            'ok': True,
+            'exporters': len(self.exporters),
+            'latencies': {
+                kind: dict(
+                    latency,
+                    mean_seconds=(
+                        latency['seconds'] / latency['count']
+                        if latency['count'] else None
+                    ),
+                )
+                for kind, latency in self.latencies.items()
+            },
+            'kernel_pool': merge_stats(
+                pool.stats for pool in self.kernel_pools
+            ),
+        }
+
+    def shutdown(self):
+        """
+        Shuts down the kernels kept by each exporter's kernel pool.
+        """
+        for kernel_pool in self.kernel_pools:
+            kernel_pool.shutdown()
+
+    def exporter_for(self, exporter_config: dict, execution_options=None):
+        """
+        Returns a tuple of (exporter, warm) where warm is True if the exporter
+        was already cached. Each exporter that executes notebooks gets its own
+        kernel pool.
+        """
+        # The images folder is passed in with each request; the exporter only
+        # needs to know whether to extract images.
+        key = json.dumps(
+            dict(
+                exporter_config,
+                extract_images=bool(exporter_config.get('extract_images')),
+                execution=execution_options,
+                # Executed notebooks are cached in the project's folder
+                cwd=os.getcwd() if execution_options else None,
+            ),
+            sort_keys=True,
+        )
+        warm = key in self.exporters
+        if not warm:
+            execution = cli.init_execution(
+                execution_options if exporter_config.get('execute') else None
+            )
+            if execution.get('kernel_pool'):
+                self.kernel_pools.append(execution['kernel_pool'])
+            self.exporters[key] = cli.init_exporter(
+                **execution, **exporter_config
+            )
+        return self.exporters[key], warm
+
+    def _convert_one(self, notebook, exporter, **convert_kwargs):
+        try:
+            output_file, images, sizes = cli.convert_notebook(
+                notebook, exporter, **convert_kwargs
+            )
+            return {
+                'notebook': notebook,
+                'output_file': output_file,
+                'images': images,
+                'sizes': sizes,
+                'error': None,
+            }
+        except Exception:
+            return {
+                'notebook': notebook,
+                'output_file': None,
+                'images': [],
+                'sizes': None,
+                'error': traceback.format_exc(),
+            }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.conversion_server.handle_line(line)
+            self.wfile.write(response.encode('utf-8') + b'\n')
+
+
+def make_socket_server(socket_path, conversion_server=None):
+    """
+    Returns a socketserver that handles requests on socket_path. Call
+    serve_forever() on the result to start handling requests.
+
+    Requests are handled one at a time since exporters aren't thread-safe.
+    """
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            raise ValueError(
+                'A conversion server is already listening on {}.'
+                .format(socket_path)
+            )
+        # Left over from a server that didn't shut down cleanly
+        os.remove(socket_path)
+
+    # Only the current user may send conversion requests. The socket is
+    # created by bind() with the umask's permissions, so setting them
+    # afterwards would leave a window where other users could connect.
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.conversion_server = conversion_server or ConversionServer()
+    return server
+
+
+def serve(socket_path=None):
+    """
+    Serves conversion requests on a Unix socket until interrupted.
+    """
+    socket_path = socket_path or default_socket_path()
+    server = make_socket_server(socket_path)
+    cli.log('Conversion server listening on {}'.format(socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        server.conversion_server.shutdown()
+        _log_status(server.conversion_server)
+
+
+def serve_stdio(stdin=None, stdout=None):
+    """
+    Serves conversion requests read from stdin, writing responses to stdout.
+    Everything else the server prints goes to stderr so stdout only contains
+    responses.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    conversion_server = ConversionServer()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        for line in stdin:
+            if not line.strip():
+                continue
+            stdout.write(conversion_server.handle_line(line) + '\n')
+            stdout.flush()
+        conversion_server.shutdown()
+        _log_status(conversion_server)
+
+
+def convert(
+    notebooks,
+    exporter_config,
+    socket_path=None,
+    output_folder=None,
+    images_folder=None,
+    execution_options=None,
+    fast_read=False,
+):
+    """
+    Sends a conversion request to a running conversion server.
+
+    Returns the server's response, or None if no server is running or the
+    server couldn't handle the request. Callers should convert the notebooks
+    themselves in that case.
+    """
+    response = request({
+        'command': 'convert',
+        'notebooks': notebooks,
+        'exporter': exporter_config,
+        'execution': execution_options,
+        'output_folder': output_folder,
+        'images_folder': images_folder,
+        'fast_read': fast_read,
+        'cwd': os.getcwd(),
+    }, socket_path=socket_path)
+
+    if response is not None and not response['ok']:
+        logging.warning(
+            'Conversion server failed to handle the request:\n{}'
+            .format(response['error'])
+        )
+        return None
+    return response
+
+
+def request(payload: dict, socket_path=None):
+    """
+    Sends payload to the conversion server and returns its response, or None
+    if no server is listening on socket_path.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(payload).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as f:
+                line = f.readline()
+    except OSError:
+        return None
+
+    return json.loads(line) if line else None
+
+
+def is_running(socket_path=None) -> bool:
+    """
+    Returns True if a conversion server is listening on socket_path.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+
+    socket_path = socket_path or default_socket_path()
+    return os.path.exists(socket_path) and _is_listening(socket_path)
+
+
+def _is_listening(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def _log_status(conversion_server):
+    status = conversion_server.status()
+    if conversion_server.kernel_pools:
+        cli.log(summarize_stats(status['kernel_pool']))
+    for kind, latency in status['latencies'].items():
+        if latency['count']:
+            cli.log(
+                '{} conversions: {} requests, {:.3f}s mean latency'.format(
+                    kind.capitalize(), latency['count'],
+                    latency['mean_seconds']
+                )
+            )
@@ -7,15 +7,19 @@ This file is blatently copied from the nbconvert's full.tpl since there's no
 easy hook into the spot just before the body closes.
 #}
 
-{% block body %}
+{% block body_header %}
 <body>
   <div tabindex="-1" id="notebook" class="border-box-sizing">
     <div class="container">
       {{ super() }}
+{%- endblock body_header %}
+
+{% block body_footer %}
+      {{ super() }}
     </div>
   </div>
 </body>
-{%- endblock body %}
+{%- endblock body_footer %}
 
 {%- block header -%}
 <!DOCTYPE html>
@@ -27,11 +31,16 @@ easy hook into the spot just before the body closes.
 {% set nb_title = nb.metadata.get('title', '') or resources['metadata']['name'] %}
 <title>{{nb_title}}</title>
 
+{#- SharedAssetsPreprocessor moves the shared CSS into a separate file -#}
+{% if resources.assets %}
+<link rel="stylesheet" href="{{ resources.assets.css }}">
+{% else %}
 {% for css in resources.inlining.css -%}
     <style type="text/css">
     {{ css }}
     </style>
 {% endfor %}
+{% endif %}
 
 <style type="text/css">
 /* Overrides of notebook CSS for static HTML export */
@@ -70,7 +79,9 @@ div#notebook-container{
 <!-- Loading mathjax macro -->
 {{ mathjax() }}
 
+{% if not resources.assets %}
 {{ nbinteract_css() }}
+{% endif %}
 {%- endblock html_head -%}
 </head>
 {%- endblock header -%}
@@ -2,11 +2,26 @@
 Like the full.tpl template but loads a local copy of the nbinteract library
 instead of using unpkg.com. Used for development purposes only alongside the
 webpack-dev-server.
+
+With shared assets, loads the copy of the built bundle in the assets folder
+instead of the webpack-dev-server's.
 #}
 
 {%- extends 'full.tpl' -%}
 
 {% block nbinteract_script %}
+{% if resources.assets %}
+<!-- Loads nbinteract package -->
+<script src="{{ resources.assets.js or 'http://localhost:8080/index.bundle.js' }}" defer></script>
+<script>
+  document.addEventListener('DOMContentLoaded', function() {
+    var interact = new NbInteract({
+      nbUrl: 'http://localhost:8889/',
+    })
+    interact.prepare()
+  })
+</script>
+{% else %}
 <!-- Loads nbinteract package -->
 <script src="http://localhost:8080/index.bundle.js"></script>
 <script>
@@ -15,4 +30,5 @@ webpack-dev-server.
   })
   interact.prepare()
 </script>
+{% endif %}
 {%- endblock nbinteract_script %}
@@ -5,10 +5,30 @@ template but also loads the nbinteract library.
 
 {%- extends 'plain.tpl' -%}
 
-{% block body %}
+{% block body_footer %}
 {{ super() }}
 
 {% block nbinteract_script %}
+{% if resources.assets %}
+{#-
+Deferred scripts run in order before DOMContentLoaded, so NbInteract is
+always loaded by the time the listener runs.
+#}
+<!-- Loads nbinteract package -->
+<script src="{{ resources.assets.js or 'https://unpkg.com/nbinteract-core' }}" defer></script>
+<script>
+  document.addEventListener('DOMContentLoaded', function() {
+    var interact = new window.NbInteract({
+      spec: '{{ spec }}',
+      baseUrl: '{{ base_url }}',
+      provider: '{{ provider }}',
+    })
+    interact.prepare()
+
+    window.interact = interact
+  })
+</script>
+{% else %}
 <!-- Loads nbinteract package -->
 <script src="https://unpkg.com/nbinteract-core" async></script>
 <script>
@@ -29,6 +49,7 @@ template but also loads the nbinteract library.
     window.interact = interact
   })()
 </script>
+{% endif %}
 {%- endblock nbinteract_script %}
 
-{%- endblock body %}
+{%- endblock body_footer %}
@@ -34,8 +34,14 @@ The HIDDEN marker is for backwards-compatibility; nbi:hide_in is preferred now
 ] %}
 {% set nbinteract_default_cell_cls = 'nbinteract-row' %}
 
-{# Add button at top to run all widgets #}
-{% block body %}
+{#
+Add button at top to run all widgets.
+
+We add to body_header and body_footer instead of wrapping super() in the body
+block since Jinja renders super() into a single string. Keeping the cell loop
+out of super() lets InteractExporter.stream_notebook_node() stream the page.
+#}
+{% block body_header %}
 
 {% if button_at_top %}
   <div class="cell text_cell">
@@ -45,15 +51,34 @@ The HIDDEN marker is for backwards-compatibility; nbi:hide_in is preferred now
   </div>
 {% endif %}
 
-{{ super() }}
-{% endblock body %}
+{#
+Manifest of the cells that widgets need from MinimalCellsPreprocessor. Keep
+class in sync with util.js.
+#}
+{% if resources.minimal_cells %}
+  <script type="application/json" class="js-nbinteract-minimal-cells">{{ resources.minimal_cells | tojson }}</script>
+{% endif %}
 
-{# Add loading button to widget output #}
+{% endblock body_header %}
+
+{#
+Add loading button to widget output, or the widget state snapshot that
+WidgetSnapshotPreprocessor embedded. Keep the snapshot class in sync with
+util.js.
+#}
 {%- block data_widget_view scoped %}
+  {%- set snapshot = output.metadata.get('nbinteract', {}).get('widget_state') %}
   <div class="output_subarea output_widget_view {{ extra_class }}">
+  {%- if snapshot %}
+    <div class="js-nbinteract-snapshot">
+      <script type="application/vnd.jupyter.widget-state+json">{{ snapshot | tojson }}</script>
+      <script type="application/vnd.jupyter.widget-view+json">{{ output.data['application/vnd.jupyter.widget-view+json'] | tojson }}</script>
+    </div>
+  {%- else %}
     <button class="{{ nbinteract_class }}">
       {{ nbinteract_button_text }}
     </button>
+  {%- endif %}
   </div>
 {%- endblock data_widget_view -%}
 
@@ -189,6 +214,11 @@ unknown type  {{ cell.type }}
 
 {% block data_png scoped %}
 <div class="output_png output_subarea {{ extra_class }}">
+{%- set webp=output.metadata.get('filenames', {}).get('image/webp') %}
+{%- if webp %}
+<picture>
+<source type="image/webp" srcset="{{ webp | posix_path }}">
+{%- endif %}
 {%- if 'image/png' in output.metadata.get('filenames', {}) %}
 <img src="{{ output.metadata.filenames['image/png'] | posix_path }}"
 {%- else %}
@@ -206,6 +236,9 @@ height={{ height }}
 class="unconfined"
 {%- endif %}
 >
+{%- if webp %}
+</picture>
+{%- endif %}
 </div>
 {%- endblock data_png %}
 
@@ -0,0 +1,162 @@
+"""
+Timing instrumentation for the conversion pipeline.
+
+Tracing is off by default and span() does nothing until enable() is called.
+Spans are recorded as Chrome trace events, so `nbinteract --trace FILE`
+writes a file that can be opened in Perfetto (https://ui.perfetto.dev) or
+chrome://tracing.
+
+Spans use these categories:
+
+    notebook      Converting one notebook
+    stage         One stage of a conversion, eg. reading or rendering
+    preprocessor  Running one nbconvert preprocessor
+    cell          Executing one code cell
+    highlight     Highlighting one code cell with Pygments
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Events recorded in this process, or None if tracing is disabled
+_events = None
+
+
+def enable():
+    """
+    Starts recording spans in this process.
+    """
+    global _events
+    if _events is None:
+        _events = [{
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': os.getpid(),
+            'args': {'name': 'nbinteract {}'.format(os.getpid())},
+        }]
+
+
+def disable():
+    """
+    Stops recording spans and discards the recorded events.
+    """
+    global _events
+    _events = None
+
+
+def is_enabled() -> bool:
+    return _events is not None
+
+
+def events() -> list:
+    """
+    Returns the events recorded so far.
+    """
+    return list(_events or [])
+
+
+def add_events(new_events):
+    """
+    Adds events recorded in another process, eg. a worker process.
+    """
+    if _events is not None:
+        _events.extend(new_events)
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    """
+    Context manager that records a span covering its body. Yields a dict of
+    the span's args so the body can add to them.
+    """
+    if _events is None:
+        yield args
+        return
+
+    start_us = time.time_ns() // 1000
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        _events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start_us,
+            'dur': (time.perf_counter() - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+
+def traced(fn, name, category):
+    """
+    Wraps fn so that each call is recorded as a span.
+    """
+    def traced_fn(*args, **kwargs):
+        with span(name, category):
+            return fn(*args, **kwargs)
+    return traced_fn
+
+
+def save(path, trace_events=None):
+    """
+    Writes trace_events (defaults to the recorded events) to path in the
+    Chrome trace event format.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'traceEvents': events() if trace_events is None else trace_events,
+            'displayTimeUnit': 'ms',
+        }, f)
+
+
+def timings_table(trace_events, limit=10) -> list:
+    """
+    Returns the lines of a table of the slowest notebooks, the slowest cells,
+    and the total time spent in each stage.
+    """
+    spans = [event for event in trace_events if event['ph'] == 'X']
+
+    def by_category(category):
+        return sorted(
+            (event for event in spans if event['cat'] == category),
+            key=lambda event: event['dur'],
+            reverse=True,
+        )[:limit]
+
+    lines = ['Slowest notebooks:', '  seconds  notebook']
+    lines.extend(
+        '  {:7.2f}  {}'.format(event['dur'] / 1e6, _shorten(event['name']))
+        for event in by_category('notebook')
+    )
+
+    lines += ['Slowest cells:', '  seconds  cell  notebook']
+    lines.extend(
+        '  {:7.2f}  {:4}  {}'.format(
+            event['dur'] / 1e6, event['args']['index'],
+            _shorten(event['args']['notebook'], 52)
+        ) for event in by_category('cell')
+    )
+
+    totals = {}
+    for event in spans:
+        if event['cat'] in ('stage', 'preprocessor', 'highlight'):
+            totals[event['name']] = (
+                totals.get(event['name'], 0) + event['dur'] / 1e6
+            )
+    lines += ['Time by stage:', '  seconds  stage']
+    lines.extend(
+        '  {:7.2f}  {}'.format(seconds, name)
+        for name, seconds in sorted(
+            totals.items(), key=lambda item: item[1], reverse=True
+        )[:limit]
+    )
+    return lines
+
+
+def _shorten(text, width=58):
+    return text if len(text) <= width else '...' + text[-(width - 3):]
@@ -8,6 +8,12 @@ import toolz as tz
 # Parameter type for *args and **kwargs
 VAR_ARGS = {inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD}
 
+# Parameter types that can be passed positionally
+POSITIONAL_ARGS = {
+    inspect.Parameter.POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+}
+
 
 def maybe_call(maybe_fn, kwargs: dict, prefix: str = None) -> 'Any':
     """
@@ -43,6 +49,81 @@ def maybe_curry(maybe_fn, first_arg) -> 'Function | Any':
     return tz.curry(maybe_fn)(first_arg)
 
 
+def bind_args(
+    maybe_fn, arg_names, prefix: str = None, skip_first: bool = False
+) -> 'Function':
+    """
+    Returns a function that takes a dict of kwargs whose keys are arg_names
+    and does what maybe_call(maybe_fn, kwargs, prefix) does.
+
+    Plotting functions call their user functions on every widget change with
+    the same kwarg names, so the kwargs that maybe_fn takes are worked out
+    once here instead of on every call. Raises the errors that get_fn_args()
+    would raise when the returned function is called.
+
+    If skip_first is True, maybe_fn's first argument is passed to the
+    returned function after the kwargs, like calling maybe_call() on
+    maybe_curry(maybe_fn, first_arg).
+
+    >>> def add(xs, n, offset=0): return [x * n + offset for x in xs]
+    >>> call = bind_args(add, ['y__n', 'offset', 'z'], prefix='y',
+    ...                  skip_first=True)
+    >>> call({'y__n': 2, 'offset': 1, 'z': 3}, [1, 2])
+    [3, 5]
+
+    >>> bind_args([1, 2, 3], ['x'])({'x': 10})
+    [1, 2, 3]
+
+    >>> bind_args(add, ['xs', 'offset'])
+    Traceback (most recent call last):
+    ValueError: The following args are missing for the function add: ['n'].
+    """
+    if not callable(maybe_fn):
+        return lambda kwargs, *args: maybe_fn
+
+    params = list(inspect.signature(maybe_fn).parameters.values())
+    if skip_first and params and params[0].kind in POSITIONAL_ARGS:
+        params = params[1:]
+
+    arg_names = set(arg_names)
+    picked = [param.name for param in params if param.name in arg_names]
+    prefixed = []
+    if prefix:
+        prefixed = [
+            param.name for param in params
+            if prefix + '__' + param.name in arg_names
+        ]
+
+    conflicting_args = [arg for arg in picked if arg in prefixed]
+    if conflicting_args:
+        raise ValueError(
+            'Both prefixed and unprefixed args were specified '
+            'for the following parameters: {}'.format(conflicting_args)
+        )
+
+    missing_args = [
+        param.name for param in params
+        if param.default == inspect._empty and param.kind not in VAR_ARGS
+        and param.name not in picked and param.name not in prefixed
+    ]
+    if missing_args:
+        raise ValueError(
+            'The following args are missing for the function '
+            '{}: {}.'.format(_fn_name(maybe_fn), missing_args)
+        )
+
+    # Pairs of (argument name, kwarg name)
+    plan = tuple(
+        [(arg, arg) for arg in picked] +
+        [(arg, prefix + '__' + arg) for arg in prefixed]
+    )
+
+    def call(kwargs, *args):
+        return maybe_fn(*args, **{arg: kwargs[key] for arg, key in plan})
+
+    return call
+
+
 ##############################################################################
 # Functions that probably shouldn't be used outside of this file
 ##############################################################################
@@ -163,5 +244,9 @@ def pick_kwargs(kwargs: dict, required_args: list, prefix: str = None):
     return tz.merge(picked, prefixed)
 
 
+def _fn_name(fn) -> str:
+    return getattr(fn, '__name__', repr(fn))
+
+
 def _remove_prefix(string: str, prefix: str) -> str:
     return string.split(prefix, 1)[1]
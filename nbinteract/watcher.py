@@ -0,0 +1,72 @@
+"""
+Polls notebooks for changes. Used by `nbinteract watch` to reconvert
+notebooks as they're saved.
+
+We poll file modification times instead of relying on OS-specific file
+notification APIs so that watching works the same way everywhere without
+extra dependencies.
+"""
+import os
+import time
+
+
+class NotebookWatcher(object):
+    """
+    Tracks the notebooks returned by list_notebooks() and reports the ones
+    that changed since they were last reported.
+
+    A notebook is only reported once it has stopped changing for `debounce`
+    seconds. Editors often write a file several times for a single save (eg.
+    Jupyter writes a checkpoint and then the notebook), so this keeps one save
+    from triggering several rebuilds.
+
+    Args:
+        list_notebooks (() -> list str): Function that returns the paths of
+            the notebooks to watch. Called on every poll so new notebooks are
+            picked up.
+
+    Kwargs:
+        debounce (float): Seconds a notebook must go unmodified before it's
+            reported as changed.
+    """
+
+    def __init__(self, list_notebooks, debounce=0.5):
+        self.list_notebooks = list_notebooks
+        self.debounce = debounce
+
+        self._stats = self._snapshot()
+        # Maps notebook path to the time its latest change was seen
+        self._pending = {}
+
+    def poll(self, now=None) -> list:
+        """
+        Checks the watched notebooks for changes. Returns a sorted list of the
+        notebooks that changed and have settled since the last call.
+        """
+        now = time.monotonic() if now is None else now
+
+        stats = self._snapshot()
+        for notebook, stat in stats.items():
+            if self._stats.get(notebook) != stat:
+                self._pending[notebook] = now
+        self._stats = stats
+
+        ready = sorted(
+            notebook for notebook, changed_at in self._pending.items()
+            if now - changed_at >= self.debounce
+        )
+        for notebook in ready:
+            del self._pending[notebook]
+
+        # Notebooks deleted while pending don't need to be rebuilt
+        return [notebook for notebook in ready if notebook in stats]
+
+    def _snapshot(self):
+        stats = {}
+        for notebook in self.list_notebooks():
+            try:
+                stat = os.stat(notebook)
+            except OSError:
+                continue
+            stats[notebook] = (stat.st_mtime_ns, stat.st_size)
+        return stats
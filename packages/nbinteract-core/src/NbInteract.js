@@ -3,6 +3,7 @@ import debounce from 'lodash.debounce'
 import { Kernel, ServerConnection } from '@jupyterlab/services'
 
 import { WidgetManager } from './manager'
+import { connectPrecomputed } from './precomputed'
 import * as util from './util.js'
 import BinderHub from './BinderHub'
 
@@ -62,6 +63,8 @@ export default class NbInteract {
    * status text of elements as server is started until widget is rendered.
    * When widgets are rendered, removes all status elements.
    *
+   * Renders widget state snapshots embedded in the page without a kernel.
+   *
    * If a running kernel is cached in localStorage, creates widgets without
    * needing button click.
    */
@@ -82,9 +85,51 @@ export default class NbInteract {
       })
     })
 
+    await this.renderSnapshots()
+
     this.runIfKernelExists()
   }
 
+  /**
+   * Renders the widget state snapshots embedded in the page with a widget
+   * manager that has no kernel. Interacting with a snapshot calls run(),
+   * which replaces the snapshots with live widgets once the kernel starts.
+   * Snapshots whose plots were precomputed at build time update without a
+   * kernel instead.
+   */
+  async renderSnapshots() {
+    const snapshots = util.snapshots()
+    if (snapshots.length === 0) {
+      return
+    }
+
+    let started = false
+    const startKernel = () => {
+      if (!started && !this.manager) {
+        started = true
+        this.run()
+      }
+    }
+
+    const manager = new WidgetManager(null)
+    // Rendered in page order since later snapshots can refer to models that
+    // earlier snapshots embedded
+    for (const snapshot of snapshots) {
+      try {
+        const modelIds = await manager.renderSnapshot(snapshot)
+        if (await connectPrecomputed(manager, modelIds)) {
+          continue
+        }
+      } catch (err) {
+        console.error('Error rendering widget snapshot:', err)
+        continue
+      }
+      for (const type of ['mousedown', 'keydown', 'touchstart']) {
+        snapshot.addEventListener(type, startKernel)
+      }
+    }
+  }
+
   /**
    * Starts kernel if needed, runs code on page, and initializes widgets.
    */
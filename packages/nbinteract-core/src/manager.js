@@ -43,7 +43,12 @@ export class WidgetManager extends HTMLManager {
 
   generateWidgets() {
     const codeCells = util.codeCells()
+    // Skip cells that no widget needs when the page lists the cells to run
+    const needed = util.minimalCells()
     codeCells.forEach((cell, i) => {
+      if (needed !== null && !needed.has(i)) {
+        return
+      }
       const code = util.cellToCode(cell)
       const execution = this.kernel.requestExecute({ code })
       execution.onIOPub = msg => this._displayWidget(cell, msg)
@@ -76,8 +81,10 @@ export class WidgetManager extends HTMLManager {
     // If we have a display message, display the widget.
     const model = await util.msgToModel(msg, this)
     if (model) {
-      // Remove all widget buttons
+      // Remove all widget buttons and replace the cell's snapshots with the
+      // live widget
       util.removeButtons()
+      util.removeSnapshots(cell)
 
       // Display widget
       const outputEl = util.cellToWidgetOutput(cell)
@@ -85,6 +92,19 @@ export class WidgetManager extends HTMLManager {
     }
   }
 
+  /**
+   * Displays the widget whose state snapshot is embedded in el. Doesn't need
+   * a kernel. Returns the IDs of the models in the snapshot.
+   */
+  async renderSnapshot(el) {
+    const state = util.snapshotData(el, util.WIDGET_STATE_MSG)
+    await this.set_state(state)
+    const view = util.snapshotData(el, util.WIDGET_MSG)
+    const model = await this.get_model(view.model_id)
+    await this.display_model(undefined, model, { el })
+    return Object.keys(state.state)
+  }
+
   _registerKernel(kernel) {
     if (this._commRegistration) {
       this._commRegistration.dispose()
@@ -114,6 +134,9 @@ export class WidgetManager extends HTMLManager {
    * Create a comm.
    */
   _create_comm(target_name, model_id, data = undefined, metadata = undefined) {
+    if (!this.kernel) {
+      return Promise.reject('Widgets rendered from snapshots have no kernel')
+    }
     const comm = this.kernel.connectToComm(target_name, model_id)
     if (data || metadata) {
       comm.open(data, metadata)
@@ -125,6 +148,9 @@ export class WidgetManager extends HTMLManager {
    * Get the currently-registered comms.
    */
   _get_comm_info() {
+    if (!this.kernel) {
+      return Promise.resolve({})
+    }
     return this.kernel
       .requestCommInfo({ target: this.comm_target_name })
       .then(reply => reply.content.comms)
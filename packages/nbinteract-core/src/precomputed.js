@@ -0,0 +1,127 @@
+/**
+ * Answers widget changes with results that `nbinteract --precompute`
+ * computed at build time, so plots made by nbi.hist(), nbi.bar(), nbi.line()
+ * and nbi.scatter() update without a kernel.
+ *
+ * Keep the format in sync with nbinteract/precompute.py.
+ */
+const TRAIT_NAME = '_nbi_precomputed'
+const FORMAT_VERSION = 1
+
+// ipywidgets.interactive() adds this class to its container
+const INTERACT_CLASS = 'widget-interact'
+
+/**
+ * Decodes an array stored by precompute.encode_array()
+ */
+export const decodeArray = ({ encoding, data }) => {
+  if (encoding === 'json') {
+    return data
+  }
+
+  const binary = atob(data)
+  const bytes = new Uint8Array(binary.length)
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i)
+  }
+
+  let values
+  if (encoding === 'float64') {
+    values = new Float64Array(bytes.buffer)
+  } else {
+    // delta-int32
+    const deltas = new Int32Array(bytes.buffer)
+    values = new Float64Array(deltas.length)
+    let total = 0
+    for (let i = 0; i < deltas.length; i++) {
+      total += deltas[i]
+      values[i] = total
+    }
+  }
+  // Matches the typed arrays that bqplot deserializes
+  values.type = 'float64'
+  values.shape = [values.length]
+  return values
+}
+
+/**
+ * Connects the precomputed results stored on the models with modelIds so
+ * changing their controls updates their marks. Returns true if the widgets
+ * work without a kernel: at least one of the models has results and every
+ * interact() among them does.
+ */
+export async function connectPrecomputed(manager, modelIds) {
+  const models = await Promise.all(modelIds.map(id => manager.get_model(id)))
+
+  let connected = false
+  let needsKernel = false
+  for (const model of models) {
+    if (!model) {
+      continue
+    }
+    const table = model.get(TRAIT_NAME)
+    if (table && table.version === FORMAT_VERSION) {
+      await connectTable(manager, table)
+      connected = true
+    } else if ((model.get('_dom_classes') || []).includes(INTERACT_CLASS)) {
+      needsKernel = true
+    } else if (model.get('enable_move')) {
+      // Draggable bqplot marks like scatter_drag() compute in the kernel
+      needsKernel = true
+    }
+  }
+  return connected && !needsKernel
+}
+
+async function connectTable(manager, table) {
+  const controls = await Promise.all(
+    table.controls.map(control => manager.get_model(control.model_id)),
+  )
+  const mark = await manager.get_model(table.mark.model_id)
+
+  // Arrays are decoded the first time they're shown
+  const decoded = new Map()
+  const getArray = index => {
+    if (!decoded.has(index)) {
+      decoded.set(index, decodeArray(table.arrays[index]))
+    }
+    return decoded.get(index)
+  }
+
+  const update = () => {
+    let row = 0
+    for (let i = 0; i < controls.length; i++) {
+      const { trait, values } = table.controls[i]
+      const position = findValue(values, controls[i].get(trait))
+      if (position === -1) {
+        return
+      }
+      row = row * values.length + position
+    }
+
+    const changes = {}
+    table.mark.traits.forEach((trait, i) => {
+      changes[trait] = getArray(table.rows[row][i])
+    })
+    mark.set(changes)
+  }
+
+  controls.forEach((control, i) => {
+    control.on(`change:${table.controls[i].trait}`, update)
+  })
+}
+
+/**
+ * Returns the position of value in values. Float slider values are
+ * computed slightly differently in the browser, so numbers only need to be
+ * close.
+ */
+const findValue = (values, value) =>
+  values.findIndex(
+    candidate =>
+      candidate === value ||
+      (typeof candidate === 'number' &&
+        typeof value === 'number' &&
+        Math.abs(candidate - value) <=
+          1e-9 * Math.max(1, Math.abs(candidate))),
+  )
@@ -36,6 +36,19 @@ export const isWidgetCell = cell =>
 export const cellToWidgetOutput = cell =>
   cell.querySelector('.output_widget_view')
 
+/**
+ * Returns the indices of the code cells that the page's widgets need, or null
+ * if the page should run every code cell.
+ * Keep CSS class in sync with nbinteract/templates/plain.tpl
+ */
+export const minimalCells = () => {
+  const manifest = document.querySelector('.js-nbinteract-minimal-cells')
+  if (manifest === null) {
+    return null
+  }
+  return new Set(JSON.parse(manifest.textContent).cells)
+}
+
 /**
  * Functions to work with nbinteract status buttons
  * Keep CSS class in sync with nbinteract/templates/*.tpl
@@ -66,6 +79,22 @@ export const removeButtons = (cell = document) => {
   statusButtons(cell).forEach(button => button.remove())
 }
 
+/**
+ * Functions to work with widget state snapshots
+ * Keep CSS class in sync with nbinteract/templates/plain.tpl
+ */
+export const WIDGET_STATE_MSG = 'application/vnd.jupyter.widget-state+json'
+
+export const snapshots = (cell = document) =>
+  cell.querySelectorAll('.js-nbinteract-snapshot')
+
+export const snapshotData = (snapshot, type) =>
+  JSON.parse(snapshot.querySelector(`script[type="${type}"]`).textContent)
+
+export const removeSnapshots = (cell = document) => {
+  snapshots(cell).forEach(snapshot => snapshot.remove())
+}
+
 /**
  * Functions to work with kernel messages
  */
@@ -67,11 +67,14 @@ setup(
     ],
     keywords='jupyter nbconvert interact',
     packages=['nbinteract'],
-    package_data={'nbinteract': ['templates/*.tpl']},
+    package_data={'nbinteract': ['templates/*.tpl', 'templates/*.css']},
     install_requires=install_requires,
     extras_require={
         'dev': ['check-manifest'],
         'test': ['pytest', 'coverage', 'coveralls'],
+        'fast': ['orjson'],
+        'optimize': ['brotli'],
+        'images': ['Pillow'],
     },
     cmdclass={'test': PyTest},
 
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from nbinteract.background import LatestRunner
+
+
+class BlockingCompute(object):
+    """
+    Compute function that records its kwargs and waits for unblock() before
+    returning, except for the first call.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, n):
+        self.calls.append(n)
+        if len(self.calls) > 1:
+            self.started.set()
+            self.gate.wait(5)
+        return n
+
+    def unblock(self):
+        self.gate.set()
+
+
+def test_first_submit_computes_right_away():
+    results = []
+    runner = LatestRunner(lambda n: n * 2, results.append)
+    runner.submit(n=1)
+    assert results == [2]
+    runner.close()
+
+
+def test_stale_kwargs_are_dropped():
+    compute = BlockingCompute()
+    results = []
+    runner = LatestRunner(compute, results.append)
+    runner.submit(n=0)
+    runner.submit(n=1)
+    assert compute.started.wait(5)
+
+    # These arrive while n=1 is computing, so only the newest is computed
+    for n in range(2, 10):
+        runner.submit(n=n)
+    assert runner.stats['queue_depth'] == 8
+    compute.unblock()
+    assert runner.join(5)
+
+    assert compute.calls == [0, 1, 9]
+    assert results == [0, 1, 9]
+    assert runner.stats['dropped'] == 7
+    assert runner.stats['computed'] == 3
+    assert runner.stats['submitted'] == 10
+    assert runner.stats['queue_depth'] == 0
+    assert runner.stats['max_queue_depth'] == 8
+    runner.close()
+
+
+def test_out_of_order_results_are_discarded():
+    results = []
+    runner = LatestRunner(lambda n: n, results.append)
+    runner.submit(n=0)
+    runner._run(3, {'n': 3})
+    runner._run(2, {'n': 2})
+    assert results == [0, 3]
+    assert runner.stats['discarded'] == 1
+    runner.close()
+
+
+def test_errors_are_counted():
+    def compute(n):
+        if n == 1:
+            raise ValueError(n)
+        return n
+
+    results = []
+    runner = LatestRunner(compute, results.append)
+    runner.submit(n=0)
+    runner.submit(n=1)
+    assert runner.join(5)
+    runner.submit(n=2)
+    assert runner.join(5)
+    assert results == [0, 2]
+    assert runner.stats['errors'] == 1
+    runner.close()
+
+
+def test_debounce_waits_for_changes_to_stop():
+    results = []
+    runner = LatestRunner(lambda n: n, results.append, debounce=0.2)
+    runner.submit(n=0)
+    for n in range(1, 5):
+        runner.submit(n=n)
+        time.sleep(0.02)
+    assert results == [0]
+    assert runner.join(5)
+    assert results == [0, 4]
+    runner.close()
+
+
+def test_throttle_spaces_out_computations():
+    starts = []
+
+    def compute(n):
+        starts.append(time.monotonic())
+        return n
+
+    runner = LatestRunner(compute, lambda result: None, throttle=0.2)
+    runner.submit(n=0)
+    runner.submit(n=1)
+    assert runner.join(5)
+    assert starts[1] - starts[0] >= 0.2
+    runner.close()
@@ -1,9 +1,17 @@
+import gzip
+import json
 import pytest
 import os
 import nbinteract.cli as cli
 import toolz as tz
 import re
+import shutil
 from contextlib import contextmanager
+from docopt import docopt
+import nbformat
+from nbinteract.preprocessors import (
+    WIDGET_STATE_MIMETYPE, WIDGET_VIEW_MIMETYPE
+)
 from os.path import basename, join
 from glob import glob
 
@@ -44,14 +52,42 @@ def args(new_args):
     return tz.merge({
         '--help': False,
         '--images': None,
+        '--hash-images': False,
+        '--optimize-images': False,
+        '--max-image-width': None,
+        '--webp': False,
         '--no-top-button': False,
         '--output': None,
         '--recursive': None,
+        '--include': None,
+        '--exclude': None,
+        '--use-ignore-files': False,
+        '--fast-read': False,
+        '--optimize': False,
+        '--shared-assets': False,
+        '--no-truncate': False,
+        '--sidecar-outputs': False,
+        '--widget-snapshots': False,
+        '--minimal-cells': False,
+        '--precompute': False,
+        '--precompute-budget': '1000',
         '--spec': TEST_SPEC,
         '--template': 'full',
         '--execute': False,
+        '--kernels': '0',
+        '--preimport': 'numpy,ipywidgets,bqplot,nbinteract',
+        '--kernel-reuse': '10',
+        '--no-exec-cache': False,
+        '--trace': None,
+        '--timings': False,
+        '--jobs': None,
+        '--force': False,
         'NOTEBOOKS': [],
-        'init': False
+        'init': False,
+        'serve': False,
+        'watch': False,
+        '--socket': None,
+        '--stdio': False,
     }, new_args)
 
 
@@ -98,6 +134,15 @@ def convert_many(notebooks, cli_args={}):
         os.remove(html_file)
 
 
+@pytest.fixture(autouse=True)
+def in_tmpdir(tmpdir_factory, monkeypatch):
+    """
+    Runs each test in a temporary folder so the build manifest and caches
+    that the CLI writes into the current folder don't end up in the repo.
+    """
+    monkeypatch.chdir(tmpdir_factory.mktemp('cwd'))
+
+
 class TestCli(object):
     """Tests for cli.py."""
 
@@ -211,6 +256,172 @@ class TestCli(object):
                           }):
             assert len(glob('{}/*.png'.format(tmpdir))) == 2
 
+    def test_fast_read(self):
+        """
+        Tests that --fast-read generates the same HTML.
+        """
+        notebook = TEST_NOTEBOOKS['interact']
+        with convert_one(notebook, {'--force': True}) as f:
+            html = f.read()
+        with convert_one(
+            notebook, {'--force': True, '--fast-read': True}
+        ) as f:
+            assert f.read() == html
+
+    def test_optimize(self, tmpdir):
+        """
+        Tests that --optimize writes a smaller page with a gzipped copy and
+        that converting without it removes the copy.
+        """
+        notebook = TEST_NOTEBOOKS['interact']
+        output = {'--force': True, '--output': str(tmpdir)}
+        with convert_one(notebook, dict(output)) as f:
+            html = f.read()
+        with convert_one(notebook, dict(output, **{'--optimize': True})) as f:
+            optimized = f.read()
+            gzipped = f.name + '.gz'
+            with open(gzipped, 'rb') as g:
+                assert gzip.decompress(g.read()).decode('utf-8') == optimized
+        assert len(optimized) < len(html)
+
+        with convert_one(notebook, dict(output)):
+            assert not os.path.exists(gzipped)
+
+    def test_widget_snapshots(self, tmpdir):
+        """
+        Tests that --widget-snapshots embeds saved widget state in place of
+        the widget's button.
+        """
+        nb = nbformat.read(TEST_NOTEBOOKS['interact'], as_version=4)
+        [output] = [
+            output for cell in nb.cells for output in cell.get('outputs', [])
+        ]
+        model_id = output.data[WIDGET_VIEW_MIMETYPE]['model_id']
+        nb.metadata['widgets'] = {
+            WIDGET_STATE_MIMETYPE: {
+                'state': {
+                    model_id: {
+                        'model_name': 'LabelModel',
+                        'model_module': '@jupyter-widgets/controls',
+                        'model_module_version': '1.2.0',
+                        'state': {'value': '</script>'},
+                    },
+                },
+                'version_major': 2,
+                'version_minor': 0,
+            }
+        }
+        notebook = str(tmpdir.join('snapshot.ipynb'))
+        nbformat.write(nb, notebook)
+
+        with convert_one(notebook, {'--widget-snapshots': True}) as f:
+            html = f.read()
+        assert 'js-nbinteract-snapshot' in html
+        assert '<script type="{}">'.format(WIDGET_STATE_MIMETYPE) in html
+        assert model_id in html
+        assert html.count('</script>') == html.count('<script')
+        # Only the button at the top of the page is left
+        assert len(WIDGET_BUTTON_RE.findall(html)) == 1
+
+    def test_minimal_cells(self):
+        """
+        Tests that --minimal-cells lists the cells that widgets need in the
+        page.
+        """
+        with convert_one(
+            TEST_NOTEBOOKS['interact'], {'--minimal-cells': True}
+        ) as f:
+            html = f.read()
+        [manifest] = re.findall(
+            r'<script type="application/json" '
+            r'class="js-nbinteract-minimal-cells">(.*?)</script>', html
+        )
+        # The empty cell after the widget cell is skipped
+        assert json.loads(manifest) == {
+            'version': 1,
+            'cells': [0],
+            'widgets': {'0': [0]},
+        }
+
+        with convert_one(TEST_NOTEBOOKS['interact']) as f:
+            assert 'js-nbinteract-minimal-cells' not in f.read()
+
+    def test_shared_assets(self, tmpdir):
+        """
+        Tests that --shared-assets writes the CSS shared by pages once and
+        links each page to it.
+        """
+        with convert_many(
+            [TEST_NOTEBOOKS['empty'], TEST_NOTEBOOKS['interact']], {
+                '--force': True,
+                '--output': str(tmpdir),
+                '--shared-assets': True,
+            }
+        ) as html_files:
+            [css_file] = tmpdir.join(cli.ASSETS_FOLDER).listdir()
+            assert re.fullmatch(
+                r'nbinteract\.[0-9a-f]{20}\.css', css_file.basename
+            )
+            assert '.nbinteract-left' in css_file.read()
+
+            link = '<link rel="stylesheet" href="{}/{}">'.format(
+                cli.ASSETS_FOLDER, css_file.basename
+            )
+            for html_file in html_files:
+                with open(html_file, encoding='utf-8') as f:
+                    html = f.read()
+                assert link in html
+                assert '.nbinteract-left' not in html
+                assert '<script src="https://unpkg.com/nbinteract-core" ' \
+                    'defer></script>' in html
+
+    def test_hash_images(self, tmpdir):
+        """
+        Tests that --hash-images names images by their contents so the same
+        image in two notebooks is only written once.
+        """
+        images = tmpdir.mkdir('images')
+        copy = str(tmpdir.join('copy.ipynb'))
+        shutil.copy(TEST_NOTEBOOKS['images'], copy)
+
+        with convert_many([TEST_NOTEBOOKS['images'], copy], {
+            '--output': str(tmpdir),
+            '--images': str(images),
+            '--hash-images': True,
+        }) as html_files:
+            image_files = images.listdir()
+            assert len(image_files) == 2
+            assert all(
+                re.fullmatch(r'[0-9a-f]{20}\.png', image.basename)
+                for image in image_files
+            )
+            for html_file in html_files:
+                with open(html_file, encoding='utf-8') as f:
+                    html = f.read()
+                assert all(image.basename in html for image in image_files)
+
+    def test_optimize_images(self, tmpdir):
+        """
+        Tests that --optimize-images writes extracted images that are no
+        larger than the images in the notebook.
+        """
+        plain = tmpdir.mkdir('plain')
+        optimized = tmpdir.mkdir('optimized')
+        for folder, optimize in [(plain, False), (optimized, True)]:
+            with convert_one(TEST_NOTEBOOKS['images'], {
+                '--force': True,
+                '--output': str(folder),
+                '--images': str(folder),
+                '--optimize-images': optimize,
+            }):
+                pass
+
+        plain_images = sorted(glob('{}/*.png'.format(plain)))
+        optimized_images = sorted(glob('{}/*.png'.format(optimized)))
+        assert len(optimized_images) == len(plain_images) == 2
+        for before, after in zip(plain_images, optimized_images):
+            assert os.path.getsize(after) <= os.path.getsize(before)
+
     def test_folder(self):
         """
         Tests that passing in a folder converts all notebooks in the folder.
@@ -254,6 +465,147 @@ class TestCli(object):
             assert set(map(basename,
                            os.listdir(str(tmpdir)))) == expected_files
 
+    def test_jobs(self, tmpdir):
+        """
+        Tests that converting with multiple worker processes returns the output
+        files in the same order as the input notebooks.
+        """
+        notebooks = [
+            TEST_NOTEBOOKS['nbinteract'],
+            TEST_NOTEBOOKS['empty'],
+            TEST_NOTEBOOKS['interact'],
+            TEST_NOTEBOOKS['images'],
+        ]
+        with convert_many(notebooks, {
+            '--output': str(tmpdir),
+            '--jobs': '3',
+        }) as html_files:
+            assert list(map(basename, html_files)) == [
+                basename(html_name(nb)) for nb in notebooks
+            ]
+
+    def test_jobs_option(self):
+        """
+        Tests that the help text defines --jobs once, since docopt reads any
+        line that starts with - as an option.
+        """
+        arguments = docopt(cli.__doc__, argv=['notebooks', '--jobs=2'])
+        assert arguments['--jobs'] == '2'
+        assert docopt(cli.__doc__, argv=['notebooks'])['--jobs'] is None
+
+    def test_failed_notebook(self, tmpdir):
+        """
+        Tests that a notebook that fails to convert doesn't prevent the other
+        notebooks from being converted.
+        """
+        broken = tmpdir.join('broken.ipynb')
+        broken.write('not a notebook')
+
+        with pytest.raises(SystemExit):
+            cli.run_converter(
+                args({
+                    'NOTEBOOKS': [
+                        TEST_NOTEBOOKS['empty'],
+                        str(broken),
+                        TEST_NOTEBOOKS['interact'],
+                    ],
+                    '--output': str(tmpdir),
+                    '--jobs': '2',
+                })
+            )
+
+        assert {'empty.html', 'basic_interact.html'} <= set(
+            os.listdir(str(tmpdir))
+        )
+
+    def test_incremental(self, tmpdir, monkeypatch, capsys):
+        """
+        Tests that notebooks are only reconverted when they change and that
+        outputs of removed notebooks are deleted.
+        """
+        monkeypatch.chdir(tmpdir)
+        notebook = str(tmpdir.join('nb.ipynb'))
+        other = str(tmpdir.join('other.ipynb'))
+        shutil.copy(TEST_NOTEBOOKS['interact'], notebook)
+        shutil.copy(TEST_NOTEBOOKS['empty'], other)
+
+        def run(**cli_args):
+            html_files = cli.run_converter(
+                args(tz.merge({'NOTEBOOKS': [notebook, other]}, cli_args))
+            )
+            assert html_files == [html_name(notebook), html_name(other)]
+            return capsys.readouterr().out
+
+        assert 'Built 2 notebooks, skipped 0' in run()
+        assert 'Built 0 notebooks, skipped 2' in run()
+
+        # Changing a notebook, the config, or an output file reconverts
+        with open(notebook, 'a') as f:
+            f.write('\n')
+        assert 'Built 1 notebooks, skipped 1' in run()
+        assert 'Built 2 notebooks, skipped 0' in run(
+            **{'--no-top-button': True}
+        )
+        os.remove(html_name(other))
+        assert 'Built 1 notebooks, skipped 1' in run(
+            **{'--no-top-button': True}
+        )
+        assert 'Built 2 notebooks, skipped 0' in run(
+            **{'--no-top-button': True, '--force': True}
+        )
+        # --fast-read drops widget state, which changes the pages
+        assert 'Built 2 notebooks, skipped 0' in run(
+            **{'--no-top-button': True, '--fast-read': True}
+        )
+        assert 'Built 0 notebooks, skipped 2' in run(
+            **{'--no-top-button': True, '--fast-read': True}
+        )
+
+        # So does removing a precompressed copy
+        assert 'Built 2 notebooks, skipped 0' in run(**{'--optimize': True})
+        os.remove(html_name(other) + '.gz')
+        assert 'Built 1 notebooks, skipped 1' in run(**{'--optimize': True})
+
+        # Removing a notebook deletes its HTML file
+        os.remove(notebook)
+        cli.run_converter(args({'NOTEBOOKS': [other]}))
+        assert 'deleted 1 stale' in capsys.readouterr().out
+        assert not os.path.exists(html_name(notebook))
+
+    def test_option_defaults(self):
+        """
+        Tests that the help text defines the options that args() fills in,
+        since docopt reads any line that starts with - as an option.
+        """
+        arguments = docopt(cli.__doc__, argv=['notebooks'])
+        assert set(arguments) == set(args({}))
+        assert arguments['--template'] == 'full'
+        assert arguments['--kernels'] == '0'
+
+    def test_shared_assets_option(self):
+        """
+        Tests that the --shared-assets help text doesn't define other options
+        and leaves their defaults alone.
+        """
+        arguments = docopt(
+            cli.__doc__, argv=['notebooks', '--shared-assets', '-o', 'out']
+        )
+        assert arguments['--shared-assets'] is True
+        assert arguments['--output'] == 'out'
+        assert arguments['--template'] == 'full'
+
+    def test_watch_args(self):
+        """
+        Tests that the watch subcommand accepts the same options as conversion.
+        """
+        arguments = docopt(
+            cli.__doc__, argv=['watch', '-r', '-t', 'plain', 'notebooks']
+        )
+        assert arguments['watch']
+        assert arguments['--recursive']
+        assert arguments['--template'] == 'plain'
+        assert arguments['NOTEBOOKS'] == ['notebooks']
+
     @pytest.mark.slow
     def test_execute(self):
         """
@@ -263,6 +615,7 @@ class TestCli(object):
         with convert_one(
             TEST_NOTEBOOKS['cleared_interact'], {
                 '--execute': True,
+                '--no-exec-cache': True,
             }
         ) as f:
             html = ''.join(f.readlines())
@@ -272,6 +625,7 @@ class TestCli(object):
         with convert_one(
             TEST_NOTEBOOKS['cleared_nbinteract'], {
                 '--execute': True,
+                '--no-exec-cache': True,
             }
         ) as f:
             html = ''.join(f.readlines())
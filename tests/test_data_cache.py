@@ -0,0 +1,164 @@
+import numpy as np
+
+import nbinteract as nbi
+from nbinteract import data_cache
+from nbinteract.data_cache import DataCache, source_key
+
+from .util import run_doctests
+
+
+def test_doctests():
+    results = run_doctests(data_cache)
+    assert results.failed == 0
+
+
+def counting(fn):
+    def compute(**kwargs):
+        compute.calls += 1
+        return fn(**kwargs)
+
+    compute.calls = 0
+    return compute
+
+
+def test_memory_is_bounded_by_bytes():
+    cache = DataCache(max_bytes=3 * 800)
+    compute = counting(lambda n: {'y': np.full(100, n, dtype=float)})
+    cached = cache.memoize(compute, ['n'])
+
+    for n in [0, 1, 2, 0, 3]:
+        cached(n=n)
+    # 0 was used again, so 1 is the least recently used
+    assert cache.stats['evictions'] == 1
+    assert cache.stats['bytes'] == 3 * 800
+    assert compute.calls == 4
+
+    cached(n=0)
+    cached(n=1)
+    assert compute.calls == 5
+    assert cache.stats['hits'] == 2
+    assert cache.stats['misses'] == 5
+
+
+def test_results_too_big_for_memory_are_not_kept():
+    cache = DataCache(max_bytes=10)
+    cached = cache.memoize(lambda n: {'y': np.zeros(n)}, ['n'])
+    cached(n=100)
+    cached(n=100)
+    assert cache.stats['misses'] == 2
+    assert cache.stats['bytes'] == 0
+
+
+def test_unhashable_values_are_computed():
+    cache = DataCache()
+    compute = counting(lambda xs: {'y': np.array(xs)})
+    cached = cache.memoize(compute, ['xs'])
+    cached(xs=[1, 2])
+    cached(xs=[1, 2])
+    assert compute.calls == 2
+
+
+def test_disk_results_are_memory_mapped(tmp_path):
+    def squares(n):
+        return {'x': np.arange(n), 'y': np.arange(n) ** 2}
+
+    cache = DataCache(path=str(tmp_path))
+    cached = cache.memoize(squares, ['n'], ['xy', squares])
+    first = cached(n=5)
+    assert cache.stats['disk_writes'] == 1
+
+    # A new cache is like a restarted kernel
+    cache = DataCache(path=str(tmp_path))
+    compute = counting(squares)
+    cached = cache.memoize(compute, ['n'], ['xy', squares])
+    result = cached(n=5)
+    assert compute.calls == 0
+    assert cache.stats['disk_hits'] == 1
+    assert list(result) == ['x', 'y']
+    assert np.array_equal(result['y'], first['y'])
+    assert isinstance(result['y'].base, np.memmap)
+
+    cache.clear()
+    assert not tmp_path.exists()
+
+
+def test_unidentifiable_sources_stay_in_memory(tmp_path):
+    cache = DataCache(path=str(tmp_path))
+    cached = cache.memoize(
+        lambda n: {'y': np.arange(n)}, ['n'], [np.array([object()])]
+    )
+    cached(n=3)
+    assert cache.stats['disk_writes'] == 0
+    assert cache.stats['misses'] == 1
+
+
+def test_source_keys():
+    def make(offset):
+        return lambda n: n + offset
+
+    assert source_key(make(1)) == source_key(make(1))
+    assert source_key(make(1)) != source_key(make(2))
+    assert source_key(np.arange(3)) == source_key(np.arange(3))
+    assert source_key(np.arange(3)) != source_key(np.arange(3.0))
+    assert source_key(np.array([1, 'a'], dtype=object)) is None
+
+    def fact(n):
+        return 1 if n < 2 else n * fact(n - 1)
+
+    assert source_key(fact) is not None
+
+
+def test_function_keys_cover_globals():
+    def make(offset):
+        namespace = {'np': np, 'offset': offset}
+        exec('def shift(n):\n    return np.arange(n) + offset', namespace)
+        return namespace['shift']
+
+    assert source_key(make(1)) == source_key(make(1))
+    assert source_key(make(1)) != source_key(make(2))
+    assert source_key(make(object())) is None
+
+
+def test_list_results_are_sized_like_arrays():
+    cache = DataCache(max_bytes=1000)
+    cached = cache.memoize(lambda n: {'y': [0.0] * n}, ['n'])
+    cached(n=100)
+    assert cache.stats['bytes'] == 800
+    cached(n=200)
+    assert cache.stats['bytes'] == 800
+
+
+def test_plots_use_the_cache():
+    cache = DataCache()
+    calls = []
+
+    def x_values(n):
+        calls.append(n)
+        return np.arange(n)
+
+    def y_values(xs):
+        return xs * 2
+
+    box = nbi.line(x_values, y_values, options={'cache': cache}, n=(1, 9))
+    controls = box.children[0]
+    slider = controls.kwargs_widgets[0]
+    # The slider starts at 5
+    for n in [6, 7, 6, 7]:
+        slider.value = n
+    assert calls == [6, 7]
+    assert cache.stats['hits'] == 2
+
+    [mark] = box.children[1].marks
+    assert list(mark.y) == [0, 2, 4, 6, 8, 10, 12]
+
+
+def test_figure_cache_is_shared():
+    fig = nbi.Figure(options={'cache': True})
+    fig.bar(['a', 'b'], lambda xs, n: [n, n], n=(1, 3))
+    fig.hist(lambda n: np.arange(n), n=(1, 3))
+    for widget in fig.widgets:
+        widget.kwargs_widgets[0].value = 1
+        widget.kwargs_widgets[0].value = 2
+        widget.kwargs_widgets[0].value = 1
+    assert fig.cache.stats['misses'] == 4
+    assert fig.cache.stats['hits'] == 2
@@ -0,0 +1,84 @@
+import pytest
+
+from nbinteract.dependencies import cell_dependencies, minimal_cells
+
+
+def needed(sources):
+    return [sorted(cells) for cells in cell_dependencies(sources)]
+
+
+def test_unused_cells_are_skipped():
+    sources = [
+        '%matplotlib inline\nimport numpy as np\nimport nbinteract as nbi',
+        'big = np.random.rand(10**6)\nbig.mean()',
+        'data = [1, 2, 3]',
+        'def f(n):\n    return [d * n for d in data]',
+        'data.append(4)',
+        'print(len(big))',
+        "nbi.bar(['a', 'b', 'c', 'd'], f, n=(1, 10))",
+    ]
+    assert minimal_cells(sources, [6]) == {6: [0, 2, 3, 4, 6]}
+
+
+def test_rebinding_a_name_drops_earlier_definitions():
+    assert needed(['x = 1', 'x = 2', 'y = x'])[2] == [1, 2]
+    # Changing a name in place needs its earlier value
+    assert needed(['x = [1]', 'x += [2]', 'y = x'])[2] == [0, 1, 2]
+    assert needed(['x = {}', "x['a'] = 1", 'y = x'])[2] == [0, 1, 2]
+    # The loop might not run, so x keeps its earlier value
+    assert needed(['x = 1', 'for x in []: pass', 'y = x'])[2] == [0, 1, 2]
+
+
+def test_names_defined_in_the_cell_are_not_read():
+    assert needed(['x = 1', 'x = 2\ny = x'])[1] == [1]
+    assert needed(['x = 1', 'y = x\nx = 2'])[1] == [0, 1]
+
+
+def test_local_names_are_not_read():
+    sources = [
+        'x = 1\ni = 2',
+        'def f(x):\n    return [i for i in range(x)]',
+        'g = lambda x: x',
+        'class A:\n    x = 3\n    def m(self):\n        return x',
+    ]
+    assert needed(sources)[1:] == [[1], [2], [0, 3]]
+
+
+def test_calling_a_function_changes_the_names_it_uses():
+    sources = [
+        'data = []',
+        'def add(value):\n    data.append(value)',
+        'add(1)',
+        'total = len(data)',
+        'def reset():\n    global count\n    count = 0',
+        'count = 5',
+        'reset()',
+        'print(count)',
+    ]
+    assert needed(sources)[3] == [0, 1, 2, 3]
+    assert needed(sources)[7] == [4, 5, 6, 7]
+
+
+def test_functions_read_names_defined_after_them():
+    sources = [
+        'def f():\n    return data',
+        'data = 1',
+        'unused = 2',
+        'f()',
+    ]
+    assert needed(sources)[3] == [0, 1, 3]
+
+
+@pytest.mark.parametrize('opaque', [
+    '%time x = 1',
+    'from os.path import *',
+    "exec('x = 1')",
+    'globals()["x"] = 1',
+])
+def test_opaque_cells(opaque):
+    result = needed(['a = 1', 'b = 2', opaque, 'c = 3', 'print(x)'])
+    assert result[2] == [0, 1, 2]
+    # The cell could define x, so it's needed along with everything before it
+    assert result[4] == [0, 1, 2, 4]
+    # Cells that read nothing don't need it
+    assert result[3] == [3]
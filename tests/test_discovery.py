@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from nbinteract.discovery import IGNORE_FILES, PathPattern, find_notebooks
+
+
+def make_tree(root, paths):
+    for path in paths:
+        full_path = root.join(path)
+        full_path.dirpath().ensure(dir=True)
+        full_path.write('{}')
+
+
+def relative(root, notebooks):
+    return [os.path.relpath(notebook, str(root)) for notebook in notebooks]
+
+
+@pytest.fixture
+def tree(tmpdir):
+    make_tree(tmpdir, [
+        'b.ipynb',
+        'a.ipynb',
+        'notes.txt',
+        '.hidden.ipynb',
+        '.ipynb_checkpoints/a-checkpoint.ipynb',
+        'ch2/intro.ipynb',
+        'ch1/scratch_1.ipynb',
+        'ch1/intro.ipynb',
+        'ch1/deep/more.ipynb',
+    ])
+    return tmpdir
+
+
+def test_sorted_and_recursive(tree):
+    assert relative(tree, find_notebooks([str(tree)])) == [
+        'a.ipynb', 'b.ipynb'
+    ]
+    assert relative(tree, find_notebooks([str(tree)], recursive=True)) == [
+        'a.ipynb',
+        'b.ipynb',
+        'ch1/intro.ipynb',
+        'ch1/scratch_1.ipynb',
+        'ch1/deep/more.ipynb',
+        'ch2/intro.ipynb',
+    ]
+
+
+def test_include_and_exclude(tree):
+    def find(**kwargs):
+        return relative(
+            tree, find_notebooks([str(tree)], recursive=True, **kwargs)
+        )
+
+    assert find(exclude=['scratch_*', 'deep/']) == [
+        'a.ipynb', 'b.ipynb', 'ch1/intro.ipynb', 'ch2/intro.ipynb'
+    ]
+    assert find(include=['ch1']) == [
+        'ch1/intro.ipynb', 'ch1/scratch_1.ipynb', 'ch1/deep/more.ipynb'
+    ]
+    assert find(include=['/*.ipynb', 'ch*/intro.ipynb']) == [
+        'a.ipynb', 'b.ipynb', 'ch1/intro.ipynb', 'ch2/intro.ipynb'
+    ]
+    assert find(exclude=['*.ipynb', '!intro.ipynb']) == [
+        'ch1/intro.ipynb', 'ch2/intro.ipynb'
+    ]
+
+
+def test_ignore_files(tree):
+    tree.join('.gitignore').write('# Generated\n/b.ipynb\ndeep/\n')
+    tree.join('ch1', '.nbinteractignore').write('*.ipynb\n!intro.ipynb\n')
+
+    assert relative(
+        tree,
+        find_notebooks([str(tree)], recursive=True, ignore_files=IGNORE_FILES)
+    ) == ['a.ipynb', 'ch1/intro.ipynb', 'ch2/intro.ipynb']
+    assert len(list(find_notebooks([str(tree)], recursive=True))) == 6
+
+
+def test_files_passed_directly(tree):
+    notebooks = [
+        str(tree.join('ch1', 'intro.ipynb')),
+        str(tree.join('.ipynb_checkpoints', 'a-checkpoint.ipynb')),
+        str(tree.join('ch1', 'scratch_1.ipynb')),
+        str(tree.join('ch1')),
+    ]
+    assert relative(tree, find_notebooks(notebooks, exclude=['scratch*'])) == [
+        'ch1/intro.ipynb'
+    ]
+
+
+def test_missing_path(tree):
+    with pytest.raises(ValueError):
+        find_notebooks([str(tree), str(tree.join('missing.ipynb'))])
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='needs symlinks')
+def test_symlink_cycle(tree):
+    tree.join('ch1', 'loop').mksymlinkto(tree)
+    tree.join('ch2', 'ch1').mksymlinkto(tree.join('ch1'))
+
+    notebooks = relative(tree, find_notebooks([str(tree)], recursive=True))
+    assert len(notebooks) == len(set(notebooks)) == 6
+
+
+def test_pattern_syntax():
+    assert PathPattern('ch1/**/*.ipynb').matches('ch1/a/b/c.ipynb', False)
+    assert PathPattern('ch1/**/*.ipynb').matches('ch1/c.ipynb', False)
+    assert not PathPattern('ch1/*.ipynb').matches('ch1/a/c.ipynb', False)
+    assert not PathPattern('/a.ipynb').matches('ch1/a.ipynb', False)
+    assert not PathPattern('build/').matches('build', False)
+    assert PathPattern('[!a]*.ipynb').matches('b.ipynb', False)
+    assert not PathPattern('x.ipynb', base='ch1').matches('x.ipynb', False)
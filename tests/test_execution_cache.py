@@ -0,0 +1,130 @@
+import os
+
+from nbformat.v4 import (
+    new_code_cell, new_markdown_cell, new_notebook, new_output
+)
+
+from nbinteract.execution_cache import ExecutionCache
+
+
+def make_notebook(*sources, markdown='# Title'):
+    return new_notebook(
+        cells=[new_markdown_cell(markdown)] +
+        [new_code_cell(source) for source in sources]
+    )
+
+
+def execute(nb):
+    """Fakes executing nb by giving each code cell a stream output."""
+    for count, cell in enumerate(nb.cells, 1):
+        if cell.cell_type == 'code':
+            cell.execution_count = count
+            cell.outputs = [
+                new_output('stream', name='stdout', text=cell.source)
+            ]
+    nb.metadata['language_info'] = {'name': 'python'}
+    return nb
+
+
+def test_replay(tmpdir):
+    """
+    Tests that a notebook whose code cells haven't changed is replayed even
+    if its markdown changed.
+    """
+    cache = ExecutionCache(path=str(tmpdir))
+    nb = execute(make_notebook('x = 1', 'print(x)'))
+    cache.store(nb, cache.cell_keys(nb, 'python3'))
+
+    edited = make_notebook('x = 1', 'print(x)', markdown='# New title')
+    assert cache.replay(edited, cache.cell_keys(edited, 'python3'))
+    assert [cell.outputs for cell in edited.cells[1:]] == [
+        cell.outputs for cell in nb.cells[1:]
+    ]
+    assert edited.cells[2].outputs[0].text == 'print(x)'
+    assert edited.metadata.language_info.name == 'python'
+
+
+def test_changed_cells(tmpdir):
+    """
+    Tests that changing a code cell or the kernel misses the cache, and that
+    only the cells after the change get new keys.
+    """
+    cache = ExecutionCache(path=str(tmpdir))
+    nb = execute(make_notebook('x = 1', 'print(x)'))
+    keys = cache.cell_keys(nb, 'python3')
+    cache.store(nb, keys)
+
+    changed = make_notebook('x = 1', 'print(x + 1)')
+    changed_keys = cache.cell_keys(changed, 'python3')
+    assert changed_keys[0] == keys[0]
+    assert changed_keys[1] != keys[1]
+    assert not cache.replay(changed, changed_keys)
+    assert changed.cells[1].outputs == []
+
+    assert cache.cell_keys(nb, 'ir') != keys
+
+
+def test_requirements(tmpdir):
+    requirements = tmpdir.join('requirements.txt')
+    requirements.write('numpy')
+    nb = make_notebook('x = 1')
+    before = ExecutionCache(
+        path=str(tmpdir), requirements_path=str(requirements)
+    ).cell_keys(nb, 'python3')
+
+    requirements.write('numpy\npandas')
+    after = ExecutionCache(
+        path=str(tmpdir), requirements_path=str(requirements)
+    ).cell_keys(nb, 'python3')
+    assert before != after
+
+
+def test_notebook_folder(tmpdir):
+    """
+    Tests that the same code in notebooks in different folders gets
+    different keys, since it can read different files.
+    """
+    cache = ExecutionCache(path=str(tmpdir))
+    nb = make_notebook("open('data.csv').read()")
+    keys = cache.cell_keys(nb, 'python3', folder=str(tmpdir.join('a')))
+    assert keys != cache.cell_keys(
+        nb, 'python3', folder=str(tmpdir.join('b'))
+    )
+    with tmpdir.join('a').ensure(dir=True).as_cwd():
+        assert cache.cell_keys(nb, 'python3') == keys
+
+
+def test_errors_not_stored(tmpdir):
+    cache = ExecutionCache(path=str(tmpdir))
+    nb = make_notebook('1 / 0')
+    nb.cells[1].outputs = [
+        new_output('error', ename='ZeroDivisionError', evalue='', traceback=[])
+    ]
+    keys = cache.cell_keys(nb, 'python3')
+    cache.store(nb, keys)
+    assert not cache.replay(make_notebook('1 / 0'), keys)
+
+
+def test_eviction(tmpdir):
+    """
+    Tests that the least recently used entries are evicted first.
+    """
+    cache = ExecutionCache(path=str(tmpdir))
+    old = execute(make_notebook('old = 1'))
+    new = execute(make_notebook('new = 1'))
+    old_keys = cache.cell_keys(old, 'python3')
+    new_keys = cache.cell_keys(new, 'python3')
+    cache.store(old, old_keys)
+    cache.store(new, new_keys)
+
+    # Make the old notebook's entries the least recently used
+    for name in os.listdir(str(tmpdir)):
+        if name.startswith(old_keys[0]):
+            os.utime(str(tmpdir.join(name)), (0, 0))
+
+    sizes = [os.path.getsize(str(path)) for path in tmpdir.listdir()]
+    cache.max_bytes = sum(sizes) - 1
+    cache.evict()
+
+    assert not cache.replay(make_notebook('old = 1'), old_keys)
+    assert cache.replay(make_notebook('new = 1'), new_keys)
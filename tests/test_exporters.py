@@ -0,0 +1,27 @@
+import nbformat
+import pytest
+
+import nbinteract.cli as cli
+
+from .test_cli import TEST_NOTEBOOKS, TEST_SPEC
+
+
+@pytest.mark.parametrize('template', ['full', 'partial', 'plain'])
+def test_stream_notebook_node(template):
+    """
+    Tests that streaming a notebook produces the same HTML as rendering it
+    with from_notebook_node().
+    """
+    exporter = cli.init_exporter(
+        extract_images=None,
+        execute=False,
+        spec=TEST_SPEC,
+        template_file=template
+    )
+    notebook = nbformat.read(TEST_NOTEBOOKS['interact'], as_version=4)
+
+    html, _ = exporter.from_notebook_node(notebook)
+    chunks, resources = exporter.stream_notebook_node(notebook)
+
+    assert ''.join(chunks) == html
+    assert 'metadata' in resources
@@ -0,0 +1,135 @@
+import base64
+import io
+import zlib
+
+import nbformat.v4 as v4
+import pytest
+
+from nbinteract import images
+from nbinteract.preprocessors import ImageOptimizePreprocessor
+
+SVG = '''<?xml version="1.0" encoding="utf-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">
+  <!-- Created with matplotlib -->
+  <metadata>
+    <rdf:RDF></rdf:RDF>
+  </metadata>
+  <path d="M 0 0
+           L 10 10"/>
+  <text x="1" y="5">two  spaces</text>
+</svg>
+'''
+
+
+def make_png(width=60, height=40):
+    """
+    Returns an uncompressed two-color PNG built without Pillow.
+    """
+    rows = b''.join(
+        b'\x00' + bytes((x * 255 // width) % 2 * 255 for x in range(width))
+        * 3 for _ in range(height)
+    )
+    return images.PNG_SIGNATURE + b''.join([
+        images._write_png_chunk(
+            b'IHDR',
+            width.to_bytes(4, 'big') + height.to_bytes(4, 'big') +
+            bytes([8, 2, 0, 0, 0]),
+        ),
+        images._write_png_chunk(b'tEXt', b'Software\x00matplotlib'),
+        images._write_png_chunk(b'IDAT', zlib.compress(rows, 0)),
+        images._write_png_chunk(b'IEND', b''),
+    ])
+
+
+def optimize(outputs, **kwargs):
+    cell = v4.new_code_cell('plot()', outputs=outputs)
+    nb = v4.new_notebook(cells=[cell])
+    nb, resources = ImageOptimizePreprocessor(**kwargs).preprocess(nb, {})
+    return nb.cells[0].outputs, resources
+
+
+def decoded_pixels(png):
+    Image = pytest.importorskip('PIL.Image')
+    return Image.open(io.BytesIO(png)).convert('RGB').tobytes()
+
+
+def test_recompress_png_is_smaller_and_keeps_pixels():
+    png = make_png()
+    recompressed = images.recompress_png(png)
+    assert len(recompressed) < len(png)
+    assert b'tEXt' not in recompressed
+    assert decoded_pixels(recompressed) == decoded_pixels(png)
+
+
+def test_recompress_png_leaves_other_data_alone():
+    assert images.recompress_png(b'not a png') == b'not a png'
+
+
+def test_minify_svg():
+    assert images.minify_svg(SVG) == (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+        '<path d="M 0 0 L 10 10"/>'
+        '<text x="1" y="5">two  spaces</text>'
+        '</svg>'
+    )
+
+
+def test_inline_images_are_optimized(tmpdir):
+    png = make_png()
+    [png_output, svg_output], resources = optimize(
+        [
+            v4.new_output(
+                'display_data',
+                data={'image/png': base64.b64encode(png).decode('ascii')},
+            ),
+            v4.new_output('display_data', data={'image/svg+xml': SVG}),
+        ],
+        cache_folder=str(tmpdir),
+    )
+    optimized = base64.b64decode(png_output.data['image/png'])
+    assert len(optimized) < len(png)
+    assert svg_output.data['image/svg+xml'] == images.minify_svg(SVG)
+    assert resources['image_optimization'] == {
+        'original_bytes': len(png),
+        'optimized_bytes': len(optimized),
+        'cache_hits': 0,
+    }
+
+
+def test_optimized_images_are_cached(tmpdir):
+    data = {'image/png': base64.b64encode(make_png()).decode('ascii')}
+    first, _ = optimize(
+        [v4.new_output('display_data', data=dict(data))],
+        cache_folder=str(tmpdir),
+    )
+    second, resources = optimize(
+        [v4.new_output('display_data', data=dict(data))],
+        cache_folder=str(tmpdir),
+    )
+    assert resources['image_optimization']['cache_hits'] == 1
+    assert second == first
+
+
+def test_extracted_images_get_webp_copies(tmpdir):
+    pytest.importorskip('PIL')
+    png = make_png(width=600, height=400)
+    output = v4.new_output('display_data', data={'image/png': ''})
+    output.metadata['filenames'] = {'image/png': 'images/plot.png'}
+    cell = v4.new_code_cell('plot()', outputs=[output])
+    preprocessor = ImageOptimizePreprocessor(
+        max_width=300, webp=True, cache_folder=str(tmpdir)
+    )
+    nb, resources = preprocessor.preprocess(
+        v4.new_notebook(cells=[cell]),
+        {'outputs': {'images/plot.png': png}},
+    )
+
+    [output] = nb.cells[0].outputs
+    assert output.metadata.filenames['image/webp'] == 'images/plot.webp'
+    webp = resources['outputs']['images/plot.webp']
+    assert webp.startswith(b'RIFF') and len(webp) < len(png)
+
+    from PIL import Image
+    resized = Image.open(io.BytesIO(resources['outputs']['images/plot.png']))
+    assert resized.size == (300, 200)
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+CHECK_MODULES = '''
+import sys
+{}
+heavy = [
+    'numpy', 'bqplot', 'ipywidgets', 'IPython', 'nbconvert', 'nbformat', 'PIL'
+]
+print(' '.join(name for name in heavy if name in sys.modules))
+'''
+
+
+def imported_heavy_modules(code):
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHECK_MODULES.format(code)],
+        universal_newlines=True,
+    )
+    return output.split()
+
+
+def test_package_import_is_lazy():
+    assert imported_heavy_modules('import nbinteract') == []
+    assert imported_heavy_modules('import nbinteract.cli') == []
+    assert imported_heavy_modules(
+        'import nbinteract\nnbinteract.InteractExporter'
+    ) == ['nbconvert', 'nbformat']
+
+
+def test_lazy_attributes():
+    import nbinteract as nbi
+    from nbinteract.plotting import hist
+    from nbinteract.questions import multiple_choice
+
+    assert nbi.hist is hist
+    assert nbi.multiple_choice is multiple_choice
+    assert 'hist' in dir(nbi)
+    assert nbi.util.__name__ == 'nbinteract.util'
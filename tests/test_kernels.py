@@ -0,0 +1,68 @@
+from nbformat.v4 import new_code_cell, new_notebook
+
+from nbinteract.kernels import KernelPool, merge_stats
+from nbinteract.preprocessors import NbiExecutePreprocessor
+
+
+def run(preprocessor, source, cwd):
+    nb = new_notebook(cells=[new_code_cell(source)])
+    preprocessor.preprocess(nb, {'metadata': {'path': str(cwd)}})
+    [cell] = nb.cells
+    return cell
+
+
+def test_reuse_and_recycle(tmpdir):
+    """
+    Tests that pooled kernels are reused with a clean namespace and the
+    notebook's folder as their working directory, and are replaced after
+    max_uses notebooks.
+    """
+    pool = KernelPool(size=1, preimport=['json'], max_uses=2)
+    preprocessor = NbiExecutePreprocessor(kernel_pool=pool)
+    try:
+        source = 'import os\nprint(os.getcwd(), "x" in dir())\nx = 1'
+        for _ in range(3):
+            cell = run(preprocessor, source, tmpdir)
+            assert cell.outputs[0]['text'].strip() == '{} False'.format(
+                tmpdir
+            )
+            assert cell.execution_count == 1
+    finally:
+        pool.shutdown()
+
+    assert pool.stats['hits'] + pool.stats['misses'] == 3
+    assert pool.stats['recycled'] == 1
+    assert pool.stats['crashed'] == 0
+
+
+def test_crashed_kernel(tmpdir):
+    """
+    Tests that a kernel that dies while running a notebook is replaced.
+    """
+    pool = KernelPool(size=1, preimport=[])
+    preprocessor = NbiExecutePreprocessor(kernel_pool=pool)
+    try:
+        try:
+            run(preprocessor, 'import os\nos._exit(1)', tmpdir)
+        except Exception:
+            pass
+        cell = run(preprocessor, 'print(1 + 1)', tmpdir)
+        assert cell.outputs[0]['text'].strip() == '2'
+    finally:
+        pool.shutdown()
+
+    assert pool.stats['crashed'] == 1
+
+
+def test_merge_stats():
+    stats = {
+        'hits': 1,
+        'misses': 1,
+        'recycled': 0,
+        'crashed': 0,
+        'startup_seconds': 2.0,
+        'saved_seconds': 1.0,
+    }
+    merged = merge_stats([stats, stats])
+    assert merged['hits'] == 2
+    assert merged['saved_seconds'] == 2.0
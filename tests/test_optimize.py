@@ -0,0 +1,75 @@
+import gzip
+import random
+
+from nbinteract.optimize import (
+    minify, minify_chunks, minify_css, write_precompressed
+)
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+    <style type="text/css">
+        /* Comment */
+        .cell  >  .input ,  .output {
+            margin : 0  auto;
+            content: "  a  b  ";
+        }
+    </style>
+</head>
+<body>
+    <p>Some     text
+        over   two lines</p>
+    <pre>x  =  1
+    y  =  2</pre>
+    <code>a   b</code>
+    <textarea>  keep  </textarea>
+    <script>
+        var s = "a    b";
+    </script>
+    <p title="a   b > c">1&nbsp;&nbsp;2\xa0\xa03</p>
+</body>
+</html>
+'''
+
+
+def test_minify_preserves_whitespace_sensitive_elements():
+    html = minify(PAGE)
+    assert len(html) < len(PAGE)
+    assert '<pre>x  =  1\n    y  =  2</pre>' in html
+    assert '<code>a   b</code>' in html
+    assert '<textarea>  keep  </textarea>' in html
+    assert 'var s = "a    b";' in html
+    assert '<p title="a   b > c">1&nbsp;&nbsp;2\xa0\xa03</p>' in html
+    assert '<p>Some text\nover two lines</p>' in html
+
+
+def test_minify_css():
+    assert minify_css(
+        '/* c */ .a  >  .b ,  .c {\n  margin : 0  auto;\n'
+        '  content: "  x  ";\n}\n'
+    ) == '.a>.b,.c{margin : 0 auto;content: "  x  ";}'
+
+
+def test_chunks_are_minified_like_whole_pages():
+    expected = minify(PAGE)
+    rng = random.Random(0)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(PAGE)), 10))
+        chunks = [
+            PAGE[start:end]
+            for start, end in zip([0] + cuts, cuts + [len(PAGE)])
+        ]
+        stats = {}
+        assert ''.join(minify_chunks(chunks, stats)) == expected
+        assert stats['original_bytes'] == len(PAGE.encode('utf-8'))
+        assert stats['minified_bytes'] == len(expected.encode('utf-8'))
+
+
+def test_write_precompressed(tmpdir):
+    page = tmpdir.join('page.html')
+    page.write(PAGE * 10)
+    sizes = write_precompressed(str(page))
+
+    with open(str(page) + '.gz', 'rb') as f:
+        assert gzip.decompress(f.read()).decode('utf-8') == PAGE * 10
+    assert 0 < sizes['gzip'] < len(PAGE * 10)
@@ -1,4 +1,13 @@
+from contextlib import contextmanager
+
+import bqplot as bq
+import ipywidgets as widgets
+import numpy as np
+import pytest
+from ipykernel.comm import Comm
+
 import nbinteract as nbi
+from nbinteract import plotting
 
 from .util import run_doctests
 
@@ -6,3 +15,194 @@ from .util import run_doctests
 def test_doctests():
     results = run_doctests(nbi.plotting)
     assert results.failed == 0
+
+
+def marks(box):
+    return box.children[1].marks
+
+
+def test_hist_binning_modes():
+    small = np.arange(100)
+    large = np.arange(plotting.KERNEL_BINNING_THRESHOLD + 1)
+
+    [mark] = marks(nbi.hist(small))
+    assert isinstance(mark, bq.Hist)
+    [mark] = marks(nbi.hist(lambda n: np.arange(n * 10**5), n=(1, 3)))
+    assert isinstance(mark, bq.Bars)
+    [mark] = marks(nbi.hist(large, options={'binning': 'browser'}))
+    assert isinstance(mark, bq.Hist)
+    [mark] = marks(nbi.hist(small, options={'binning': 'kernel'}))
+    assert isinstance(mark, bq.Bars)
+
+    with pytest.raises(ValueError):
+        nbi.hist(small, options={'binning': 'server'})
+
+
+def test_hist_kernel_binning_matches_numpy():
+    sample = np.random.RandomState(0).normal(size=1000)
+    box = nbi.hist(
+        lambda n: sample,
+        options={'binning': 'kernel', 'normalized': False},
+        n=(1, 5),
+    )
+    box.children[0].update()
+    [mark] = marks(box)
+    counts, edges = np.histogram(sample, bins=10)
+    assert np.array_equal(mark.y, counts)
+    assert np.allclose(mark.x, (edges[:-1] + edges[1:]) / 2)
+
+
+def test_threaded_binning_matches_numpy(monkeypatch):
+    monkeypatch.setattr(plotting, 'THREADED_BINNING_THRESHOLD', 100)
+    monkeypatch.setattr(plotting, 'BINNING_CHUNK_SIZE', 64)
+    sample = np.random.RandomState(0).exponential(size=1000)
+    for normalized in [False, True]:
+        binned = plotting._bin_counts(sample, 7, normalized)
+        counts, edges = np.histogram(sample, bins=7, density=normalized)
+        assert np.allclose(binned['y'], counts)
+        assert np.allclose(binned['x'], (edges[:-1] + edges[1:]) / 2)
+
+
+def test_kernel_binning_drops_non_finite_values():
+    sample = np.array([1, 2, np.nan, 2, np.inf, 3, -np.inf])
+    binned = plotting._bin_counts(sample, 2, normalized=False)
+    assert list(binned['y']) == [1, 3]
+
+    box = nbi.hist(
+        lambda n: np.append(np.arange(n), np.nan),
+        options={'binning': 'kernel', 'normalized': False, 'bins': 2},
+        n=(1, 9),
+    )
+    box.children[0].update()
+    [mark] = marks(box)
+    assert list(mark.y) == [2, 3]
+
+
+def test_auto_binning_uses_the_first_sample():
+    calls = []
+
+    def sample(n):
+        calls.append(n)
+        return np.arange(n)
+
+    box = nbi.hist(sample, n=(1, 9))
+    box.children[0].update()
+    # The sample that picked the binning mode is the one that's shown
+    assert calls == [5]
+    [mark] = marks(box)
+    assert list(mark.sample) == [0, 1, 2, 3, 4]
+
+    box.children[0].update()
+    assert calls == [5, 5]
+
+
+@contextmanager
+def sent_messages():
+    """
+    Records the update messages that widgets send to the page. Widgets have
+    to be made before entering the context since there's no kernel to open
+    their comms.
+    """
+    messages = []
+    with pytest.MonkeyPatch.context() as patch:
+        # Widgets only send messages once their comm has a kernel
+        patch.setattr(Comm, 'kernel', 'test kernel')
+        patch.setattr(
+            widgets.Widget,
+            '_send',
+            lambda widget, msg, buffers=None: messages.append((widget, msg)),
+        )
+        yield messages
+
+
+def updates(messages, widget):
+    return [
+        set(msg['state']) for sender, msg in messages
+        if sender is widget and msg['method'] == 'update'
+    ]
+
+
+@pytest.mark.parametrize('plot', [nbi.bar, nbi.scatter, nbi.line])
+def test_interactions_send_one_message_per_mark(plot):
+    box = plot(
+        lambda n: np.arange(n),
+        lambda xs, m: xs * m,
+        n=(1, 10),
+        m=(1, 10),
+    )
+    controls = box.children[0]
+    [mark] = marks(box)
+    with sent_messages() as sent:
+        controls.kwargs_widgets[0].value = 7
+    assert updates(sent, mark) == [{'x', 'y'}]
+
+
+def test_scatter_drag_sends_one_message_per_widget():
+    box = nbi.scatter_drag(np.arange(5), [0, 3, 1, 5, 2])
+    equation = box.children[0]
+    [scatter, line] = marks(box)
+    with sent_messages() as sent:
+        scatter.x = [0, 1, 2, 3, 10]
+    assert updates(sent, line) == [{'x', 'y'}]
+    assert updates(sent, equation) == [{'value'}]
+
+
+def test_figure_batch():
+    fig = nbi.Figure().line([1, 2], [3, 4]).scatter([1, 2], [5, 6])
+    [line, scatter] = fig.figure.marks
+    with sent_messages() as sent:
+        with fig.batch():
+            line.x = [2, 3]
+            line.y = [4, 3]
+            scatter.y = [6, 5]
+            assert sent == []
+    assert updates(sent, line) == [{'x', 'y'}]
+    assert updates(sent, scatter) == [{'y'}]
+
+
+def test_bad_args_raise_when_plot_is_made():
+    with pytest.raises(ValueError, match='missing'):
+        nbi.bar(lambda n: np.arange(n), lambda xs, m: xs * m, n=(1, 10))
+    with pytest.raises(ValueError, match='prefixed'):
+        nbi.line(
+            lambda n: np.arange(n),
+            lambda xs, n: xs * n,
+            n=(1, 10),
+            x__n=(1, 10),
+        )
+    with pytest.raises(ValueError, match='missing'):
+        nbi.hist(lambda n: np.arange(n), m=(1, 10))
+
+
+def test_y_fn_defaults_come_from_widgets():
+    box = nbi.scatter(
+        [1, 2, 3], lambda xs, offset=0: np.array(xs) + offset, offset=(5, 10)
+    )
+    box.children[0].update()
+    [mark] = marks(box)
+    # The slider starts in the middle of its range
+    assert list(mark.y) == [8, 9, 10]
+
+
+def test_background_plots():
+    box = nbi.line(
+        lambda n: np.arange(n),
+        lambda xs: xs * 2,
+        options={'background': True},
+        n=(1, 9),
+    )
+    controls = box.children[0]
+    controls.update()
+    [mark] = marks(box)
+    assert list(mark.y) == [0, 2, 4, 6, 8]
+
+    controls.kwargs_widgets[0].value = 3
+    assert controls.runner.join(5)
+    assert list(mark.y) == [0, 2, 4]
+    assert controls.runner.stats['computed'] == 2
+    controls.runner.close()
+
+    fig = nbi.Figure().hist(
+        lambda n: np.arange(n), options={'background': True}, n=(1, 9)
+    )
+    assert fig.widgets[0].runner.stats['submitted'] == 0
@@ -0,0 +1,97 @@
+import base64
+
+import numpy as np
+import pytest
+
+import nbinteract as nbi
+from nbinteract import precompute
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setenv(
+        precompute.ENV_VAR, precompute.make_budget(max_combinations=100)
+    )
+
+
+def decode(encoded):
+    """Decodes an array like precomputed.js does."""
+    if encoded['encoding'] == 'json':
+        return encoded['data']
+    data = base64.b64decode(encoded['data'])
+    if encoded['encoding'] == 'float64':
+        return np.frombuffer(data, '<f8').tolist()
+    return np.cumsum(np.frombuffer(data, '<i4')).tolist()
+
+
+def table(box):
+    return getattr(box.children[0], precompute.TRAIT_NAME, None)
+
+
+def test_encode_array():
+    assert precompute.encode_array(np.arange(5) * 2) == {
+        'encoding': 'delta-int32',
+        'data': base64.b64encode(
+            np.array([0, 2, 2, 2, 2], '<i4').tobytes()
+        ).decode('ascii'),
+    }
+    for value in [[1.5, -2.25], [3.0, np.inf], [2**40, 0]]:
+        encoded = precompute.encode_array(value)
+        assert encoded['encoding'] == 'float64'
+        assert decode(encoded) == value
+    assert decode(precompute.encode_array(['a', 'b'])) == ['a', 'b']
+    assert precompute.encode_array(np.zeros((2, 2))) is None
+
+
+def test_results_match_every_combination(enabled):
+    def y_values(xs, k):
+        return xs * k
+
+    box = nbi.line(np.arange(4), y_values, k=(1, 3))
+    results = table(box)
+    [control] = results['controls']
+    assert control['values'] == [1, 2, 3]
+    assert results['mark']['traits'] == ['x', 'y']
+
+    x_data = decode(results['arrays'][results['rows'][0][0]])
+    for k, row in zip(control['values'], results['rows']):
+        assert decode(results['arrays'][row[0]]) == x_data
+        assert decode(results['arrays'][row[1]]) == [x * k for x in x_data]
+    # The x data is the same for every combination so it's stored once
+    assert len({row[0] for row in results['rows']}) == 1
+
+
+def test_selection_widgets_use_their_index(enabled):
+    box = nbi.bar(['a', 'b'], lambda xs, c: [c, 2 * c], c=[1, 2])
+    [control] = table(box)['controls']
+    assert control['trait'] == 'index'
+    assert control['values'] == [0, 1]
+
+
+def test_plots_over_budget_use_the_kernel(enabled):
+    box = nbi.hist(lambda n, m: np.arange(n + m), n=(0, 100), m=(0, 10))
+    assert table(box) is None
+
+
+def test_text_widgets_use_the_kernel(enabled):
+    box = nbi.scatter(np.arange(3), lambda xs, t: xs, t='text')
+    assert table(box) is None
+
+
+def test_random_state_is_kept(enabled):
+    np.random.seed(0)
+    expected = np.random.rand()
+
+    np.random.seed(0)
+    # Auto binning draws the first sample when the plot is made
+    nbi.hist(
+        lambda n: np.random.normal(size=n),
+        options={'binning': 'kernel'},
+        n=(1, 10),
+    )
+    assert np.random.rand() == expected
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(precompute.ENV_VAR, raising=False)
+    assert table(nbi.hist(lambda n: np.arange(n), n=(1, 10))) is None
@@ -0,0 +1,210 @@
+import copy
+
+import nbformat.v4 as v4
+
+from nbinteract.preprocessors import (
+    WIDGET_STATE_MIMETYPE,
+    WIDGET_VIEW_MIMETYPE,
+    MinimalCellsPreprocessor,
+    NbiExecutePreprocessor,
+    TruncateOutputPreprocessor,
+    WidgetSnapshotPreprocessor,
+)
+
+TABLE = '<table><thead><tr><th>x</th></tr></thead><tbody>{}</tbody></table>'
+
+
+def table(rows):
+    return TABLE.format(
+        ''.join('<tr><td>{}</td></tr>'.format(row) for row in range(rows))
+    )
+
+
+def truncate(outputs, **kwargs):
+    cell = v4.new_code_cell('f()', outputs=outputs)
+    nb = v4.new_notebook(cells=[cell])
+    nb, resources = TruncateOutputPreprocessor(**kwargs).preprocess(nb, {})
+    return nb.cells[0].outputs, resources
+
+
+def marker_text(output):
+    return output.data['text/plain']
+
+
+def test_short_outputs_are_unchanged():
+    outputs = [
+        v4.new_output('stream', name='stdout', text='hello\n'),
+        v4.new_output('display_data', data={'text/html': table(5)}),
+    ]
+    truncated, resources = truncate(
+        copy.deepcopy(outputs), max_table_rows=5
+    )
+    assert truncated == outputs
+    assert resources['truncated_outputs'] == 0
+
+
+def test_stream_text_is_cut_at_a_line():
+    text = ''.join('line {}\n'.format(i) for i in range(1000))
+    [stream, marker] = truncate(
+        [v4.new_output('stream', name='stdout', text=text)],
+        max_text_length=100,
+    )[0]
+    assert text.startswith(stream.text)
+    assert stream.text.endswith('\n') and len(stream.text) <= 100
+    assert marker_text(marker) == (
+        'Showing the first {} of {:,} characters.'
+        .format(len(stream.text), len(text))
+    )
+
+
+def test_table_rows_are_cut():
+    output = v4.new_output(
+        'execute_result',
+        data={'text/html': table(100), 'text/plain': 'df'},
+        execution_count=1,
+    )
+    [cut, marker] = truncate([output], max_table_rows=10)[0]
+    assert cut.data['text/html'] == table(10)
+    assert marker_text(marker) == 'Showing the first 10 of 100 table rows.'
+
+
+def test_large_html_falls_back_to_text():
+    output = v4.new_output(
+        'display_data',
+        data={'text/html': '<p>{}</p>'.format('x' * 1000), 'text/plain': 'x'},
+    )
+    [cut, marker] = truncate([output], max_html_length=100)[0]
+    assert cut.data == {'text/plain': 'x'}
+    assert 'Showing its text instead.' in marker_text(marker)
+
+
+def test_extra_outputs_are_dropped():
+    outputs = [
+        v4.new_output('stream', name='stdout', text=str(i)) for i in range(10)
+    ]
+    truncated, resources = truncate(outputs, max_outputs=3)
+    assert [output.text for output in truncated[:3]] == ['0', '1', '2']
+    assert marker_text(truncated[3]) == 'Showing the first 3 of 10 outputs.'
+    assert resources['truncated_outputs'] == 1
+
+
+def test_sidecar():
+    text = 'x' * 1000
+    [_, marker], resources = truncate(
+        [v4.new_output('stream', name='stdout', text=text)],
+        max_text_length=100,
+        sidecar_folder='build/nbinteract-outputs',
+    )
+    [(path, data)] = resources['outputs'].items()
+    assert path.startswith('build/nbinteract-outputs/')
+    assert data == text.encode('utf-8')
+
+    html = marker.data['text/html']
+    assert 'href="nbinteract-outputs/{}"'.format(path.split('/')[-1]) in html
+    assert '<script>' in html
+
+
+def widget_model(name, **state):
+    return {
+        'model_name': name,
+        'model_module': '@jupyter-widgets/controls',
+        'model_module_version': '1.2.0',
+        'state': dict(state, _model_name=name),
+    }
+
+
+def widget_notebook(model_ids):
+    state = {
+        'layout': widget_model('LayoutModel'),
+        'slider': widget_model('IntSliderModel', layout='IPY_MODEL_layout'),
+        'box': widget_model('VBoxModel', children=['IPY_MODEL_slider']),
+        'unused': widget_model('LabelModel'),
+    }
+    cells = [
+        v4.new_code_cell('w', outputs=[v4.new_output('display_data', data={
+            WIDGET_VIEW_MIMETYPE: {
+                'model_id': model_id, 'version_major': 2, 'version_minor': 0
+            },
+            'text/plain': 'Widget',
+        })])
+        for model_id in model_ids
+    ]
+    nb = v4.new_notebook(cells=cells)
+    nb.metadata['widgets'] = {
+        WIDGET_STATE_MIMETYPE: {
+            'state': state, 'version_major': 2, 'version_minor': 0
+        }
+    }
+    return nb
+
+
+def snapshot_models(output):
+    return set(output.metadata['nbinteract']['widget_state']['state'])
+
+
+def test_widget_snapshots_embed_referenced_models_once():
+    nb, resources = WidgetSnapshotPreprocessor().preprocess(
+        widget_notebook(['box', 'slider']), {}
+    )
+    [box], [slider] = [cell.outputs for cell in nb.cells]
+    assert snapshot_models(box) == {'box', 'slider', 'layout'}
+    # The slider's models were already embedded by the box
+    assert snapshot_models(slider) == set()
+    assert resources['widget_snapshots']['models'] == 3
+
+
+def test_large_widget_snapshots_are_skipped():
+    nb, resources = WidgetSnapshotPreprocessor(max_bytes=10).preprocess(
+        widget_notebook(['box']), {}
+    )
+    assert 'nbinteract' not in nb.cells[0].outputs[0].metadata
+    assert resources['widget_snapshots']['skipped'] == 1
+
+
+def test_executed_widget_state_is_snapshotted():
+    """
+    Executing records widget state through nbclient's comm handling, which
+    WidgetSnapshotPreprocessor relies on.
+    """
+    nb = v4.new_notebook(cells=[
+        v4.new_code_cell('import ipywidgets as widgets\nwidgets.IntSlider(3)')
+    ])
+    nb, _ = NbiExecutePreprocessor(timeout=60).preprocess(nb, {})
+    state = nb.metadata['widgets'][WIDGET_STATE_MIMETYPE]['state']
+    sliders = [
+        model for model in state.values()
+        if model['model_name'] == 'IntSliderModel'
+    ]
+    assert [slider['state']['value'] for slider in sliders] == [3]
+
+    nb, resources = WidgetSnapshotPreprocessor().preprocess(nb, {})
+    [output] = [
+        output for output in nb.cells[0].outputs
+        if WIDGET_VIEW_MIMETYPE in output.get('data', {})
+    ]
+    assert output.metadata['nbinteract']['widget_state']['state']
+    assert resources['widget_snapshots']['outputs'] == 1
+
+
+def test_minimal_cells_manifest():
+    [widget] = widget_notebook(['slider']).cells
+    widget.source = 'interact(f, x=(0, size))'
+    nb = v4.new_notebook(cells=[
+        v4.new_code_cell('# nbi:hide_in\nfrom ipywidgets import interact'),
+        v4.new_markdown_cell('Some text'),
+        v4.new_code_cell('size = 10'),
+        v4.new_code_cell('def f(x):\n    return x'),
+        v4.new_code_cell('size * 2'),
+        widget,
+    ])
+    nb, resources = MinimalCellsPreprocessor().preprocess(nb, {})
+    # Indices count code cells only
+    assert resources['minimal_cells'] == {
+        'version': 1,
+        'cells': [0, 1, 2, 4],
+        'widgets': {'4': [0, 1, 2, 4]},
+    }
+
+    nb.cells[-1].outputs = []
+    nb, resources = MinimalCellsPreprocessor().preprocess(nb, {})
+    assert 'minimal_cells' not in resources
@@ -0,0 +1,77 @@
+import json
+
+import nbformat
+from nbformat.v4 import new_code_cell, new_notebook, new_output
+
+from nbinteract import reader
+
+WIDGET_STATE_MIMETYPE = 'application/vnd.jupyter.widget-state+json'
+
+
+def write_notebook(path):
+    nb = new_notebook(cells=[
+        new_code_cell(
+            'print(1)\nprint(2)',
+            outputs=[new_output('stream', name='stdout', text='1\n2\n')],
+        ),
+    ])
+    nb.metadata['language_info'] = {'name': 'python'}
+    nb.metadata['widgets'] = {
+        WIDGET_STATE_MIMETYPE: {'state': {'a': {'value': list(range(100))}}}
+    }
+    nbformat.write(nb, str(path))
+    return nb
+
+
+def test_fast_read(tmpdir, monkeypatch):
+    path = tmpdir.join('nb.ipynb')
+    write_notebook(path)
+    expected = nbformat.read(str(path), as_version=4)
+    del expected.metadata['widgets']
+
+    assert reader.read_notebook(str(path), fast=True) == expected
+
+    # Falls back to the standard library's JSON parser
+    monkeypatch.setattr(reader, 'orjson', None)
+    nb = reader.read_notebook(str(path), fast=True)
+    assert nb == expected
+    # Multiline strings are joined and attribute access works like nbformat
+    assert nb.cells[0].source == 'print(1)\nprint(2)'
+    assert nb.cells[0].outputs[0].text == '1\n2\n'
+
+
+def test_widget_state_is_not_parsed(tmpdir):
+    """
+    Tests that the widget state is cut out of notebooks written by nbformat
+    before parsing, and that other layouts are parsed in full.
+    """
+    path = tmpdir.join('nb.ipynb')
+    nb = write_notebook(path)
+    data = path.read_binary()
+    trimmed = reader._drop_metadata(data)
+    assert b'"widgets": {}' in trimmed
+    assert b'"value"' not in trimmed
+
+    path.write(json.dumps(nb))
+    assert reader._drop_metadata(path.read_binary()) == path.read_binary()
+    assert 'widgets' not in reader.read_notebook(str(path), fast=True).metadata
+
+
+def test_slow_read_keeps_widgets(tmpdir):
+    path = tmpdir.join('nb.ipynb')
+    nb = write_notebook(path)
+    assert reader.read_notebook(str(path)).metadata.widgets == (
+        nb.metadata.widgets
+    )
+
+
+def test_fast_read_old_format(tmpdir):
+    path = tmpdir.join('nb.ipynb')
+    nb = nbformat.v3.new_notebook(worksheets=[
+        nbformat.v3.new_worksheet(cells=[nbformat.v3.new_code_cell('1 + 1')])
+    ])
+    path.write(nbformat.writes(nb, version=3))
+
+    nb = reader.read_notebook(str(path), fast=True)
+    assert nb.nbformat == 4
+    assert nb.cells[0].source == '1 + 1'
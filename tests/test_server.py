@@ -0,0 +1,154 @@
+import io
+import json
+import os
+import threading
+
+import nbinteract.cli as cli
+import nbinteract.server as server
+
+from .test_cli import TEST_NOTEBOOKS, TEST_SPEC, args
+
+EXPORTER_CONFIG = {
+    'spec': TEST_SPEC,
+    'template_file': 'plain',
+    'button_at_top': True,
+    'execute': False,
+    'extract_images': None,
+}
+
+
+def convert_request(notebooks, output_folder, **exporter_config):
+    return {
+        'command': 'convert',
+        'notebooks': notebooks,
+        'exporter': dict(EXPORTER_CONFIG, **exporter_config),
+        'output_folder': output_folder,
+    }
+
+
+def test_warm_exporters(tmpdir):
+    """
+    Tests that exporters are cached per config and that warm and cold
+    latencies are tracked separately.
+    """
+    conversion_server = server.ConversionServer()
+    request = convert_request([TEST_NOTEBOOKS['empty']], str(tmpdir))
+
+    cold = conversion_server.handle(request)
+    warm = conversion_server.handle(request)
+    other = conversion_server.handle(
+        convert_request([TEST_NOTEBOOKS['empty']], str(tmpdir),
+                        template_file='full')
+    )
+
+    assert cold['ok'] and not cold['warm']
+    assert warm['ok'] and warm['warm']
+    assert not other['warm']
+    assert os.path.isfile(warm['results'][0]['output_file'])
+
+    status = conversion_server.handle({'command': 'status'})
+    assert status['exporters'] == 2
+    assert status['latencies']['cold']['count'] == 2
+    assert status['latencies']['warm']['count'] == 1
+
+
+def test_failed_notebook(tmpdir):
+    """
+    Tests that errors are reported per notebook and bad requests don't crash
+    the server.
+    """
+    broken = tmpdir.join('broken.ipynb')
+    broken.write('not a notebook')
+
+    conversion_server = server.ConversionServer()
+    response = conversion_server.handle(
+        convert_request([str(broken), TEST_NOTEBOOKS['empty']], str(tmpdir))
+    )
+    [failed, converted] = response['results']
+    assert failed['error'] and failed['output_file'] is None
+    assert converted['error'] is None
+
+    assert not json.loads(conversion_server.handle_line('not json'))['ok']
+
+
+def test_stdio(tmpdir):
+    """
+    Tests that the stdio worker writes one response line per request line.
+    """
+    request = json.dumps(
+        convert_request([TEST_NOTEBOOKS['empty']], str(tmpdir))
+    )
+    stdout = io.StringIO()
+    server.serve_stdio(io.StringIO(request + '\n\n' + request + '\n'), stdout)
+
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [response['warm'] for response in responses] == [False, True]
+
+
+def test_cli_uses_server(tmpdir, monkeypatch):
+    """
+    Tests that the CLI sends conversions to a running server.
+    """
+    monkeypatch.chdir(tmpdir)
+    socket_path = str(tmpdir.join('server.sock'))
+    socket_server = server.make_socket_server(socket_path)
+    thread = threading.Thread(target=socket_server.serve_forever)
+    thread.start()
+    try:
+        output_folder = str(tmpdir.join('out'))
+        for _ in range(2):
+            [html_file] = cli.run_converter(
+                args({
+                    'NOTEBOOKS': [TEST_NOTEBOOKS['empty']],
+                    '--output': output_folder,
+                    '--socket': socket_path,
+                    '--force': True,
+                })
+            )
+            assert os.path.isfile(html_file)
+    finally:
+        socket_server.shutdown()
+        socket_server.server_close()
+        thread.join()
+
+    status = socket_server.conversion_server.status()
+    assert status['latencies']['cold']['count'] == 1
+    assert status['latencies']['warm']['count'] == 1
+
+
+def test_socket_is_private(tmpdir, monkeypatch):
+    """
+    Tests that the socket is created with only the owner's permissions
+    instead of being restricted after it's created.
+    """
+    umasks = []
+    server_bind = server.socketserver.UnixStreamServer.server_bind
+
+    def record_umask(self):
+        umask = os.umask(0)
+        os.umask(umask)
+        umasks.append(umask)
+        server_bind(self)
+
+    monkeypatch.setattr(
+        server.socketserver.UnixStreamServer, 'server_bind', record_umask
+    )
+    old_umask = os.umask(0o022)
+    try:
+        socket_path = str(tmpdir.join('server.sock'))
+        socket_server = server.make_socket_server(socket_path)
+        socket_server.server_close()
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(old_umask)
+
+    assert umasks == [0o077]
+    assert os.stat(socket_path).st_mode & 0o077 == 0
+
+
+def test_no_server(tmpdir):
+    """
+    Tests that clients fall back when no server is running.
+    """
+    socket_path = str(tmpdir.join('missing.sock'))
+    assert server.request({'command': 'status'}, socket_path) is None
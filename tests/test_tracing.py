@@ -0,0 +1,81 @@
+import json
+
+import nbinteract.cli as cli
+from nbinteract import tracing
+
+from .test_cli import TEST_NOTEBOOKS, args
+
+
+def test_span():
+    """
+    Tests that spans are only recorded while tracing is enabled.
+    """
+    with tracing.span('ignored', 'stage'):
+        pass
+    assert tracing.events() == []
+
+    tracing.enable()
+    try:
+        with tracing.span('outer', 'notebook'):
+            with tracing.span('inner', 'stage') as span_args:
+                span_args['size'] = 3
+        spans = [event for event in tracing.events() if event['ph'] == 'X']
+    finally:
+        tracing.disable()
+
+    assert [event['name'] for event in spans] == ['inner', 'outer']
+    assert spans[0]['args'] == {'size': 3}
+    assert spans[1]['dur'] >= spans[0]['dur']
+
+
+def test_timings_table():
+    def event(name, category, seconds, **span_args):
+        return {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'dur': seconds * 1e6,
+            'args': span_args,
+        }
+
+    lines = tracing.timings_table([
+        event('fast.ipynb', 'notebook', 1),
+        event('slow.ipynb', 'notebook', 2),
+        event('cell 3', 'cell', 1.5, notebook='slow.ipynb', index=3),
+        event('read notebook', 'stage', 0.25),
+        event('read notebook', 'stage', 0.25),
+    ])
+    assert lines.index('     2.00  slow.ipynb') < lines.index(
+        '     1.00  fast.ipynb'
+    )
+    assert '     1.50     3  slow.ipynb' in lines
+    assert '     0.50  read notebook' in lines
+
+
+def test_trace_file(tmpdir, monkeypatch):
+    """
+    Tests that --trace records spans from worker processes.
+    """
+    monkeypatch.chdir(tmpdir)
+    trace_file = str(tmpdir.join('trace.json'))
+    notebooks = [TEST_NOTEBOOKS['empty'], TEST_NOTEBOOKS['interact']]
+    cli.run_converter(
+        args({
+            'NOTEBOOKS': notebooks,
+            '--output': str(tmpdir),
+            '--jobs': '2',
+            '--force': True,
+            '--trace': trace_file,
+        })
+    )
+    assert not tracing.is_enabled()
+
+    with open(trace_file) as f:
+        trace_events = json.load(f)['traceEvents']
+    assert sorted(
+        event['name'] for event in trace_events
+        if event.get('cat') == 'notebook'
+    ) == sorted(notebooks)
+    assert {'read notebook', 'render and write HTML'} <= {
+        event['name'] for event in trace_events
+    }
@@ -0,0 +1,44 @@
+from nbinteract.watcher import NotebookWatcher
+
+
+def test_poll(tmpdir):
+    """
+    Tests that changed notebooks are only reported after they stop changing
+    for the debounce period.
+    """
+    first = tmpdir.join('first.ipynb')
+    second = tmpdir.join('second.ipynb')
+    first.write('{}')
+    second.write('{}')
+
+    watcher = NotebookWatcher(
+        lambda: [str(first), str(second)], debounce=1
+    )
+    assert watcher.poll(now=0) == []
+
+    first.write('{"cells": []}')
+    assert watcher.poll(now=10) == []
+
+    # A second write resets the debounce timer
+    first.write('{"cells": [], "metadata": {}}')
+    assert watcher.poll(now=10.5) == []
+    assert watcher.poll(now=11) == []
+    assert watcher.poll(now=11.5) == [str(first)]
+    assert watcher.poll(now=20) == []
+
+
+def test_new_and_deleted_notebooks(tmpdir):
+    """
+    Tests that new notebooks are reported and deleted notebooks are not.
+    """
+    notebooks = []
+    watcher = NotebookWatcher(lambda: notebooks, debounce=0)
+
+    new = tmpdir.join('new.ipynb')
+    new.write('{}')
+    notebooks.append(str(new))
+    assert watcher.poll(now=0) == [str(new)]
+
+    new.write('{"cells": []}')
+    new.remove()
+    assert watcher.poll(now=1) == []